@@ -19,88 +19,118 @@ Compute the steady state gain for each input to output relationship. """
 
 from gekko import GEKKO
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-
-# load data and parse into columns
-url = 'http://apmonitor.com/do/uploads/Main/tclab_dyn_data2.txt'
-data = pd.read_csv(url)
-t = data['Time']
-u = data[['H1','H2']]
-y = data[['T1','T2']]
-
-# generate time-series model
-m = GEKKO(remote=False)
-
-# system identification
-na = 3 # output coefficients
-nb = 4 # input coefficients
-yp,p,K = m.sysid(t,u,y,na,nb)
-
-plt.figure()
-plt.subplot(2,1,1)
-plt.plot(t,u)
-plt.legend([r'$H_1$',r'$H_2$'])
-plt.ylabel('MVs')
-plt.subplot(2,1,2)
-plt.plot(t,y)
-plt.plot(t,yp)
-plt.legend([r'$T_{1meas}$',r'$T_{2meas}$',\
-            r'$T_{1pred}$',r'$T_{2pred}$'])
-plt.ylabel('CVs')
-plt.xlabel('Time')
-plt.savefig('sysid.png')
-
-# step test model
-yc,uc = m.arx(p)
-
-# steady state initialization
-m.options.IMODE = 1
-m.solve(disp=False)
-
-# dynamic simulation (step tests)
-m.time = np.linspace(0,240,241)
-m.options.TIME_SHIFT=0
-m.options.IMODE = 4
-m.solve(disp=False)
-
-plt.figure()
-
-# step for first MV (Heater 1)
-uc[0].value = np.zeros(len(m.time))
-uc[0].value[5:] = 100
-uc[1].value = np.zeros(len(m.time))
-m.solve(disp=False)
-
-plt.subplot(2,2,1)
-plt.title('Step Test 1')
-plt.plot(m.time,uc[0].value,'b-',label=r'$H_1$')
-plt.plot(m.time,uc[1].value,'r-',label=r'$H_2$')
-plt.ylabel('Heater (%)')
-plt.legend()
-plt.subplot(2,2,3)
-plt.plot(m.time,yc[0].value,'b--',label=r'$T_1$')
-plt.plot(m.time,yc[1].value,'r--',label=r'$T_2$')
-plt.ylabel('Temperature (K)')
-plt.xlabel('Time (sec)')
-plt.legend()
-
-# step for second MV (Heater 2)
-uc[0].value = np.zeros(len(m.time))
-uc[1].value = np.zeros(len(m.time))
-uc[1].value[5:] = 100
-m.solve(disp=False)
-plt.subplot(2,2,2)
-plt.title('Step Test 2')
-plt.plot(m.time,uc[0].value,'b-',label=r'$H_1$')
-plt.plot(m.time,uc[1].value,'r-',label=r'$H_2$')
-plt.ylabel('Heater (%)')
-plt.legend()
-plt.subplot(2,2,4)
-plt.plot(m.time,yc[0].value,'b--',label=r'$T_1$')
-plt.plot(m.time,yc[1].value,'r--',label=r'$T_2$')
-plt.ylabel('Temperature (K)')
-plt.xlabel('Time (sec)')
-plt.legend()
-
-plt.show()
\ No newline at end of file
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.datacache import load
+from tools.fitcache import FitCache, fingerprint
+from tools.stats import solve_stats, values
+
+URL = 'http://apmonitor.com/do/uploads/Main/tclab_dyn_data2.txt'
+
+
+def load_data(url=URL):
+    """Time, heaters (n, 2) and temperatures (n, 2) (local cache, works offline)."""
+    data = load(url)
+    u = np.column_stack([data['H1'],data['H2']])
+    y = np.column_stack([data['T1'],data['T2']])
+    return data['Time'], u, y
+
+
+def identify(t=None, u=None, y=None, na=3, nb=4, pred='model', remote=False,
+             cache=True):
+    """ARX fit of y to u; returns predictions yp, parameters p and gain matrix K.
+
+    The fit is reused while data, orders and options are unchanged
+    (tools/fitcache.py); cache=False always refits.
+    """
+    if t is None:
+        t, u, y = load_data()
+    start = time.time()
+    fits = FitCache()
+    key = fingerprint(t,u,y,na,nb,pred,'sysid')
+    fit = fits.get(key) if cache else None
+    cached = fit is not None
+    if fit is None:
+        # generate time-series model
+        m = GEKKO(remote=remote)
+        yp,p,K = m.sysid(t,u,y,na,nb,pred=pred)
+        fit = {'yp':yp,'a':p['a'],'b':p['b'],'c':p['c'],'K':K}
+        fits.put(key,fit,label='MIMO')
+    p = {'a':fit['a'],'b':fit['b'],'c':fit['c']}
+    return {'time': np.asarray(t), 'u': np.asarray(u), 'y': np.asarray(y),
+            'yp': np.asarray(fit['yp']), 'p': p, 'K': np.asarray(fit['K']),
+            'stats': {'cached': cached, 'fit_time': time.time() - start}}
+
+
+def step_tests(p, step=100, horizon=240, remote=False):
+    """Step each input of the ARX model p in turn at t=5.
+
+    Returns 'u' and 'y' arrays shaped (tests, signals, time points).
+    """
+    m = GEKKO(remote=remote)
+    yc,uc = m.arx(p)
+
+    # steady state initialization
+    m.options.IMODE = 1
+    m.solve(disp=False)
+
+    # dynamic simulation (step tests)
+    m.time = np.linspace(0,horizon,horizon+1)
+    m.options.TIME_SHIFT=0
+    m.options.IMODE = 4
+    m.solve(disp=False)
+
+    u_tests, y_tests, stats = [], [], []
+    for j in range(len(uc)):
+        for i in range(len(uc)):
+            uc[i].value = np.zeros(len(m.time))
+        uc[j].value[5:] = step
+        m.solve(disp=False)
+        u_tests.append(values(*uc) if len(uc) > 1 else [values(uc[0])])
+        y_tests.append(values(*yc) if len(yc) > 1 else [values(yc[0])])
+        stats.append(solve_stats(m))
+    return {'time': values(m.time), 'u': np.array(u_tests), 'y': np.array(y_tests),
+            'stats': stats}
+
+
+def plot(fit, steps=None):
+    import matplotlib.pyplot as plt
+    t = fit['time']
+    plt.figure()
+    plt.subplot(2,1,1)
+    plt.plot(t,fit['u'])
+    plt.legend([r'$H_1$',r'$H_2$'])
+    plt.ylabel('MVs')
+    plt.subplot(2,1,2)
+    plt.plot(t,fit['y'])
+    plt.plot(t,fit['yp'])
+    plt.legend([r'$T_{1meas}$',r'$T_{2meas}$',\
+                r'$T_{1pred}$',r'$T_{2pred}$'])
+    plt.ylabel('CVs')
+    plt.xlabel('Time')
+    plt.savefig('sysid.png')
+
+    if steps is not None:
+        plt.figure()
+        ts = steps['time']
+        for j in range(len(steps['u'])):
+            plt.subplot(2,2,j+1)
+            plt.title('Step Test %d' % (j+1))
+            plt.plot(ts,steps['u'][j][0],'b-',label=r'$H_1$')
+            plt.plot(ts,steps['u'][j][1],'r-',label=r'$H_2$')
+            plt.ylabel('Heater (%)')
+            plt.legend()
+            plt.subplot(2,2,j+3)
+            plt.plot(ts,steps['y'][j][0],'b--',label=r'$T_1$')
+            plt.plot(ts,steps['y'][j][1],'r--',label=r'$T_2$')
+            plt.ylabel('Temperature (K)')
+            plt.xlabel('Time (sec)')
+            plt.legend()
+    plt.show()
+
+
+if __name__ == '__main__':
+    fit = identify()
+    plot(fit, step_tests(fit['p']))
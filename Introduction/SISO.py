@@ -6,67 +6,106 @@ dead-time (θ). τ(dx/dt) = -x + Ku(t - θ)'''
 
 from gekko import GEKKO
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-
-# load data and parse into columns
-url = 'http://apmonitor.com/do/uploads/Main/tclab_siso_data.txt'
-data = pd.read_csv(url)
-t = data['time']
-u = data['voltage']
-y = data['temperature']
-
-# generate time-series model
-m = GEKKO()
-
-# system identification
-na = 2 # output coefficients
-nb = 2 # input coefficients
-yp,p,K = m.sysid(t,u,y,na,nb,pred='meas')
-
-plt.figure()
-plt.subplot(2,1,1)
-plt.plot(t,u)
-plt.legend([r'$V_1$ (mV)'])
-plt.ylabel('MV Voltage (mV)')
-plt.subplot(2,1,2)
-plt.plot(t,y)
-plt.plot(t,yp)
-plt.legend([r'$T_{1meas}$',r'$T_{1pred}$'])
-plt.ylabel('CV Temp (degF)')
-plt.xlabel('Time')
-plt.savefig('sysid.png')
-
-# step test model
-yc,uc = m.arx(p)
-
-# steady state initialization
-m.options.IMODE = 1
-m.solve(disp=False)
-
-# dynamic simulation (step test)
-m.time = np.linspace(0,240,241)
-m.options.TIME_SHIFT=0
-m.options.IMODE = 4
-m.solve(disp=False)
-
-# step for first MV (Heater 1)
-uc[0].value = np.zeros(len(m.time))
-uc[0].value[5:] = 100
-m.solve(disp=False)
-
-plt.figure()
-plt.subplot(2,1,1)
-plt.title('Step Test 1')
-plt.plot(m.time,uc[0].value,'b-',label=r'$H_1$')
-plt.ylabel('Heater (V)')
-plt.legend()
-
-plt.subplot(2,1,2)
-plt.plot(m.time,yc[0].value,'r--',label=r'$T_1$')
-plt.ylabel('Temperature (degF)')
-plt.legend()
-plt.xlabel('Time (sec)')
-plt.legend()
-plt.savefig('step_test.png')
-plt.show()
\ No newline at end of file
+import os
+import sys
+import time
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.datacache import load
+from tools.fitcache import FitCache, fingerprint
+from tools.stats import solve_stats, values
+
+URL = 'http://apmonitor.com/do/uploads/Main/tclab_siso_data.txt'
+
+
+def load_data(url=URL):
+    """Time, voltage and temperature columns (local cache, works offline)."""
+    data = load(url)
+    return data['time'], data['voltage'], data['temperature']
+
+
+def identify(t=None, u=None, y=None, na=2, nb=2, pred='meas', remote=False,
+             cache=True):
+    """ARX fit of y to u; returns predictions yp, parameters p and gain K.
+
+    The fit is reused while data, orders and options are unchanged
+    (tools/fitcache.py); cache=False always refits.
+    """
+    if t is None:
+        t, u, y = load_data()
+    start = time.time()
+    fits = FitCache()
+    key = fingerprint(t,u,y,na,nb,pred,'sysid')
+    fit = fits.get(key) if cache else None
+    cached = fit is not None
+    if fit is None:
+        # generate time-series model
+        m = GEKKO(remote=remote)
+        yp,p,K = m.sysid(t,u,y,na,nb,pred=pred)
+        fit = {'yp':yp,'a':p['a'],'b':p['b'],'c':p['c'],'K':K}
+        fits.put(key,fit,label='SISO')
+    p = {'a':fit['a'],'b':fit['b'],'c':fit['c']}
+    return {'time': np.asarray(t), 'u': np.asarray(u), 'y': np.asarray(y),
+            'yp': np.asarray(fit['yp']), 'p': p, 'K': np.asarray(fit['K']),
+            'stats': {'cached': cached, 'fit_time': time.time() - start}}
+
+
+def step_test(p, step=100, horizon=240, remote=False):
+    """Simulate the ARX model p for a step of the input at t=5."""
+    m = GEKKO(remote=remote)
+    yc,uc = m.arx(p)
+
+    # steady state initialization
+    m.options.IMODE = 1
+    m.solve(disp=False)
+
+    # dynamic simulation (step test)
+    m.time = np.linspace(0,horizon,horizon+1)
+    m.options.TIME_SHIFT=0
+    m.options.IMODE = 4
+    m.solve(disp=False)
+
+    # step for first MV (Heater 1)
+    uc[0].value = np.zeros(len(m.time))
+    uc[0].value[5:] = step
+    m.solve(disp=False)
+    t, u, y = values(m.time, uc[0], yc[0])
+    return {'time': t, 'u': u, 'y': y, 'stats': solve_stats(m)}
+
+
+def plot(fit, step=None):
+    import matplotlib.pyplot as plt
+    t = fit['time']
+    plt.figure()
+    plt.subplot(2,1,1)
+    plt.plot(t,fit['u'])
+    plt.legend([r'$V_1$ (mV)'])
+    plt.ylabel('MV Voltage (mV)')
+    plt.subplot(2,1,2)
+    plt.plot(t,fit['y'])
+    plt.plot(t,fit['yp'])
+    plt.legend([r'$T_{1meas}$',r'$T_{1pred}$'])
+    plt.ylabel('CV Temp (degF)')
+    plt.xlabel('Time')
+    plt.savefig('sysid.png')
+
+    if step is not None:
+        plt.figure()
+        plt.subplot(2,1,1)
+        plt.title('Step Test 1')
+        plt.plot(step['time'],step['u'],'b-',label=r'$H_1$')
+        plt.ylabel('Heater (V)')
+        plt.legend()
+
+        plt.subplot(2,1,2)
+        plt.plot(step['time'],step['y'],'r--',label=r'$T_1$')
+        plt.ylabel('Temperature (degF)')
+        plt.legend()
+        plt.xlabel('Time (sec)')
+        plt.legend()
+        plt.savefig('step_test.png')
+    plt.show()
+
+
+if __name__ == '__main__':
+    fit = identify()
+    plot(fit, step_test(fit['p']))
@@ -24,127 +24,214 @@ from __future__ import division
 from gekko import GEKKO
 import numpy as np
 import random
-
-# intial parameters
-n_iter = 150 # number of cycles
-x = 37.727 # true value
-# filtered bias update
-alpha = 0.0951
-# mhe tuning
-horizon = 30
-
-# Solve options
-rmt = True # Remote: True or False
-
-#Initialize model
-m = GEKKO(remote=rmt)
-
-# For rmt=True, specify server
-m.server = 'https://byu.apmonitor.com'
-
-#time array 
-m.time = np.arange(50)
-
-#Parameters
-u = m.Param(value=42)
-d = m.FV(value=0)
-Cv = m.Param(value=1)
-tau = m.Param(value=0.1)
-
-#Variable
-flow = m.CV(value=42)
-
-#Equation 
-m.Equation(tau * flow.dt() == -flow + Cv * u + d)
-
-# Options
-m.options.imode = 5
-m.options.ev_type = 1 #start with l1 norm
-m.options.coldstart = 1
-m.options.solver = 1  # APOPT solver
-
-d.status = 1
-flow.fstatus = 1
-flow.wmeas = 100
-flow.wmodel = 0
-#flow.dcost = 0
-
-# Initialize L1 application
-m.solve()
-
-# Create storage for results
-xtrue = x * np.ones(n_iter+1)
-z = x * np.ones(n_iter+1)
-time = np.zeros(n_iter+1)
-xb = np.empty(n_iter+1)
-x1mhe = np.empty(n_iter+1)
-x2mhe = np.empty(n_iter+1)
-
-# initial estimator values
-x0 = 40
-xb[0] = x0
-x1mhe[0] = x0
-x2mhe[0] = x0
-
-# outliers
-for i in range(n_iter+1):
-    z[i] = x + (random.random()-0.5)*2.0
-z[50] = 100
-z[100] = 0
-
-
-## Cycle through measurement sequentially
-for k in range(1, n_iter+1):
-    print( 'Cycle ' + str(k) + ' of ' + str(n_iter))
-    time[k] = k
-
-    # L1-norm MHE
-    flow.meas = z[k] 
-    m.solve()
-    x1mhe[k] = flow.model
-
-print("Finished L1")
-
-#clear L1//
-m.clear_data()
-# Options for L2
-m.options.ev_type = 2 #start with l1 norm
-m.options.coldstart = 1 #reinitialize
-
-flow.wmodel = 10
-
-# Initialize L2 application
-m.solve()
-
-## Cycle through measurement sequentially
-for k in range(1, n_iter+1):
-    print ('Cycle ' + str(k) + ' of ' + str(n_iter))
-    time[k] = k
-
-    # L2-norm MHE
-    flow.meas = z[k] 
-    m.solve()
-    x2mhe[k] = flow.model
-
-
-## Cycle through measurement sequentially
-for k in range(1, n_iter+1):
-    print ('Cycle ' + str(k) + ' of ' + str(n_iter))
-    time[k] = k
-
-    # filtered bias update
-    xb[k] = alpha * z[k] + (1.0-alpha) * xb[k-1] 
-
-
-import matplotlib.pyplot as plt
-plt.figure(1)
-plt.plot(time,z,'kx',lw=2)
-plt.plot(time,xb,'g--',lw=3)
-plt.plot(time,x2mhe,'k-',lw=3)
-plt.plot(time,x1mhe,'r.-',lw=3)
-plt.plot(time,xtrue,'k:',lw=2)
-plt.legend(['Measurement','Filtered Bias Update','Sq Error MHE','l_1-Norm MHE','Actual Value'])
-plt.xlabel('Time (sec)')
-plt.ylabel('Flow Rate (T/hr)')
-plt.axis([0, time[n_iter], 32, 45])
-plt.show()
\ No newline at end of file
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.resultstore import open_results
+from tools.modelcache import cache_models, report
+from tools.stats import solve_stats, cycle_stats
+from tools.telemetry import LoopTelemetry
+from tools.checkpoint import Checkpoint
+from tools import rundirs
+from timeit import default_timer as timer
+
+SERVER = 'https://byu.apmonitor.com'
+
+
+def measurements(n_iter=150, x=37.727, outliers=((50, 100), (100, 0))):
+    """Noisy measurements of the true value x with outliers at the given cycles."""
+    z = x * np.ones(n_iter+1)
+    for i in range(n_iter+1):
+        z[i] = x + (random.random()-0.5)*2.0
+    for i, v in outliers:
+        if i <= n_iter:
+            z[i] = v
+    return z
+
+
+def estimator(remote=False, server=SERVER):
+    #Initialize model
+    # For remote=True, specify server (GEKKO reads it only on construction)
+    m = GEKKO(remote=remote, server=server)
+
+    #time array 
+    m.time = np.arange(50)
+
+    #Parameters
+    u = m.Param(value=42)
+    m.d = m.FV(value=0)
+    Cv = m.Param(value=1)
+    tau = m.Param(value=0.1)
+
+    #Variable
+    m.flow = m.CV(value=42)
+    d, flow = m.d, m.flow
+
+    #Equation 
+    m.Equation(tau * flow.dt() == -flow + Cv * u + d)
+
+    # Options
+    m.options.imode = 5
+    m.options.ev_type = 1 #start with l1 norm
+    m.options.coldstart = 1
+    m.options.solver = 1  # APOPT solver
+
+    d.status = 1
+    flow.fstatus = 1
+    flow.wmeas = 100
+    flow.wmodel = 0
+    #flow.dcost = 0
+    return m
+
+
+def run(n_iter=150, z=None, x=37.727, alpha=0.0951, x0=40, remote=False,
+        server=SERVER, results=None, disp=False, verbose=False, checkpoint=None):
+    """L1-norm MHE, squared error MHE and a filtered bias update on the same data.
+
+    alpha is the filtered bias update gain, x0 the initial estimate and results
+    an optional open_results() store. The returned telemetry holds the solve
+    latency of every cycle under the roles l1 and l2. checkpoint is a file
+    that receives the loop state after every cycle of both estimators; a run
+    called again with it resumes there (tools/checkpoint.py, remote=False).
+    """
+    if z is None:
+        z = measurements(n_iter, x)
+    m = estimator(remote, server)
+    flow = m.flow
+
+    # reuse the model file between cycles (GEKKO_MODEL_CACHE=0 to compare)
+    cache_models(m)
+    # pooled run directory, removed at exit (GEKKO_RUNDIR=off to keep it)
+    rundirs.pooled(m)
+    cycle_time = np.empty((2,n_iter))
+    stats = ([], [])
+    tel = LoopTelemetry()
+
+    # Create storage for results
+    xtrue = x * np.ones(n_iter+1)
+    time = np.zeros(n_iter+1)
+    xb = np.empty(n_iter+1)
+    x1mhe = np.empty(n_iter+1)
+    x2mhe = np.empty(n_iter+1)
+
+    # initial estimator values
+    xb[0] = x0
+    x1mhe[0] = x0
+    x2mhe[0] = x0
+
+    # cycles 1..n_iter are L1, n_iter+1..2*n_iter L2
+    arrays = {'z': z, 'time': time, 'x1mhe': x1mhe, 'x2mhe': x2mhe,
+              'cycle_time': cycle_time}
+    ck = Checkpoint(checkpoint) if checkpoint else None
+    state = ck.restore(arrays, estimator=m) if ck else None
+    done = state['cycle'] if state else 0
+    if state:
+        stats = state['extra']
+    else:
+        # Initialize L1 application
+        m.solve(disp=disp)
+
+    ## Cycle through measurement sequentially
+    for k in range(done+1, n_iter+1):
+        if verbose:
+            print( 'Cycle ' + str(k) + ' of ' + str(n_iter))
+        time[k] = k
+
+        # L1-norm MHE
+        flow.meas = z[k] 
+        start = timer()
+        m.solve(disp=disp)
+        cycle_time[0,k-1] = timer() - start
+        tel.record('l1', cycle_time[0,k-1], m.options.SOLVETIME, m.options.ITERATIONS,
+                   m.options.APPSTATUS == 1)
+        tel.add_cycle(cycle_time[0,k-1])
+        x1mhe[k] = flow.model
+        stats[0].append(solve_stats(m))
+        if results:
+            results.append({'z': z[k], 'x1mhe': x1mhe[k]}, time=k,
+                           status=m.options.APPSTATUS, solve_time=m.options.SOLVETIME,
+                           cycle=k, ev_type=1)
+        if ck:
+            ck.save(k, arrays, stats, estimator=m)
+
+    if verbose:
+        print("Finished L1")
+
+    if done <= n_iter:
+        #clear L1//
+        m.clear_data()
+        # Options for L2
+        m.options.ev_type = 2 #start with l1 norm
+        m.options.coldstart = 1 #reinitialize
+
+        flow.wmodel = 10
+
+        # Initialize L2 application
+        m.solve(disp=disp)
+
+    ## Cycle through measurement sequentially
+    for k in range(max(done-n_iter, 0)+1, n_iter+1):
+        if verbose:
+            print ('Cycle ' + str(k) + ' of ' + str(n_iter))
+        time[k] = k
+
+        # L2-norm MHE
+        flow.meas = z[k] 
+        start = timer()
+        m.solve(disp=disp)
+        cycle_time[1,k-1] = timer() - start
+        tel.record('l2', cycle_time[1,k-1], m.options.SOLVETIME, m.options.ITERATIONS,
+                   m.options.APPSTATUS == 1)
+        tel.add_cycle(cycle_time[1,k-1])
+        x2mhe[k] = flow.model
+        stats[1].append(solve_stats(m))
+        if results:
+            results.append({'z': z[k], 'x2mhe': x2mhe[k]}, time=k,
+                           status=m.options.APPSTATUS, solve_time=m.options.SOLVETIME,
+                           cycle=k, ev_type=2)
+        if ck:
+            ck.save(n_iter + k, arrays, stats, estimator=m)
+
+    ## Cycle through measurement sequentially
+    for k in range(1, n_iter+1):
+        time[k] = k
+
+        # filtered bias update
+        xb[k] = alpha * z[k] + (1.0-alpha) * xb[k-1] 
+
+    if ck:
+        ck.remove()
+    return {'time': time, 'z': z, 'xtrue': xtrue, 'xb': xb, 'x1mhe': x1mhe,
+            'x2mhe': x2mhe, 'cycle_time': cycle_time,
+            'stats': {'l1': cycle_stats(stats[0]), 'l2': cycle_stats(stats[1])},
+            'telemetry': tel,
+            'models': (m,)}
+
+
+def plot(res):
+    import matplotlib.pyplot as plt
+    time = res['time']
+    plt.figure(1)
+    plt.plot(time,res['z'],'kx',lw=2)
+    plt.plot(time,res['xb'],'g--',lw=3)
+    plt.plot(time,res['x2mhe'],'k-',lw=3)
+    plt.plot(time,res['x1mhe'],'r.-',lw=3)
+    plt.plot(time,res['xtrue'],'k:',lw=2)
+    plt.legend(['Measurement','Filtered Bias Update','Sq Error MHE','l_1-Norm MHE','Actual Value'])
+    plt.xlabel('Time (sec)')
+    plt.ylabel('Flow Rate (T/hr)')
+    plt.axis([0, time[-1], 32, 45])
+    plt.show()
+
+
+if __name__ == '__main__':
+    # Solve options: local unless --remote (solves on SERVER)
+    rmt = '--remote' in sys.argv
+    # GEKKO_RESULTS=<file> keeps every cycle for later analysis
+    res = run(remote=rmt, results=open_results(), disp=True, verbose=True)
+    # GEKKO_TELEMETRY=<file> exports the latency time series
+    print(res['telemetry'].report())
+    res['telemetry'].export()
+    print(report(*res['models']))
+    print(rundirs.report(*res['models']))
+    plot(res)
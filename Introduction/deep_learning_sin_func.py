@@ -6,36 +6,28 @@ with outputs generated from the sine function y = sin(x). """
 
 from gekko import GEKKO
 import numpy as np
-import matplotlib.pyplot as plt  
-
-# generate training data
-x = np.linspace(0.0,2*np.pi,20)
-y = np.sin(x)
-
-# option for fitting function
-select = True # True / False
-if select:
-    # Size with cosine function
-    nin = 1  # inputs
-    n1 = 1   # hidden layer 1 (linear)
-    n2 = 1   # hidden layer 2 (nonlinear)
-    n3 = 1   # hidden layer 3 (linear)
-    nout = 1 # outputs
-else:
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.fitcache import FitCache, fingerprint, model_structure
+from tools.stats import solve_stats, values
+
+WEIGHTS = ('w1','w2a','w2b','w3')
+
+
+def layer_sizes(select=True):
+    if select:
+        # Size with cosine function
+        return 1, 1, 1, 1, 1  # inputs, hidden layers 1-3 (linear, nonlinear, linear), outputs
     # Size with hyperbolic tangent function
-    nin = 1  # inputs
-    n1 = 2   # hidden layer 1 (linear)
-    n2 = 2   # hidden layer 2 (nonlinear)
-    n3 = 2   # hidden layer 3 (linear)
-    nout = 1 # outputs
+    return 1, 2, 2, 2, 1
 
-# Initialize gekko
-train = GEKKO() 
-test = GEKKO()
 
-model = [train,test]
+def network(select=True, remote=False):
+    """GEKKO model of the network with FV weights (cosine or tanh activation)."""
+    nin,n1,n2,n3,nout = layer_sizes(select)
+    m = GEKKO(remote=remote)
 
-for m in model:
     # input(s)
     m.inpt = m.Param()
 
@@ -67,58 +59,86 @@ for m in model:
     m.w2a = m.w2a.flatten()
     m.w2b = m.w2b.flatten()
     m.w3 = m.w3.flatten()
+    return m
+
+
+def train(x=None, y=None, select=True, remote=False, cache=True):
+    """Fit the weights to (x, y), by default 20 points of sin(x) on [0, 2pi].
+
+    Trained weights are reused while data, network and options are unchanged.
+    """
+    if x is None:
+        x = np.linspace(0.0,2*np.pi,20)
+        y = np.sin(x)
+    m = network(select, remote)
+    m.inpt.value=x
+    m.outpt.value=y
+    m.outpt.FSTATUS = 1
+    for i in range(len(m.w1)):
+        m.w1[i].FSTATUS=1
+        m.w1[i].STATUS=1
+        m.w1[i].MEAS=1.0
+    for i in range(len(m.w2a)):
+        m.w2a[i].STATUS=1
+        m.w2b[i].STATUS=1
+        m.w2a[i].FSTATUS=1
+        m.w2b[i].FSTATUS=1
+        m.w2a[i].MEAS=1.0
+        m.w2b[i].MEAS=0.5
+    for i in range(len(m.w3)):
+        m.w3[i].FSTATUS=1
+        m.w3[i].STATUS=1
+        m.w3[i].MEAS=1.0
+    m.options.IMODE = 2
+    m.options.SOLVER = 3
+    m.options.EV_TYPE = 2
+    # reuse trained weights while data, network and options are unchanged
+    fits = FitCache()
+    key = fingerprint(x,y,model_structure(m),
+                      [m.options.IMODE,m.options.SOLVER,m.options.EV_TYPE])
+    weights = fits.get(key) if cache else None
+    stats = {'cached': weights is not None}
+    if weights is None:
+        m.solve(disp=False)
+        weights = {w:np.array([v.NEWVAL for v in getattr(m,w)]) for w in WEIGHTS}
+        fits.put(key,weights,label='deep_learning_sin_func')
+        stats.update(solve_stats(m))
+    out = {w: np.asarray(weights[w], dtype=float) for w in WEIGHTS}
+    out.update(x=np.asarray(x), y=np.asarray(y), select=select, stats=stats)
+    return out
+
+
+def predict(weights, x=None, remote=False):
+    """Network output with the trained weights at x (default -2pi..4pi)."""
+    x = np.linspace(-2*np.pi,4*np.pi,100) if x is None else x
+    m = network(weights['select'], remote)
+    for w in WEIGHTS:
+        for i, v in enumerate(getattr(m, w)):
+            v.MEAS = weights[w][i]
+            v.FSTATUS = 1
+    m.inpt.value=x
+    m.options.IMODE = 2
+    m.options.SOLVER = 3
+    m.solve(disp=False)
+    return {'x': values(m.inpt), 'y': values(m.outpt), 'stats': solve_stats(m)}
+
+
+def plot(weights, pred):
+    import matplotlib.pyplot as plt
+    plt.figure()
+    plt.plot(weights['x'],weights['y'],'bo',label='data')
+    plt.plot(pred['x'],pred['y'],'r-',label='predict')
+    plt.legend(loc='best')
+    plt.ylabel('y')
+    plt.xlabel('x')
+    plt.show()
+
 
-# Fit parameter weights
-m = train
-m.inpt.value=x
-m.outpt.value=y
-m.outpt.FSTATUS = 1
-for i in range(len(m.w1)):
-    m.w1[i].FSTATUS=1
-    m.w1[i].STATUS=1
-    m.w1[i].MEAS=1.0
-for i in range(len(m.w2a)):
-    m.w2a[i].STATUS=1
-    m.w2b[i].STATUS=1
-    m.w2a[i].FSTATUS=1
-    m.w2b[i].FSTATUS=1
-    m.w2a[i].MEAS=1.0
-    m.w2b[i].MEAS=0.5
-for i in range(len(m.w3)):
-    m.w3[i].FSTATUS=1
-    m.w3[i].STATUS=1
-    m.w3[i].MEAS=1.0
-m.options.IMODE = 2
-m.options.SOLVER = 3
-m.options.EV_TYPE = 2
-m.solve(disp=False)
-
-# Test sample points
-m = test
-for i in range(len(m.w1)):
-    m.w1[i].MEAS=train.w1[i].NEWVAL
-    m.w1[i].FSTATUS = 1
-    print('w1['+str(i)+']: '+str(m.w1[i].MEAS))
-for i in range(len(m.w2a)):
-    m.w2a[i].MEAS=train.w2a[i].NEWVAL
-    m.w2b[i].MEAS=train.w2b[i].NEWVAL
-    m.w2a[i].FSTATUS = 1
-    m.w2b[i].FSTATUS = 1
-    print('w2a['+str(i)+']: '+str(m.w2a[i].MEAS))
-    print('w2b['+str(i)+']: '+str(m.w2b[i].MEAS))
-for i in range(len(m.w3)):
-    m.w3[i].MEAS=train.w3[i].NEWVAL
-    m.w3[i].FSTATUS = 1
-    print('w3['+str(i)+']: '+str(m.w3[i].MEAS))
-m.inpt.value=np.linspace(-2*np.pi,4*np.pi,100)
-m.options.IMODE = 2
-m.options.SOLVER = 3
-m.solve(disp=False)
-
-plt.figure()
-plt.plot(x,y,'bo',label='data')
-plt.plot(test.inpt.value,test.outpt.value,'r-',label='predict')
-plt.legend(loc='best')
-plt.ylabel('y')
-plt.xlabel('x')
-plt.show()
\ No newline at end of file
+if __name__ == '__main__':
+    # option for fitting function
+    select = True # True / False
+    weights = train(select=select)
+    for w in WEIGHTS:
+        for i, v in enumerate(weights[w]):
+            print(w+'['+str(i)+']: '+str(v))
+    plot(weights, predict(weights))
@@ -14,38 +14,56 @@ dx/dt = y, (dy/dt)=z, dz/dt = az + by + cx + d
 """
 
 from gekko import GEKKO
+import numpy as np
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.stats import solve_stats, values
 
-t_data = [0,0.1,0.2,0.4,0.8,1,1.5,2,2.5,3,3.5,4]
-x_data = [2.0,1.6,1.2,0.7,0.3,0.15,0.1,\
+T_DATA = [0,0.1,0.2,0.4,0.8,1,1.5,2,2.5,3,3.5,4]
+X_DATA = [2.0,1.6,1.2,0.7,0.3,0.15,0.1,\
           0.05,0.03,0.02,0.015,0.01]
 
-m = GEKKO()
-m.time = t_data
-
-# states
-x = m.CV(value=x_data); x.FSTATUS = 1  # fit to measurement
-y,z = m.Array(m.Var,2,value=0)
-
-# adjustable parameters
-a,b,c,d = m.Array(m.FV,4)
-a.STATUS=1; b.STATUS=1; c.STATUS=1; d.STATUS=1
-
-# differential equation
-#      Original:  x''' = a*x'' + b x' + c x + d
-#      Transform: y = x'
-#                 z = y'
-#                 z' = a*z + b*y + c*x + d
-m.Equations([y==x.dt(),z==y.dt()])
-m.Equation(z.dt()==a*z+b*y+c*x+d) # differential equation
-
-m.options.IMODE = 5   # dynamic estimation(MHE)
-m.options.NODES = 3   # collocation nodes
-m.solve(disp=False)   # display solver output
-print(a.value[0],b.value[0],c.value[0],d.value[0])
-
-import matplotlib.pyplot as plt  # plot solution
-plt.plot(m.time,x.value,'bo',label='Predicted')
-plt.plot(m.time,x_data,'rx',label='Measured')
-plt.legend()
-plt.xlabel('Time'), plt.ylabel('Value')
-plt.show()
\ No newline at end of file
+
+def estimate(t_data=T_DATA, x_data=X_DATA, nodes=3, remote=False, disp=False):
+    """Fit a, b, c, d of the third order ODE; returns them with the fitted x."""
+    m = GEKKO(remote=remote)
+    m.time = t_data
+
+    # states
+    x = m.CV(value=x_data); x.FSTATUS = 1  # fit to measurement
+    y,z = m.Array(m.Var,2,value=0)
+
+    # adjustable parameters
+    a,b,c,d = m.Array(m.FV,4)
+    a.STATUS=1; b.STATUS=1; c.STATUS=1; d.STATUS=1
+
+    # differential equation
+    #      Original:  x''' = a*x'' + b x' + c x + d
+    #      Transform: y = x'
+    #                 z = y'
+    #                 z' = a*z + b*y + c*x + d
+    m.Equations([y==x.dt(),z==y.dt()])
+    m.Equation(z.dt()==a*z+b*y+c*x+d) # differential equation
+
+    m.options.IMODE = 5   # dynamic estimation(MHE)
+    m.options.NODES = nodes   # collocation nodes
+    m.solve(disp=disp)   # display solver output
+    return {'time': values(m.time), 'x': values(x), 'x_data': np.asarray(x_data),
+            'a': a.value[0], 'b': b.value[0], 'c': c.value[0], 'd': d.value[0],
+            'stats': solve_stats(m)}
+
+
+def plot(res):
+    import matplotlib.pyplot as plt  # plot solution
+    plt.plot(res['time'],res['x'],'bo',label='Predicted')
+    plt.plot(res['time'],res['x_data'],'rx',label='Measured')
+    plt.legend()
+    plt.xlabel('Time'), plt.ylabel('Value')
+    plt.show()
+
+
+if __name__ == '__main__':
+    res = estimate()
+    print(res['a'],res['b'],res['c'],res['d'])
+    plot(res)
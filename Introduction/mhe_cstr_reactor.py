@@ -27,187 +27,249 @@ See a related CSTR case study for details on the model.
 
 from gekko import GEKKO
 import numpy as np
-import matplotlib.pyplot as plt
-
-# Simulation
-s = GEKKO(remote=False,name='cstr-sim')
-
-# One step of simulation, discretization matches MHE
-s.time = np.linspace(0,.1,2)
-
-# Receive measurement from simulated control
-Tc = s.MV(value=300,name='tc')
-Tc.FSTATUS = 1 #receive measurement
-Tc.STATUS = 0  #don't optimize
-
-# Simulator variables
-Ca = s.SV(value=.7, ub=1, lb=0,name='ca')
-T = s.SV(value=335,lb=250,ub=500,name='t')
-
-# Parameters
-q = s.Param(value=100)
-V = s.Param(value=100)
-rho = s.Param(value=1000)
-Cp = s.Param(value=0.239)
-mdelH = s.Param(value=50000)
-ER = s.Param(value=8750)
-k0 = s.Param(value=7.2e10)
-UA = s.Param(value=5e4)
-Ca0 = s.Param(value=1)
-T0 = s.Param(value=350)
-
-# Variables
-k = s.Var()
-rate = s.Var()
-
-# Rate equations
-s.Equation(k==k0*s.exp(-ER/T))
-s.Equation(rate==k*Ca)
-# CSTR equations
-s.Equation(V* Ca.dt() == q*(Ca0-Ca)-V*rate)
-s.Equation(rho*Cp*V* T.dt() == q*rho*Cp*(T0-T) + V*mdelH*rate + UA*(Tc-T))
-
-# Options
-s.options.IMODE = 4 #dynamic simulation
-s.options.NODES = 3
-s.options.SOLVER = 3
-
-
-# MHE
-m = GEKKO(remote=False,name='cstr-mhe')
-
-# 11 time points in horizon (0.1 each step)
-m.time = np.linspace(0,1.0,21)
-
-# Parameter to Estimate
-UA_mhe = m.FV(value=1e4,name='ua')
-UA_mhe.STATUS = 1  # estimate
-UA_mhe.FSTATUS = 0 # no measurements
-# Upper and lower bounds for optimizer
-UA_mhe.LOWER = 30000
-UA_mhe.UPPER = 100000
-
-# Cooling Jacket Temperature
-Tc_mhe = m.MV(value=300,name='tc')
-Tc_mhe.STATUS = 0  # don't estimate
-Tc_mhe.FSTATUS = 1 # receive measurement
-
-# Reactor Temperature
-T_mhe = m.CV(value=335,lb=250,ub=500,name='t')
-T_mhe.FSTATUS = 1    # minimize error with measurement
-T_mhe.MEAS_GAP = 0.1 # measurement deadband gap
-
-# Reactor Concentration
-Ca_mhe = m.SV(value=0.5, ub=1, lb=0,name='ca')
-
-# Parameters
-q = m.Param(value=100)
-V = m.Param(value=100)
-rho = m.Param(value=1000)
-Cp = m.Param(value=0.239)
-mdelH = m.Param(value=50000)
-ER = m.Param(value=8750)
-k0 = m.Param(value=7.2e10)
-Ca0 = m.Param(value=1)
-T0 = m.Param(value=350)
-
-# Equation variables (2 other DOF from CV and FV)
-k = m.Var()
-rate = m.Var()
-
-# Reaction equations
-m.Equation(k==k0*m.exp(-ER/T_mhe))
-m.Equation(rate==k*Ca_mhe)
-# CSTR equations
-m.Equation(V* Ca_mhe.dt() == q*(Ca0-Ca_mhe)-V*rate) # mol balance
-m.Equation(rho*Cp*V* T_mhe.dt() == q*rho*Cp*(T0-T_mhe) \
-           + V*mdelH*rate + UA_mhe*(Tc_mhe-T_mhe))  # energy balance
-
-# Global Tuning
-m.options.IMODE = 5  # MHE
-m.options.EV_TYPE = 1
-m.options.NODES = 3
-m.options.SOLVER = 3 # IPOPT
-
-# Cycles to run
-cycles = 50
-
-# step in the jacket cooling temperature at cycle 6
-Tc_meas = np.empty(cycles)
-Tc_meas[0:15] = 280
-Tc_meas[5:cycles] = 300
-dt = 0.1 # min
-# time points for plot
-time = np.linspace(0,cycles*dt-dt,cycles)
-
-# allocate storage
-Ca_meas = np.empty(cycles)
-T_meas = np.empty(cycles)
-UA_mhe_store = np.empty(cycles)
-Ca_mhe_store = np.empty(cycles)
-T_mhe_store = np.empty(cycles)
-
-for i in range(cycles):
-    # Process
-    # input Tc (jacket cooling temperature)
-    Tc.MEAS = Tc_meas[i]
-    # simulate process model, 1 time step
-    s.solve(disp=False)
-    # retrieve Ca and T measurements
-    Ca_meas[i] = Ca.MODEL
-    T_meas[i] = T.MODEL
-
-    # Estimator
-    # input process measurements
-    # input Tc (jacket cooling temperature)
-    Tc_mhe.MEAS = Tc_meas[i]
-    # input T (reactor temperature)
-    T_mhe.MEAS = T_meas[i] #CV
-    # Solve MHE
-    m.solve(disp=False)
-    # check if successful
-    if m.options.APPSTATUS == 1:
-        # retrieve solution
-        UA_mhe_store[i] = UA_mhe.NEWVAL
-        Ca_mhe_store[i] = Ca_mhe.MODEL
-        T_mhe_store[i] = T_mhe.MODEL
-    else:
-        # failed solution
-        UA_mhe_store[i] = 0
-        Ca_mhe_store[i] = 0
-        T_mhe_store[i] = 0
-
-    print('MHE: Ca (est)=' + str(Ca_mhe_store[i]) + \
-        ' Ca (actual)=' + str(Ca_meas[i]) + \
-        ' UA (est)=' + str(UA_mhe_store[i]) + \
-        ' UA (actual)=50000')
-
-# plot results
-plt.figure()
-plt.subplot(411)
-plt.plot(time,Tc_meas,'k-',lw=2)
-plt.axis([0,time[-1],275,305])
-plt.ylabel('Jacket T (K)')
-plt.legend('T_c')
-
-plt.subplot(412)
-plt.plot([0,time[-1]],[50000,50000],'k--')
-plt.plot(time,UA_mhe_store,'r:',lw=2)
-plt.axis([0,time[-1],10000,100000])
-plt.ylabel('UA')
-plt.legend(['Actual UA','Predicted UA'],loc=4)
-
-plt.subplot(413)
-plt.plot(time,T_meas,'ro')
-plt.plot(time,T_mhe_store,'b-',lw=2)
-plt.axis([0,time[-1],300,340])
-plt.ylabel('Reactor T (K)')
-plt.legend(['Measured T','Predicted T'],loc=4)
-
-plt.subplot(414)
-plt.plot(time,Ca_meas,'go')
-plt.plot(time,Ca_mhe_store,'m-',lw=2)
-plt.axis([0,time[-1],.6,1])
-plt.ylabel('Reactor C_a (mol/L)')
-plt.legend(['Measured C_a','Predicted C_a'],loc=4)
-plt.show()
\ No newline at end of file
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.resultstore import open_results
+from tools.modelcache import cache_models, report
+from tools.stats import solve_stats, cycle_stats
+from tools.telemetry import LoopTelemetry
+from tools import rundirs
+from timeit import default_timer as timer
+
+
+def simulator(remote=False):
+    # Simulation
+    s = GEKKO(remote=remote,name='cstr-sim')
+
+    # One step of simulation, discretization matches MHE
+    s.time = np.linspace(0,.1,2)
+
+    # Receive measurement from simulated control
+    s.Tc = s.MV(value=300,name='tc')
+    s.Tc.FSTATUS = 1 #receive measurement
+    s.Tc.STATUS = 0  #don't optimize
+
+    # Simulator variables
+    s.Ca = s.SV(value=.7, ub=1, lb=0,name='ca')
+    s.T = s.SV(value=335,lb=250,ub=500,name='t')
+    Tc, Ca, T = s.Tc, s.Ca, s.T
+
+    # Parameters
+    q = s.Param(value=100)
+    V = s.Param(value=100)
+    rho = s.Param(value=1000)
+    Cp = s.Param(value=0.239)
+    mdelH = s.Param(value=50000)
+    ER = s.Param(value=8750)
+    k0 = s.Param(value=7.2e10)
+    UA = s.Param(value=5e4)
+    Ca0 = s.Param(value=1)
+    T0 = s.Param(value=350)
+
+    # Variables
+    k = s.Var()
+    rate = s.Var()
+
+    # Rate equations
+    s.Equation(k==k0*s.exp(-ER/T))
+    s.Equation(rate==k*Ca)
+    # CSTR equations
+    s.Equation(V* Ca.dt() == q*(Ca0-Ca)-V*rate)
+    s.Equation(rho*Cp*V* T.dt() == q*rho*Cp*(T0-T) + V*mdelH*rate + UA*(Tc-T))
+
+    # Options
+    s.options.IMODE = 4 #dynamic simulation
+    s.options.NODES = 3
+    s.options.SOLVER = 3
+    return s
+
+
+def estimator(remote=False):
+    # MHE
+    m = GEKKO(remote=remote,name='cstr-mhe')
+
+    # 11 time points in horizon (0.1 each step)
+    m.time = np.linspace(0,1.0,21)
+
+    # Parameter to Estimate
+    m.UA = m.FV(value=1e4,name='ua')
+    m.UA.STATUS = 1  # estimate
+    m.UA.FSTATUS = 0 # no measurements
+    # Upper and lower bounds for optimizer
+    m.UA.LOWER = 30000
+    m.UA.UPPER = 100000
+
+    # Cooling Jacket Temperature
+    m.Tc = m.MV(value=300,name='tc')
+    m.Tc.STATUS = 0  # don't estimate
+    m.Tc.FSTATUS = 1 # receive measurement
+
+    # Reactor Temperature
+    m.T = m.CV(value=335,lb=250,ub=500,name='t')
+    m.T.FSTATUS = 1    # minimize error with measurement
+    m.T.MEAS_GAP = 0.1 # measurement deadband gap
+
+    # Reactor Concentration
+    m.Ca = m.SV(value=0.5, ub=1, lb=0,name='ca')
+    UA_mhe, Tc_mhe, T_mhe, Ca_mhe = m.UA, m.Tc, m.T, m.Ca
+
+    # Parameters
+    q = m.Param(value=100)
+    V = m.Param(value=100)
+    rho = m.Param(value=1000)
+    Cp = m.Param(value=0.239)
+    mdelH = m.Param(value=50000)
+    ER = m.Param(value=8750)
+    k0 = m.Param(value=7.2e10)
+    Ca0 = m.Param(value=1)
+    T0 = m.Param(value=350)
+
+    # Equation variables (2 other DOF from CV and FV)
+    k = m.Var()
+    rate = m.Var()
+
+    # Reaction equations
+    m.Equation(k==k0*m.exp(-ER/T_mhe))
+    m.Equation(rate==k*Ca_mhe)
+    # CSTR equations
+    m.Equation(V* Ca_mhe.dt() == q*(Ca0-Ca_mhe)-V*rate) # mol balance
+    m.Equation(rho*Cp*V* T_mhe.dt() == q*rho*Cp*(T0-T_mhe) \
+               + V*mdelH*rate + UA_mhe*(Tc_mhe-T_mhe))  # energy balance
+
+    # Global Tuning
+    m.options.IMODE = 5  # MHE
+    m.options.EV_TYPE = 1
+    m.options.NODES = 3
+    m.options.SOLVER = 3 # IPOPT
+    return m
+
+
+def run(cycles=50, Tc_meas=None, results=None, period=None, remote=False, disp=False,
+        verbose=False):
+    """Estimate UA and Ca each cycle; results is an optional open_results() store.
+
+    The returned telemetry holds the per-cycle latencies (period in s counts
+    the cycles that overrun it).
+    """
+    s = simulator(remote)
+    m = estimator(remote)
+
+    if Tc_meas is None:
+        # step in the jacket cooling temperature at cycle 6
+        Tc_meas = np.empty(cycles)
+        Tc_meas[0:15] = 280
+        Tc_meas[5:cycles] = 300
+    dt = 0.1 # min
+    # time points for plot
+    time = np.linspace(0,cycles*dt-dt,cycles)
+
+    # allocate storage
+    Ca_meas = np.empty(cycles)
+    T_meas = np.empty(cycles)
+    UA_mhe_store = np.empty(cycles)
+    Ca_mhe_store = np.empty(cycles)
+    T_mhe_store = np.empty(cycles)
+    stats = []
+    # reuse the model files between cycles (GEKKO_MODEL_CACHE=0 to compare)
+    cache_models(s, m)
+    # pooled run directories, removed at exit (GEKKO_RUNDIR=off to keep them)
+    rundirs.pooled(s, m)
+    cycle_time = np.empty(cycles)
+    tel = LoopTelemetry(period).watch(plant=s, estimator=m)
+
+    for i in range(cycles):
+        start = timer()
+        # Process
+        # input Tc (jacket cooling temperature)
+        s.Tc.MEAS = Tc_meas[i]
+        # simulate process model, 1 time step
+        s.solve(disp=disp)
+        # retrieve Ca and T measurements
+        Ca_meas[i] = s.Ca.MODEL
+        T_meas[i] = s.T.MODEL
+
+        # Estimator
+        # input process measurements
+        # input Tc (jacket cooling temperature)
+        m.Tc.MEAS = Tc_meas[i]
+        # input T (reactor temperature)
+        m.T.MEAS = T_meas[i] #CV
+        # Solve MHE
+        m.solve(disp=disp)
+        # check if successful
+        if m.options.APPSTATUS == 1:
+            # retrieve solution
+            UA_mhe_store[i] = m.UA.NEWVAL
+            Ca_mhe_store[i] = m.Ca.MODEL
+            T_mhe_store[i] = m.T.MODEL
+        else:
+            # failed solution
+            UA_mhe_store[i] = 0
+            Ca_mhe_store[i] = 0
+            T_mhe_store[i] = 0
+        cycle_time[i] = timer() - start
+        tel.add_cycle(cycle_time[i])
+        stats.append(solve_stats(m))
+        if results:
+            results.append({'Tc_meas': Tc_meas[i], 'Ca_meas': Ca_meas[i],
+                            'T_meas': T_meas[i], 'UA_mhe': UA_mhe_store[i],
+                            'Ca_mhe': Ca_mhe_store[i], 'T_mhe': T_mhe_store[i]},
+                           time=time[i], status=m.options.APPSTATUS,
+                           solve_time=m.options.SOLVETIME, cycle=i)
+
+        if verbose:
+            print('MHE: Ca (est)=' + str(Ca_mhe_store[i]) + \
+                ' Ca (actual)=' + str(Ca_meas[i]) + \
+                ' UA (est)=' + str(UA_mhe_store[i]) + \
+                ' UA (actual)=50000')
+
+    return {'time': time, 'Tc_meas': Tc_meas, 'Ca_meas': Ca_meas, 'T_meas': T_meas,
+            'UA_mhe': UA_mhe_store, 'Ca_mhe': Ca_mhe_store, 'T_mhe': T_mhe_store,
+            'cycle_time': cycle_time, 'stats': cycle_stats(stats), 'telemetry': tel,
+            'models': (s, m)}
+
+
+def plot(res):
+    import matplotlib.pyplot as plt
+    time = res['time']
+    # plot results
+    plt.figure()
+    plt.subplot(411)
+    plt.plot(time,res['Tc_meas'],'k-',lw=2)
+    plt.axis([0,time[-1],275,305])
+    plt.ylabel('Jacket T (K)')
+    plt.legend('T_c')
+
+    plt.subplot(412)
+    plt.plot([0,time[-1]],[50000,50000],'k--')
+    plt.plot(time,res['UA_mhe'],'r:',lw=2)
+    plt.axis([0,time[-1],10000,100000])
+    plt.ylabel('UA')
+    plt.legend(['Actual UA','Predicted UA'],loc=4)
+
+    plt.subplot(413)
+    plt.plot(time,res['T_meas'],'ro')
+    plt.plot(time,res['T_mhe'],'b-',lw=2)
+    plt.axis([0,time[-1],300,340])
+    plt.ylabel('Reactor T (K)')
+    plt.legend(['Measured T','Predicted T'],loc=4)
+
+    plt.subplot(414)
+    plt.plot(time,res['Ca_meas'],'go')
+    plt.plot(time,res['Ca_mhe'],'m-',lw=2)
+    plt.axis([0,time[-1],.6,1])
+    plt.ylabel('Reactor C_a (mol/L)')
+    plt.legend(['Measured C_a','Predicted C_a'],loc=4)
+    plt.show()
+
+
+if __name__ == '__main__':
+    # GEKKO_RESULTS=<file> keeps every cycle for later analysis
+    res = run(results=open_results(), verbose=True)
+    # GEKKO_TELEMETRY=<file> exports the latency time series
+    print(res['telemetry'].report())
+    res['telemetry'].export()
+    print(report(*res['models']))
+    print(rundirs.report(*res['models']))
+    plot(res)
@@ -16,204 +16,293 @@ and the process K and τ ?
 import numpy as np
 from random import random
 from gekko import GEKKO
-import matplotlib.pyplot as plt
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.resultstore import open_results
+from tools.modelcache import cache_models, report
+from tools.stats import solve_stats, cycle_stats
+from tools.telemetry import LoopTelemetry
+from tools.checkpoint import Checkpoint
+from tools import rundirs
+from timeit import default_timer as timer
 
-# Process
-p = GEKKO()
 
-p.time = [0,.5]
+def process(K=1, tau=5, remote=False):
+    # Process
+    p = GEKKO(remote=remote)
 
-#Parameters
-p.u = p.MV()
-p.K = p.Param(value=1) #gain
-p.tau = p.Param(value=5) #time constant
+    p.time = [0,.5]
 
-#variable
-p.y = p.SV() #measurement
+    #Parameters
+    p.u = p.MV()
+    p.K = p.Param(value=K) #gain
+    p.tau = p.Param(value=tau) #time constant
 
-#Equations
-p.Equation(p.tau * p.y.dt() == -p.y + p.K * p.u)
+    #variable
+    p.y = p.SV() #measurement
 
-#options
-p.options.IMODE = 4
+    #Equations
+    p.Equation(p.tau * p.y.dt() == -p.y + p.K * p.u)
 
-# MHE Model
-m = GEKKO()
+    #options
+    p.options.IMODE = 4
+    return p
 
-m.time = np.linspace(0,20,41) #0-20 by 0.5 -- discretization must match simulation
 
-#Parameters
-m.u = m.MV() #input
-m.K = m.FV(value=3, lb=1, ub=3) #gain
-m.tau = m.FV(value=4, lb=1, ub=10) #time constant
+def estimator(remote=False):
+    # MHE Model
+    m = GEKKO(remote=remote)
 
-#Variables
-m.y = m.CV() #measurement
+    m.time = np.linspace(0,20,41) #0-20 by 0.5 -- discretization must match simulation
 
-#Equations
-m.Equation(m.tau * m.y.dt() == -m.y + m.K*m.u)
-
-#Options
-m.options.IMODE = 5 #MHE
-m.options.EV_TYPE = 1
-m.options.DIAGLEVEL = 0
-
-# STATUS = 0, optimizer doesn't adjust value
-# STATUS = 1, optimizer can adjust
-m.u.STATUS = 0
-m.K.STATUS = 1
-m.tau.STATUS = 1
-m.y.STATUS = 1
-
-# FSTATUS = 0, no measurement
-# FSTATUS = 1, measurement used to update model
-m.u.FSTATUS = 1
-m.K.FSTATUS = 0
-m.tau.FSTATUS = 0
-m.y.FSTATUS = 1
-
-# DMAX = maximum movement each cycle
-m.K.DMAX = 1
-m.tau.DMAX = .1
-
-# MEAS_GAP = dead-band for measurement / model mismatch
-m.y.MEAS_GAP = 0.25
-
-m.y.TR_INIT = 1
-
-
-# MPC Model
-c = GEKKO()
-
-c.time = np.linspace(0,5,11) #0-5 by 0.5 -- discretization must match simulation
-
-#Parameters
-c.u = c.MV(lb=-10,ub=10) #input
-c.K = c.FV(value=10, lb=1, ub=3) #gain
-c.tau = c.FV(value=1, lb=1, ub=10) #time constant
-
-#Variables
-c.y = c.CV() #measurement
-
-#Equations
-c.Equation(c.tau * c.y.dt() == -c.y + c.u * c.K)
-
-#Options
-c.options.IMODE = 6 #MPC
-c.options.CV_TYPE = 1
-
-# STATUS = 0, optimizer doesn't adjust value
-# STATUS = 1, optimizer can adjust
-c.u.STATUS = 1
-c.K.STATUS = 0
-c.tau.STATUS = 0
-c.y.STATUS = 1
-
-# FSTATUS = 0, no measurement
-# FSTATUS = 1, measurement used to update model
-c.u.FSTATUS = 0
-c.K.FSTATUS = 1
-c.tau.FSTATUS = 1
-c.y.FSTATUS = 1
-
-# DMAX = maximum movement each cycle
-c.u.DCOST = .1
-
-#y setpoint
-#if CV_TYPE = 1, use SPHI and SPLO
-sp = 3.0
-c.y.SPHI = sp + 0.1
-c.y.SPLO = sp - 0.1
-#if CV_TYPE = 2, use SP
-#c.y.SP = 3
-
-c.y.TR_INIT = 0
-
-# problem configuration
-# number of cycles
-cycles = 100
-# noise level
-noise = 0.25
-
-# run process, estimator and control for cycles
-y_meas = np.empty(cycles)
-y_est = np.empty(cycles)
-k_est = np.empty(cycles)
-tau_est = np.empty(cycles)
-u_cont = np.empty(cycles)
-sp_store = np.empty(cycles)
-
-# Create plot
-plt.figure(figsize=(10,7))
-plt.ion()
-plt.show()
-
-for i in range(cycles):
-    # set point changes
-    if i==20:
-        sp = 5.0
-    elif i==40:
-        sp = 2.0
-    elif i==60:
-        sp = 4.0
-    elif i==80:
-        sp = 3.0        
+    #Parameters
+    m.u = m.MV() #input
+    m.K = m.FV(value=3, lb=1, ub=3) #gain
+    m.tau = m.FV(value=4, lb=1, ub=10) #time constant
+
+    #Variables
+    m.y = m.CV() #measurement
+
+    #Equations
+    m.Equation(m.tau * m.y.dt() == -m.y + m.K*m.u)
+
+    #Options
+    m.options.IMODE = 5 #MHE
+    m.options.EV_TYPE = 1
+    m.options.DIAGLEVEL = 0
+
+    # STATUS = 0, optimizer doesn't adjust value
+    # STATUS = 1, optimizer can adjust
+    m.u.STATUS = 0
+    m.K.STATUS = 1
+    m.tau.STATUS = 1
+    m.y.STATUS = 1
+
+    # FSTATUS = 0, no measurement
+    # FSTATUS = 1, measurement used to update model
+    m.u.FSTATUS = 1
+    m.K.FSTATUS = 0
+    m.tau.FSTATUS = 0
+    m.y.FSTATUS = 1
+
+    # DMAX = maximum movement each cycle
+    m.K.DMAX = 1
+    m.tau.DMAX = .1
+
+    # MEAS_GAP = dead-band for measurement / model mismatch
+    m.y.MEAS_GAP = 0.25
+
+    m.y.TR_INIT = 1
+    return m
+
+
+def controller(sp=3.0, remote=False):
+    # MPC Model
+    c = GEKKO(remote=remote)
+
+    c.time = np.linspace(0,5,11) #0-5 by 0.5 -- discretization must match simulation
+
+    #Parameters
+    c.u = c.MV(lb=-10,ub=10) #input
+    c.K = c.FV(value=10, lb=1, ub=3) #gain
+    c.tau = c.FV(value=1, lb=1, ub=10) #time constant
+
+    #Variables
+    c.y = c.CV() #measurement
+
+    #Equations
+    c.Equation(c.tau * c.y.dt() == -c.y + c.u * c.K)
+
+    #Options
+    c.options.IMODE = 6 #MPC
+    c.options.CV_TYPE = 1
+
+    # STATUS = 0, optimizer doesn't adjust value
+    # STATUS = 1, optimizer can adjust
+    c.u.STATUS = 1
+    c.K.STATUS = 0
+    c.tau.STATUS = 0
+    c.y.STATUS = 1
+
+    # FSTATUS = 0, no measurement
+    # FSTATUS = 1, measurement used to update model
+    c.u.FSTATUS = 0
+    c.K.FSTATUS = 1
+    c.tau.FSTATUS = 1
+    c.y.FSTATUS = 1
+
+    # DMAX = maximum movement each cycle
+    c.u.DCOST = .1
+
+    #y setpoint
+    #if CV_TYPE = 1, use SPHI and SPLO
     c.y.SPHI = sp + 0.1
     c.y.SPLO = sp - 0.1
-    sp_store[i] = sp
-
-    ## controller
-    #load
-    c.tau.MEAS = m.tau.NEWVAL
-    c.K.MEAS = m.K.NEWVAL
-    if p.options.SOLVESTATUS == 1:
-        c.y.MEAS = p.y.MODEL
-    #change setpoint at time 25
-    if i == 25:
-        c.y.SPHI = 6.1
-        c.y.SPLO = 5.9
-    c.solve()
-    u_cont[i] = c.u.NEWVAL
-
-    ## process simulator
-    #load control move
-    p.u.MEAS = u_cont[i]
-    #simulate
-    p.solve()
-    #load output with white noise
-    y_meas[i] = p.y.MODEL + (random()-0.5)*noise
-
-    ## estimator
-    #load input and measured output
-    m.u.MEAS = u_cont[i]
-    m.y.MEAS = y_meas[i]
-    #optimize parameters
-    m.solve()
-    #store results
-    y_est[i] = m.y.MODEL
-    k_est[i] = m.K.NEWVAL
-    tau_est[i] = m.tau.NEWVAL
-
-    plt.clf()
+    #if CV_TYPE = 2, use SP
+    #c.y.SP = 3
+
+    c.y.TR_INIT = 0
+    return c
+
+
+def run(cycles=100, noise=0.25, K=1, tau=5, live=False, results=None, period=None,
+        remote=False, disp=False, checkpoint=None):
+    """Closed loop MHE + MPC; results is an optional open_results() store.
+
+    The returned telemetry holds the per-cycle latencies (period in s counts
+    the cycles that overrun it). checkpoint is a file that receives the loop
+    state after every cycle: calling run again with it after a crash resumes
+    at the last completed cycle with identical results (tools/checkpoint.py).
+    """
+    p = process(K, tau, remote)
+    m = estimator(remote)
+    sp = 3.0
+    c = controller(sp, remote)
+
+    # run process, estimator and control for cycles
+    y_meas = np.empty(cycles)
+    y_est = np.empty(cycles)
+    k_est = np.empty(cycles)
+    tau_est = np.empty(cycles)
+    u_cont = np.empty(cycles)
+    sp_store = np.empty(cycles)
+    stats = []
+    # reuse the model files between cycles (GEKKO_MODEL_CACHE=0 to compare)
+    cache_models(p, m, c)
+    # pooled run directories, removed at exit (GEKKO_RUNDIR=off to keep them)
+    rundirs.pooled(p, m, c)
+    cycle_time = np.empty(cycles)
+    tel = LoopTelemetry(period).watch(controller=c, plant=p, estimator=m)
+    arrays = {'y_meas': y_meas, 'y_est': y_est, 'k_est': k_est, 'tau_est': tau_est,
+              'u_cont': u_cont, 'sp_store': sp_store, 'cycle_time': cycle_time}
+    ck = Checkpoint(checkpoint) if checkpoint else None
+    first = 0
+    state = ck.restore(arrays, plant=p, estimator=m, controller=c) if ck else None
+    if state:
+        first = state['cycle']
+        sp, stats = state['extra']['sp'], state['extra']['stats']
+
+    if live:
+        # Create plot
+        import matplotlib.pyplot as plt
+        plt.figure(figsize=(10,7))
+        plt.ion()
+        plt.show()
+
+    for i in range(first, cycles):
+        start = timer()
+        # set point changes
+        if i==20:
+            sp = 5.0
+        elif i==40:
+            sp = 2.0
+        elif i==60:
+            sp = 4.0
+        elif i==80:
+            sp = 3.0        
+        c.y.SPHI = sp + 0.1
+        c.y.SPLO = sp - 0.1
+        sp_store[i] = sp
+
+        ## controller
+        #load
+        c.tau.MEAS = m.tau.NEWVAL
+        c.K.MEAS = m.K.NEWVAL
+        if p.options.SOLVESTATUS == 1:
+            c.y.MEAS = p.y.MODEL
+        #change setpoint at time 25
+        if i == 25:
+            c.y.SPHI = 6.1
+            c.y.SPLO = 5.9
+        c.solve(disp=disp)
+        u_cont[i] = c.u.NEWVAL
+
+        ## process simulator
+        #load control move
+        p.u.MEAS = u_cont[i]
+        #simulate
+        p.solve(disp=disp)
+        #load output with white noise
+        y_meas[i] = p.y.MODEL + (random()-0.5)*noise
+
+        ## estimator
+        #load input and measured output
+        m.u.MEAS = u_cont[i]
+        m.y.MEAS = y_meas[i]
+        #optimize parameters
+        m.solve(disp=disp)
+        #store results
+        y_est[i] = m.y.MODEL
+        k_est[i] = m.K.NEWVAL
+        tau_est[i] = m.tau.NEWVAL
+        cycle_time[i] = timer() - start
+        tel.add_cycle(cycle_time[i])
+        stats.append({'controller': solve_stats(c), 'estimator': solve_stats(m)})
+        if results:
+            results.append({'sp': sp, 'u': u_cont[i], 'y_meas': y_meas[i],
+                            'y_est': y_est[i], 'k_est': k_est[i], 'tau_est': tau_est[i]},
+                           time=i, status=min(c.options.APPSTATUS, m.options.APPSTATUS),
+                           solve_time=c.options.SOLVETIME + m.options.SOLVETIME,
+                           cycle=i, controller_time=c.options.SOLVETIME,
+                           estimator_time=m.options.SOLVETIME)
+        if ck:
+            ck.save(i + 1, arrays, extra={'sp': sp, 'stats': stats},
+                    plant=p, estimator=m, controller=c)
+
+        if live:
+            res = {'K': K, 'tau': tau, 'y_meas': y_meas[0:i], 'y_est': y_est[0:i],
+                   'sp': sp_store[0:i], 'k_est': k_est[0:i], 'tau_est': tau_est[0:i],
+                   'u': u_cont[0:i]}
+            plot(res, clear=True)
+            plt.draw()
+            plt.pause(0.05)
+
+    if ck:
+        ck.remove()
+    return {'K': K, 'tau': tau, 'y_meas': y_meas, 'y_est': y_est, 'sp': sp_store,
+            'k_est': k_est, 'tau_est': tau_est, 'u': u_cont, 'cycle_time': cycle_time,
+            'telemetry': tel,
+            'stats': {'controller': cycle_stats([s['controller'] for s in stats]),
+                      'estimator': cycle_stats([s['estimator'] for s in stats])},
+            'models': (p, m, c)}
+
+
+def plot(res, clear=False):
+    import matplotlib.pyplot as plt
+    n = len(res['y_meas'])
+    if clear:
+        plt.clf()
+    else:
+        plt.figure(figsize=(10,7))
     plt.subplot(4,1,1)
-    plt.plot(y_meas[0:i])
-    plt.plot(y_est[0:i])
-    plt.plot(sp_store[0:i])
+    plt.plot(res['y_meas'])
+    plt.plot(res['y_est'])
+    plt.plot(res['sp'])
     plt.legend(('meas','pred','setpoint'))
     plt.ylabel('y')
     plt.subplot(4,1,2)
-    plt.plot(np.ones(i)*p.K.value[0])
-    plt.plot(k_est[0:i])
+    plt.plot(np.ones(n)*res['K'])
+    plt.plot(res['k_est'])
     plt.legend(('actual','pred'))
     plt.ylabel('k')
     plt.subplot(4,1,3)
-    plt.plot(np.ones(i)*p.tau.value[0])
-    plt.plot(tau_est[0:i])
+    plt.plot(np.ones(n)*res['tau'])
+    plt.plot(res['tau_est'])
     plt.legend(('actual','pred'))
     plt.ylabel('tau')
     plt.subplot(4,1,4)
-    plt.plot(u_cont[0:i])
+    plt.plot(res['u'])
     plt.legend('u')
-    plt.draw()
-    plt.pause(0.05)
 
+
+if __name__ == '__main__':
+    # GEKKO_RESULTS=<file> keeps every cycle for later analysis,
+    # GEKKO_CHECKPOINT=<file> resumes an interrupted run
+    res = run(live=True, results=open_results(),
+              checkpoint=os.environ.get('GEKKO_CHECKPOINT'))
+    # GEKKO_TELEMETRY=<file> exports the latency time series
+    print(res['telemetry'].report())
+    res['telemetry'].export()
+    print(report(*res['models']))
+    print(rundirs.report(*res['models']))
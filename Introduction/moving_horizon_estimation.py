@@ -1,51 +1,91 @@
 from gekko import GEKKO
 import numpy as np
-import matplotlib.pyplot as plt  
-
-# Estimator Model
-m = GEKKO()
-m.time = p.time
-# Parameters
-m.u = m.MV(value=u_meas) #input
-m.K = m.FV(value=1, lb=1, ub=3)    # gain
-m.tau = m.FV(value=5, lb=1, ub=10) # time constant
-# Variables
-m.x = m.SV() #state variable
-m.y = m.CV(value=y_meas) #measurement
-# Equations
-m.Equations([m.tau * m.x.dt() == -m.x + m.u,
-             m.y == m.K * m.x])
-# Options
-m.options.IMODE = 5 #MHE
-m.options.EV_TYPE = 1
-# STATUS = 0, optimizer doesn't adjust value
-# STATUS = 1, optimizer can adjust
-m.u.STATUS = 0
-m.K.STATUS = 1
-m.tau.STATUS = 1
-m.y.STATUS = 1
-# FSTATUS = 0, no measurement
-# FSTATUS = 1, measurement used to update model
-m.u.FSTATUS = 1
-m.K.FSTATUS = 0
-m.tau.FSTATUS = 0
-m.y.FSTATUS = 1
-# DMAX = maximum movement each cycle
-m.K.DMAX = 2.0
-m.tau.DMAX = 4.0
-# MEAS_GAP = dead-band for measurement / model mismatch
-m.y.MEAS_GAP = 0.25
-
-# solve
-m.solve(disp=False)
-
-# Plot results
-plt.subplot(2,1,1)
-plt.plot(m.time,u_meas,'b:',label='Input (u) meas')
-plt.legend()
-plt.subplot(2,1,2)
-plt.plot(m.time,y_meas,'gx',label='Output (y) meas')
-plt.plot(p.time,p.y.value,'k-',label='Output (y) actual')
-plt.plot(m.time,m.y.value,'r--',label='Output (y) estimated')
-plt.legend()
-plt.show()
\ No newline at end of file
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.stats import solve_stats, values
+
+
+def simulate_process(K=1, tau=5, u=None, noise=0.25, remote=False):
+    """Simulated first order process data (u_meas, y_meas) with white noise."""
+    p = GEKKO(remote=remote)
+    p.time = np.linspace(0,20,41)
+    if u is None:
+        u = np.zeros(41); u[5:] = 2.0; u[20:] = 4.0; u[30:] = 1.0
+    p.u = p.Param(value=u)
+    p.K = p.Param(value=K)     # gain
+    p.tau = p.Param(value=tau) # time constant
+    p.y = p.Var()
+    p.Equation(p.tau * p.y.dt() == -p.y + p.K * p.u)
+    p.options.IMODE = 4
+    p.solve(disp=False)
+    y = values(p.y)
+    y_meas = y + (np.random.rand(len(y))-0.5)*noise
+    return {'time': values(p.time), 'u_meas': np.asarray(u, dtype=float),
+            'y_meas': y_meas, 'y_actual': y}
+
+
+def estimate(time=None, u_meas=None, y_meas=None, remote=False, disp=False):
+    """Estimate K and tau from the input/output data (simulated if not given)."""
+    if y_meas is None:
+        data = simulate_process(remote=remote)
+        time, u_meas, y_meas = data['time'], data['u_meas'], data['y_meas']
+    # Estimator Model
+    m = GEKKO(remote=remote)
+    m.time = time
+    # Parameters
+    m.u = m.MV(value=u_meas) #input
+    m.K = m.FV(value=1, lb=1, ub=3)    # gain
+    m.tau = m.FV(value=5, lb=1, ub=10) # time constant
+    # Variables
+    m.x = m.SV() #state variable
+    m.y = m.CV(value=y_meas) #measurement
+    # Equations
+    m.Equations([m.tau * m.x.dt() == -m.x + m.u,
+                 m.y == m.K * m.x])
+    # Options
+    m.options.IMODE = 5 #MHE
+    m.options.EV_TYPE = 1
+    # STATUS = 0, optimizer doesn't adjust value
+    # STATUS = 1, optimizer can adjust
+    m.u.STATUS = 0
+    m.K.STATUS = 1
+    m.tau.STATUS = 1
+    m.y.STATUS = 1
+    # FSTATUS = 0, no measurement
+    # FSTATUS = 1, measurement used to update model
+    m.u.FSTATUS = 1
+    m.K.FSTATUS = 0
+    m.tau.FSTATUS = 0
+    m.y.FSTATUS = 1
+    # DMAX = maximum movement each cycle
+    m.K.DMAX = 2.0
+    m.tau.DMAX = 4.0
+    # MEAS_GAP = dead-band for measurement / model mismatch
+    m.y.MEAS_GAP = 0.25
+
+    # solve
+    m.solve(disp=disp)
+    return {'time': values(m.time), 'y': values(m.y), 'K': m.K.value[0],
+            'tau': m.tau.value[0], 'stats': solve_stats(m)}
+
+
+def plot(data, est):
+    import matplotlib.pyplot as plt
+    # Plot results
+    plt.subplot(2,1,1)
+    plt.plot(data['time'],data['u_meas'],'b:',label='Input (u) meas')
+    plt.legend()
+    plt.subplot(2,1,2)
+    plt.plot(data['time'],data['y_meas'],'gx',label='Output (y) meas')
+    plt.plot(data['time'],data['y_actual'],'k-',label='Output (y) actual')
+    plt.plot(est['time'],est['y'],'r--',label='Output (y) estimated')
+    plt.legend()
+    plt.show()
+
+
+if __name__ == '__main__':
+    data = simulate_process()
+    est = estimate(data['time'], data['u_meas'], data['y_meas'])
+    print('K = %.3f, tau = %.3f' % (est['K'], est['tau']))
+    plot(data, est)
@@ -19,70 +19,105 @@ my revenue. I try to determine the optimal schedule with the following model:
 
 from gekko import GEKKO
 import numpy as np
-import matplotlib.pyplot as plt
-
-m       = GEKKO(remote=False)
-m.time  = np.linspace(0,5,6)
-orchard   = m.Param([0.0, 3.0, 7.0, 9.0, 5.0, 4.0])
-demand    = m.Param([0.0, 2.0, 4.0, 2.0, 4.0, 2.0]) 
-price     = m.Param([0.0, 0.8, 0.9, 0.5, 1.2, 1.5])
-
-### manipulated variables
-# selling on the market
-sell                = m.MV(lb=0, integer=True)
-sell.DCOST          = 0
-sell.STATUS         = 1
-# saving apples
-storage_out         = m.MV(value=0, lb=0, integer=True)
-storage_out.DCOST   = 0      
-storage_out.STATUS  = 1 
-storage_in          = m.MV(lb=0, integer=True)
-storage_in.DCOST    = 0
-storage_in.STATUS   = 1
-
-### storage space 
-storage         = m.Var(lb=0, ub=6, integer=True)
-### constraints
-# storage change
-m.Equation(storage.dt() == storage_in - storage_out) 
-
-# balance equation
-m.Equation(sell + storage_in + demand == storage_out + orchard)
-
-# Objective: argmax sum(sell[t]*price[t]) for t in [0,4]
-m.Maximize(sell*price)
-m.Minimize(1e-6 * storage_in)
-m.Minimize(1e-6 * storage_out)
-m.options.IMODE=6
-m.options.NODES=2
-m.options.SOLVER=1
-m.options.MAX_ITER=1000
-m.solve()
-
-print('Sell')
-print(sell.value)
-print('Storage Out')
-print(storage_out.value)
-print('Storage In')
-print(storage_in.value)
-print('Storage')
-print(storage.value)
-
-# ploting the results
-plt.subplot(3,1,1)
-plt.plot(m.time,storage.value,'b--',label='State of Storage')
-plt.ylabel('Apple Storage')
-plt.legend()
-plt.subplot(3,1,2)
-plt.plot(m.time,demand.value,'r--',label='Demand')
-plt.plot(m.time,orchard.value,'k:',label='Apple Harvest')
-plt.legend()
-plt.subplot(3,1,3)
-plt.plot(m.time,storage_in.value,'g--',label='save in storage')
-plt.plot(m.time,storage_out.value,'r:',label='take out of storage')
-plt.plot(m.time,sell.value,'k--',label='Sell to Market')
-plt.plot(m.time,sell.value,':',color='orange',label='Buy from Market')
-plt.ylabel('Apple')
-plt.legend()
-plt.xlabel('Time')
-plt.show()
\ No newline at end of file
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.stats import solve_stats, values
+
+# weekly harvest, own use and market price (leading zero for the initial point)
+ORCHARD = [0.0, 3.0, 7.0, 9.0, 5.0, 4.0]
+DEMAND  = [0.0, 2.0, 4.0, 2.0, 4.0, 2.0]
+PRICE   = [0.0, 0.8, 0.9, 0.5, 1.2, 1.5]
+
+
+def schedule(orchard=ORCHARD, demand=DEMAND, price=PRICE, capacity=6,
+             integer=True, remote=False, disp=True, backend='gekko'):
+    """Sales and storage schedule that maximizes revenue over the horizon.
+
+    backend='highs' solves the (MI)LP with tools/linear.py instead of APOPT.
+    """
+    m       = GEKKO(remote=remote)
+    m.time  = np.linspace(0,len(orchard)-1,len(orchard))
+    orchard   = m.Param(list(orchard))
+    demand    = m.Param(list(demand)) 
+    price     = m.Param(list(price))
+
+    ### manipulated variables
+    # selling on the market
+    sell                = m.MV(lb=0, integer=integer)
+    sell.DCOST          = 0
+    sell.STATUS         = 1
+    # saving apples
+    storage_out         = m.MV(value=0, lb=0, integer=integer)
+    storage_out.DCOST   = 0      
+    storage_out.STATUS  = 1 
+    storage_in          = m.MV(lb=0, integer=integer)
+    storage_in.DCOST    = 0
+    storage_in.STATUS   = 1
+
+    ### storage space 
+    storage         = m.Var(lb=0, ub=capacity, integer=integer)
+    ### constraints
+    # storage change
+    m.Equation(storage.dt() == storage_in - storage_out) 
+
+    # balance equation
+    m.Equation(sell + storage_in + demand == storage_out + orchard)
+
+    # Objective: argmax sum(sell[t]*price[t]) for t in [0,4]
+    m.Maximize(sell*price)
+    m.Minimize(1e-6 * storage_in)
+    m.Minimize(1e-6 * storage_out)
+    m.options.IMODE=6
+    m.options.NODES=2
+    m.options.SOLVER=1
+    m.options.MAX_ITER=1000
+    if backend == 'highs':
+        from tools.linear import solve
+        solve(m, disp=disp)
+    else:
+        m.solve(disp=disp)
+
+    res = dict(zip(('time', 'orchard', 'demand', 'price', 'sell', 'storage_out',
+                    'storage_in', 'storage'),
+                   values(m.time, orchard, demand, price, sell, storage_out,
+                          storage_in, storage)))
+    res['stats'] = solve_stats(m)
+    return res
+
+
+def plot(res):
+    import matplotlib.pyplot as plt
+    t = res['time']
+    # ploting the results
+    plt.subplot(3,1,1)
+    plt.plot(t,res['storage'],'b--',label='State of Storage')
+    plt.ylabel('Apple Storage')
+    plt.legend()
+    plt.subplot(3,1,2)
+    plt.plot(t,res['demand'],'r--',label='Demand')
+    plt.plot(t,res['orchard'],'k:',label='Apple Harvest')
+    plt.legend()
+    plt.subplot(3,1,3)
+    plt.plot(t,res['storage_in'],'g--',label='save in storage')
+    plt.plot(t,res['storage_out'],'r:',label='take out of storage')
+    plt.plot(t,res['sell'],'k--',label='Sell to Market')
+    plt.plot(t,res['sell'],':',color='orange',label='Buy from Market')
+    plt.ylabel('Apple')
+    plt.legend()
+    plt.xlabel('Time')
+    plt.show()
+
+
+if __name__ == '__main__':
+    res = schedule()
+
+    print('Sell')
+    print(res['sell'])
+    print('Storage Out')
+    print(res['storage_out'])
+    print('Storage In')
+    print(res['storage_in'])
+    print('Storage')
+    print(res['storage'])
+    plot(res)
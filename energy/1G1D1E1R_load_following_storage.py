@@ -12,67 +12,100 @@ this generator to meet the load without requiring significant overproduction.
 
 from gekko import GEKKO
 import numpy as np
-import matplotlib.pyplot as plt
-
-m = GEKKO(remote=False)
-m.time = np.linspace(0,1,101)
-
-# renewable energy source
-renewable = 3*np.cos(np.pi*m.time/6*24)+3
-num = len(m.time)
-center = np.ones(num)
-center[0:int(num/4)] = 0
-center[-int(num/4):] = 0
-renewable *= center
-r = m.Param(renewable)
-
-dg = m.MV(0, lb=-4, ub=4); dg.STATUS = 1
-d = m.Param(-2*np.sin(2*np.pi*m.time)+7)
-net = m.Intermediate(d-r)
-g = m.Var(d[0])       # production
-s = m.Var(0, lb=0)    # storage inventory
-store = m.Var()       # store energy rate
-s_in = m.Var(lb=0)    # store slack variable
-recover = m.Var()     # recover energy rate
-s_out = m.Var(lb=0)   # recover slack variable
-m.periodic(s)
-eta = 0.85            # storage efficiency
-m.Minimize(g)
-
-err = m.CV(0); err.STATUS = 1
-err.SPHI = err.SPLO = 0
-err.WSPHI = 1000; err.WSPLO = 1
-m.Minimize(0.01*err**2)
-
-m.Equations([g.dt() == dg,  
-             err == d - g - r + recover/eta - store,
-             g + r - d == s_out - s_in,
-             store == g + r - d + s_in,
-             recover == d - g - r + s_out,
-             s.dt() == store - recover/eta,
-             store * recover <= 0])
-
-m.options.SOLVER   = 1
-m.options.IMODE    = 6
-m.options.NODES    = 2
-m.solve()
-
-plt.figure(figsize=(7,5))
-plt.subplot(3,1,1)
-plt.plot(m.time,d,'r-',label='Demand')
-plt.plot(m.time,g,'b:',label='Prod')
-plt.plot(m.time,net,'k--',label='Net Demand')
-plt.legend(); plt.grid(); plt.xlim([0,1])
-
-plt.subplot(3,1,2)
-plt.plot(m.time,r,'b-',label='Source')
-plt.plot(m.time,dg,'k--',label='Ramp Rate')
-plt.legend(); plt.grid(); plt.xlim([0,1])
-
-plt.subplot(3,1,3)
-plt.plot(m.time,s,'k-',label='Storage')
-plt.plot(m.time,store,'g--', label='Store Rate')
-plt.plot(m.time,recover,'b:', label='Recover Rate')
-plt.xlim([0,1]); plt.xlabel('Time')
-plt.legend(); plt.grid()
-plt.show()
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.stats import solve_stats, values
+
+
+def renewable_profile(t):
+    """Daytime cosine source of the benchmark, zero in the first and last quarter."""
+    renewable = 3*np.cos(np.pi*t/6*24)+3
+    num = len(t)
+    center = np.ones(num)
+    center[0:int(num/4)] = 0
+    center[-int(num/4):] = 0
+    return renewable * center
+
+
+def load_following_storage(t=None, demand=None, renewable=None, eta=0.85,
+                           ramp=4, remote=False, disp=True):
+    """Benchmark V; returns demand, renewable, production and storage trajectories."""
+    m = GEKKO(remote=remote)
+    m.time = np.linspace(0,1,101) if t is None else np.asarray(t)
+
+    # renewable energy source
+    r = m.Param(renewable_profile(m.time) if renewable is None else renewable)
+
+    dg = m.MV(0, lb=-ramp, ub=ramp); dg.STATUS = 1
+    d = m.Param(-2*np.sin(2*np.pi*m.time)+7 if demand is None else demand)
+    net = m.Intermediate(d-r)
+    g = m.Var(d[0])       # production
+    s = m.Var(0, lb=0)    # storage inventory
+    store = m.Var()       # store energy rate
+    s_in = m.Var(lb=0)    # store slack variable
+    recover = m.Var()     # recover energy rate
+    s_out = m.Var(lb=0)   # recover slack variable
+    m.periodic(s)
+    m.Minimize(g)
+
+    err = m.CV(0); err.STATUS = 1
+    err.SPHI = err.SPLO = 0
+    err.WSPHI = 1000; err.WSPLO = 1
+    m.Minimize(0.01*err**2)
+
+    m.Equations([g.dt() == dg,  
+                 err == d - g - r + recover/eta - store,
+                 g + r - d == s_out - s_in,
+                 store == g + r - d + s_in,
+                 recover == d - g - r + s_out,
+                 s.dt() == store - recover/eta,
+                 store * recover <= 0])
+
+    m.options.SOLVER   = 1
+    m.options.IMODE    = 6
+    m.options.NODES    = 2
+    m.solve(disp=disp)
+
+    time, d, r, g, dg, s, store, recover = values(m.time, d, r, g, dg, s, store, recover)
+    return {'time': time, 'd': d, 'r': r, 'net': d - r, 'g': g, 'dg': dg, 's': s,
+            'store': store, 'recover': recover, 'stats': solve_stats(m)}
+
+
+def plot(res):
+    import matplotlib.pyplot as plt
+    t = res['time']
+    plt.figure(figsize=(7,5))
+    plt.subplot(3,1,1)
+    plt.plot(t,res['d'],'r-',label='Demand')
+    plt.plot(t,res['g'],'b:',label='Prod')
+    plt.plot(t,res['net'],'k--',label='Net Demand')
+    plt.legend(); plt.grid(); plt.xlim([0,1])
+
+    plt.subplot(3,1,2)
+    plt.plot(t,res['r'],'b-',label='Source')
+    plt.plot(t,res['dg'],'k--',label='Ramp Rate')
+    plt.legend(); plt.grid(); plt.xlim([0,1])
+
+    plt.subplot(3,1,3)
+    plt.plot(t,res['s'],'k-',label='Storage')
+    plt.plot(t,res['store'],'g--', label='Store Rate')
+    plt.plot(t,res['recover'],'b:', label='Recover Rate')
+    plt.xlim([0,1]); plt.xlabel('Time')
+    plt.legend(); plt.grid()
+    plt.show()
+
+
+if __name__ == '__main__':
+    from tools.resultstore import open_results
+
+    res = load_following_storage()
+
+    # GEKKO_RESULTS=<file> keeps the trajectories for later analysis
+    results = open_results()
+    if results:
+        results.append({k: res[k] for k in ('d', 'r', 'g', 'dg', 's', 'store', 'recover')},
+                       time=res['time'], status=res['stats']['status'],
+                       solve_time=res['stats']['solve_time'])
+
+    plot(res)
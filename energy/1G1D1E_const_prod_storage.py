@@ -15,42 +15,70 @@ to use automatic differentiation to provide exact gradients to the solver.
 
 from gekko import GEKKO
 import numpy as np
-import matplotlib.pyplot as plt
-
-m = GEKKO(remote=False)
-m.time = np.linspace(0,1,101)
-
-g = m.FV(); g.STATUS = 1 # production
-s = m.Var(1e-2, lb=0)    # storage inventory
-store = m.Var()          # store energy rate
-s_in = m.Var(lb=0)       # store slack variable
-recover = m.Var()        # recover energy rate
-s_out = m.Var(lb=0)      # recover slack variable
-eta = 0.7
-d = m.Param(-2*np.sin(2*np.pi*m.time)+10)
-m.periodic(s)
-m.Equations([g + recover/eta - store >= d,
-             g - d == s_out - s_in,
-             store == g - d + s_in,
-             recover == d - g + s_out,
-             s.dt() == store - recover/eta,
-             store * recover <= 0])
-m.Minimize(g)
-
-m.options.SOLVER   = 1
-m.options.IMODE    = 6
-m.options.NODES    = 3
-m.solve()
-
-plt.figure(figsize=(6,3))
-plt.subplot(2,1,1)
-plt.plot(m.time,d,'r-',label='Demand')
-plt.plot(m.time,g,'b:',label='Prod')
-plt.legend(); plt.grid(); plt.xlim([0,1])
-
-plt.subplot(2,1,2)
-plt.plot(m.time,s,'k-',label='Storage')
-plt.plot(m.time,store,'g--', label='Store Rate')
-plt.plot(m.time,recover,'b:', label='Recover Rate')
-plt.legend(); plt.grid(); plt.xlim([0,1])
-plt.show()
\ No newline at end of file
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.stats import solve_stats, values
+
+
+def const_prod_storage(t=None, demand=None, eta=0.7, remote=False, disp=True):
+    """Benchmark IV; returns demand, constant production and storage trajectories."""
+    m = GEKKO(remote=remote)
+    m.time = np.linspace(0,1,101) if t is None else np.asarray(t)
+
+    g = m.FV(); g.STATUS = 1 # production
+    s = m.Var(1e-2, lb=0)    # storage inventory
+    store = m.Var()          # store energy rate
+    s_in = m.Var(lb=0)       # store slack variable
+    recover = m.Var()        # recover energy rate
+    s_out = m.Var(lb=0)      # recover slack variable
+    d = m.Param(-2*np.sin(2*np.pi*m.time)+10 if demand is None else demand)
+    m.periodic(s)
+    m.Equations([g + recover/eta - store >= d,
+                 g - d == s_out - s_in,
+                 store == g - d + s_in,
+                 recover == d - g + s_out,
+                 s.dt() == store - recover/eta,
+                 store * recover <= 0])
+    m.Minimize(g)
+
+    m.options.SOLVER   = 1
+    m.options.IMODE    = 6
+    m.options.NODES    = 3
+    m.solve(disp=disp)
+
+    time, d, g, s, store, recover = values(m.time, d, g, s, store, recover)
+    return {'time': time, 'd': d, 'g': g, 's': s, 'store': store,
+            'recover': recover, 'stats': solve_stats(m)}
+
+
+def plot(res):
+    import matplotlib.pyplot as plt
+    t = res['time']
+    plt.figure(figsize=(6,3))
+    plt.subplot(2,1,1)
+    plt.plot(t,res['d'],'r-',label='Demand')
+    plt.plot(t,res['g'],'b:',label='Prod')
+    plt.legend(); plt.grid(); plt.xlim([0,1])
+
+    plt.subplot(2,1,2)
+    plt.plot(t,res['s'],'k-',label='Storage')
+    plt.plot(t,res['store'],'g--', label='Store Rate')
+    plt.plot(t,res['recover'],'b:', label='Recover Rate')
+    plt.legend(); plt.grid(); plt.xlim([0,1])
+    plt.show()
+
+
+if __name__ == '__main__':
+    from tools.resultstore import open_results
+
+    res = const_prod_storage()
+
+    # GEKKO_RESULTS=<file> keeps the trajectories for later analysis
+    results = open_results()
+    if results:
+        results.append({k: res[k] for k in ('d', 'g', 's', 'store', 'recover')},
+                       time=res['time'], status=res['stats']['status'],
+                       solve_time=res['stats']['solve_time'])
+
+    plot(res)
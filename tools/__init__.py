@@ -0,0 +1,5 @@
+"""
+Shared helpers for the Gekko examples in energy/ and Introduction/: binary data
+stores, caches, solve statistics and batch drivers. The example scripts stay
+runnable on their own and only import from here when they need these features.
+"""
@@ -0,0 +1,303 @@
+"""
+Local stand-in for the APMonitor server behind GEKKO(remote=True).
+
+Remote models send every solve to a public server: the model, csv data and
+options go up one HTTP request at a time, the solve output streams back and
+results.json/options.json are downloaded. On isolated nodes that server is
+unreachable. StandIn speaks the same protocol over HTTP on localhost and runs
+the apm binary shipped with gekko, so the remote code path (and the state the
+server keeps between solves of one model) can be exercised offline:
+
+    with standin() as server:
+        m = GEKKO(remote=True, server=server.url)
+        ...
+        m.solve()
+    server.stats            # requests, solves and seconds spent in apm
+
+    python tools/apmserver.py 8080            # serve until Ctrl-C
+    python tools/apmserver.py --latency       # where the time of a battery
+                                              # solve goes: local vs stand-in
+    python tools/apmserver.py --latency --public   # and the public server
+
+Protocol (what gekko/apm.py sends):
+
+    POST /online/apm_line.php  p=<model name> a=<line>
+         'clear all|apm|csv|meas', 'csv <file>', 'info <file>',
+         'meas <file>' (measurements.dbs), 'solve' (streams the apm output);
+         any other line is appended to the model file
+    GET  /ip.php                                  client address
+    GET  /online/<address>_<model name>/<file>    a file of the model
+
+Every client address and model name has its own directory under root, kept
+until 'clear all' (GEKKO() sends it on construction) or stop().
+"""
+
+import contextlib
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from timeit import default_timer as timer
+from urllib.parse import parse_qs, unquote
+
+PUBLIC = 'https://byu.apmonitor.com'
+_FILES = {'csv': '{app}.csv', 'info': '{app}.info', 'meas': 'measurements.dbs'}
+
+
+def apm_binary():
+    """Path of the apm executable shipped with gekko for this platform."""
+    import gekko
+    machine = os.uname()[4] if hasattr(os, 'uname') else ''
+    if sys.platform.startswith('win'):
+        name = 'apm.exe'
+    elif sys.platform == 'darwin':
+        name = 'apm_mac'
+    elif machine.startswith(('aarch64', 'arm64')):
+        name = 'apm_aarch64'
+    elif machine.startswith('arm'):
+        name = 'apm_arm'
+    else:
+        name = 'apm'
+    return os.path.join(os.path.dirname(os.path.abspath(gekko.__file__)), 'bin', name)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def _dir(self, app, address=None):
+        name = '%s_%s' % (address or self.client_address[0], app)
+        return os.path.join(self.server.root, name.replace('/', '_'))
+
+    def _reply(self, body, status=200):
+        data = body.encode() if isinstance(body, str) else body
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.count('requests')
+        path = unquote(self.path.split('?', 1)[0])
+        if path == '/ip.php':
+            return self._reply(self.client_address[0])
+        parts = path.strip('/').split('/')
+        if len(parts) == 3 and parts[0] == 'online' and '_' in parts[1]:
+            address, app = parts[1].split('_', 1)
+            name = os.path.join(self._dir(app, address), os.path.basename(parts[2]))
+            if os.path.isfile(name):
+                with open(name, 'rb') as f:
+                    return self._reply(f.read())
+        self._reply('not found', 404)
+
+    def do_POST(self):
+        self.server.count('requests')
+        if self.path.split('?', 1)[0] != '/online/apm_line.php':
+            return self._reply('not found', 404)
+        form = parse_qs(self.rfile.read(int(self.headers.get('Content-Length', 0))).decode(),
+                        keep_blank_values=True)
+        app = form.get('p', [''])[0].lower().replace(' ', '')
+        line = form.get('a', [''])[0]
+        if not app:
+            return self._reply('@error: no application name', 400)
+        path = self._dir(app)
+        os.makedirs(path, exist_ok=True)
+        word, _, rest = line.partition(' ')
+        if word == 'solve':
+            return self._solve(path, app)
+        if word == 'clear':
+            what = rest.strip()
+            if what == 'all':
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                name = os.path.join(path, _FILES.get(what, '{app}.' + what).format(app=app))
+                if os.path.isfile(name):
+                    os.remove(name)
+            return self._reply('')
+        if word in _FILES:
+            with open(os.path.join(path, _FILES[word].format(app=app)), 'w') as f:
+                f.write(rest)
+            return self._reply('')
+        with open(os.path.join(path, app + '.apm'), 'a') as f:
+            f.write(line + '\n')
+        self._reply('')
+
+    def _solve(self, path, app):
+        # HTTP/1.0 without a length: the client reads the output until close
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.end_headers()
+        start = timer()
+        proc = subprocess.Popen([self.server.apm, app], cwd=path, stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, env={'PATH': path})
+        for line in proc.stdout:
+            self.wfile.write(line)
+        proc.wait()
+        self.server.count('solves', timer() - start)
+
+
+class StandIn(ThreadingHTTPServer):
+    """APMonitor stand-in server on localhost (port 0: any free port).
+
+    root -- directory of the model directories (default: a temporary one,
+            removed by stop())
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0, root=None, host='127.0.0.1'):
+        ThreadingHTTPServer.__init__(self, (host, port), _Handler)
+        self._own_root = root is None
+        self.root = root or tempfile.mkdtemp(prefix='gekko-standin-')
+        self.apm = apm_binary()
+        self.url = 'http://%s:%d' % self.server_address[:2]
+        self.stats = {'requests': 0, 'solves': 0, 'apm_seconds': 0.0}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def count(self, key, seconds=None):
+        with self._lock:
+            self.stats[key] += 1
+            if seconds is not None:
+                self.stats['apm_seconds'] += seconds
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.server_close()
+        if self._own_root:
+            shutil.rmtree(self.root, ignore_errors=True)
+
+
+@contextlib.contextmanager
+def standin(port=0, root=None):
+    """Run a StandIn in a background thread while the block executes."""
+    server = StandIn(port, root).start()
+    try:
+        yield server
+    finally:
+        server.stop()
+
+
+class _Transfers(object):
+    """Times the HTTP requests of remote solves by kind while active."""
+
+    def __init__(self):
+        self.seconds = {'upload': 0.0, 'solve': 0.0, 'download': 0.0, 'clear all': 0.0}
+        self.requests = 0
+
+    def __enter__(self):
+        import gekko
+        gk = sys.modules['gekko.gekko']     # the module, not gekko.GEKKO
+        self._saved = gk.cmd, gk.get_file
+        cmd, get_file = self._saved
+
+        def timed_cmd(server, app, aline, *args, **kwargs):
+            start = timer()
+            try:
+                return cmd(server, app, aline, *args, **kwargs)
+            finally:
+                kind = aline if aline in ('solve', 'clear all') else 'upload'
+                self._add(kind, timer() - start)
+
+        def timed_get_file(*args, **kwargs):
+            start = timer()
+            try:
+                return get_file(*args, **kwargs)
+            finally:
+                self._add('download', timer() - start)
+
+        gk.cmd, gk.get_file = timed_cmd, timed_get_file
+        return self
+
+    def _add(self, kind, seconds):
+        self.seconds[kind] += seconds
+        self.requests += 1
+
+    def __exit__(self, *exc):
+        gk = sys.modules['gekko.gekko']
+        gk.cmd, gk.get_file = self._saved
+
+
+def measure(remote=False, server=None, repeat=5, name='battery', **options):
+    """Mean seconds per phase of repeated solves of an example (see latency)."""
+    from tools import examples
+    from tools.profiler import Profiler
+    fn = examples.function(name)
+    if remote:
+        options['server'] = getattr(server, 'url', server)
+    fn(remote=remote, disp=False, **options)     # imports, first run
+    apm = server.stats['apm_seconds'] if isinstance(server, StandIn) else 0.0
+    start = timer()
+    with Profiler() as prof, _Transfers() as net:
+        for _ in range(repeat):
+            fn(remote=remote, disp=False, **options)
+    wall = timer() - start
+    phases = {}
+    for model in prof.stats().values():
+        for phase, s in model.items():
+            phases[phase] = phases.get(phase, 0.0) + s['seconds']
+    # GEKKO() sends 'clear all' to the server: upload, not construct
+    out = {'construct': phases.get('construct', 0.0) - net.seconds['clear all'],
+           'build': phases.get('build', 0.0) + phases.get('write', 0.0),
+           'upload': net.seconds['upload'] + net.seconds['clear all'],
+           'apm': phases.get('solver', 0.0),
+           'server': 0.0, 'download': net.seconds['download'],
+           'read': phases.get('read', 0.0), 'wall': wall}
+    if remote:
+        # the solve request is apm on the server plus HTTP and streaming;
+        # the public server does not report its apm time
+        out['apm'] = (server.stats['apm_seconds'] - apm if isinstance(server, StandIn)
+                      else net.seconds['solve'])
+        out['server'] = net.seconds['solve'] - out['apm']
+    out = {k: v / repeat for k, v in out.items()}
+    out['requests'] = net.requests / repeat
+    return out
+
+
+def latency(repeat=5, public=False, name='battery', **options):
+    """Per-solve phase times of an example: local, stand-in (and public) server."""
+    rows = {'local': measure(False, None, repeat, name, **options)}
+    with standin() as server:
+        rows['stand-in'] = measure(True, server, repeat, name, **options)
+    if public:
+        rows['public'] = measure(True, PUBLIC, repeat, name, **options)
+    return rows
+
+
+def report(rows):
+    cols = ('construct', 'build', 'upload', 'apm', 'server', 'download', 'read', 'wall')
+    lines = ['%-9s %9s ' % ('ms/solve', 'requests') + ' '.join('%9s' % c for c in cols)]
+    for mode, r in rows.items():
+        lines.append('%-9s %9d ' % (mode, r['requests'])
+                     + ' '.join('%9.1f' % (1e3 * r[c]) for c in cols))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args = sys.argv[1:]
+    if '--latency' in args:
+        print(report(latency(public='--public' in args)))
+        sys.exit(0)
+    port = int(args[0]) if args else 8080
+    server = StandIn(port)
+    print('APMonitor stand-in on %s (models in %s)' % (server.url, server.root))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
@@ -0,0 +1,263 @@
+"""
+Benchmark runner for the registered examples (tools/examples.py).
+
+Each benchmark runs its example function `warmup` times untimed and then
+`repeat` times. Every GEKKO solve inside a run is recorded, and each run
+reports:
+
+    wall        seconds for the whole example call
+    build       Python-side time outside m.solve() (model construction, data)
+    solve_wall  seconds inside m.solve() (file writes, solver process, load)
+    solver      sum of SOLVETIME, the solver's own time
+    solves      number of m.solve() calls
+    iterations  sum of ITERATIONS
+    objective   OBJFCNVAL of the last solve
+    status      lowest APPSTATUS (1 when every solve succeeded)
+
+Examples that do not solve with GEKKO (charging_station uses linprog, sysid
+with pred='meas' is a linear regression) report the stats dict they return
+instead, and status 1 when it has none. The results go to JSON, and a previous
+file can serve as the baseline:
+
+    python tools/bench.py -o bench.json                    # default set
+    python tools/bench.py --all -n 5 -o bench.json         # include the slow fits
+    python tools/bench.py mhe_cstr battery --baseline bench.json
+
+With --history every timed solve is also appended, with its model size, to
+the runtime history of tools/sizing.py, which its runtime estimates are
+fitted to.
+
+With --baseline the median wall and solver times are compared, and a
+benchmark that is slower by more than --threshold (default 0.2) is flagged.
+Changed objectives and failed solves are flagged as well, and the exit
+status is 1 when anything is flagged. A benchmark that raises is recorded
+with its error (status 0) and the others still run.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+import weakref
+from timeit import default_timer as timer
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools import examples
+from tools.sizing import model_size, record
+
+# name -> options for the example function; fits bypass tools/fitcache.py
+BENCHMARKS = {
+    'load_following':         {'disp': False},
+    'const_prod_storage':     {'disp': False},
+    'load_following_storage': {'disp': False},
+    'battery':                {'disp': False},
+    'charging_station':       {'disp': False},
+    'orchard':                {'disp': False},
+    'mhe_cstr':               {'cycles': 30},
+    'mhe_no_mpc':             {'cycles': 30},
+    'mhe_mpc':                {'cycles': 30},
+    'bad_data':               {'n_iter': 30, 'remote': False},
+    'siso':                   {'cache': False},
+    'neural_net':             {'cache': False},
+}
+# minutes per run, only with --all
+SLOW = {
+    'mimo':                   {'cache': False},
+    'lstm_2nd_order':         {'cache': False, 'disp': False},
+}
+METRICS = ('wall', 'build', 'solve_wall', 'solver', 'solves', 'iterations',
+           'objective', 'status')
+OBJECTIVE_RTOL = 1e-4
+
+
+@contextlib.contextmanager
+def recording(sizes=False):
+    """Collect one record per GEKKO solve (of any model) while active.
+
+    With sizes=True each record also holds the model size (tools/sizing.py),
+    estimated once per model.
+    """
+    from gekko import GEKKO
+    solve = GEKKO.solve
+    log = []
+    known = weakref.WeakKeyDictionary()
+
+    def recorded_solve(m, *args, **kwargs):
+        if sizes and m not in known:
+            known[m] = model_size(m)
+        start = timer()
+        try:
+            return solve(m, *args, **kwargs)
+        finally:
+            log.append({'wall': timer() - start,
+                        'solve_time': float(m.options.SOLVETIME),
+                        'iterations': int(m.options.ITERATIONS),
+                        'objective': float(m.options.OBJFCNVAL),
+                        'status': int(m.options.APPSTATUS),
+                        'size': known.get(m)})
+
+    GEKKO.solve = recorded_solve
+    try:
+        yield log
+    finally:
+        GEKKO.solve = solve
+
+
+def run_once(name, options, history=False):
+    fn = examples.function(name)
+    with recording(sizes=history) as log:
+        start = timer()
+        res = fn(**options)
+        wall = timer() - start
+    if history:
+        for r in log:
+            if r['status'] == 1:
+                record(r['size'], r['solve_time'], example=name, wall=r['wall'])
+    if log:
+        solve_wall = sum(r['wall'] for r in log)
+        return {'wall': wall, 'build': wall - solve_wall, 'solve_wall': solve_wall,
+                'solver': sum(r['solve_time'] for r in log), 'solves': len(log),
+                'iterations': sum(r['iterations'] for r in log),
+                'objective': log[-1]['objective'],
+                'status': min(r['status'] for r in log)}
+    # no GEKKO solve: fall back to the stats the example returns
+    st = res.get('stats', {}) if isinstance(res, dict) else {}
+    n = len(np.atleast_1d(st.get('status', [])))
+    return {'wall': wall, 'build': 0.0, 'solve_wall': wall, 'solver': wall,
+            'solves': n,
+            'iterations': int(np.sum(st.get('iterations', 0))),
+            'objective': float(np.atleast_1d(st.get('objective', [np.nan]))[-1]),
+            'status': int(np.min(st['status'])) if n else 1}
+
+
+def summarize(runs):
+    out = {}
+    for k in METRICS:
+        v = np.array([r[k] for r in runs], dtype=float)
+        out[k] = {'min': v.min(), 'median': float(np.median(v)),
+                  'mean': v.mean(), 'max': v.max()}
+    return out
+
+
+def run(names=None, repeat=3, warmup=1, include_slow=False, progress=None,
+        history=False):
+    """Run the benchmarks; returns the JSON-ready result dict."""
+    table = dict(BENCHMARKS, **SLOW) if include_slow else BENCHMARKS
+    names = names or list(table)
+    results = {}
+    for name in names:
+        options = table.get(name, SLOW.get(name, {}))
+        try:
+            for _ in range(warmup):
+                run_once(name, options)
+            runs = [run_once(name, options, history) for _ in range(repeat)]
+        except Exception as exc:
+            # keep the other results (e.g. an example whose data is unreachable)
+            summary = {k: {'min': np.nan, 'median': np.nan, 'mean': np.nan, 'max': np.nan}
+                       for k in METRICS}
+            summary['status'] = {'min': 0, 'median': 0, 'mean': 0, 'max': 0}
+            results[name] = {'options': options, 'runs': [], 'error': repr(exc),
+                             'summary': summary}
+        else:
+            results[name] = {'options': options, 'runs': runs, 'summary': summarize(runs)}
+        if progress:
+            progress(name, results[name])
+    import gekko
+    return {'meta': {'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                     'python': platform.python_version(),
+                     'gekko': getattr(gekko, '__version__', '?'),
+                     'machine': platform.machine(), 'node': platform.node(),
+                     'repeat': repeat, 'warmup': warmup},
+            'benchmarks': results}
+
+
+def compare(current, baseline, threshold=0.2):
+    """List of (name, message) for regressions and changed results."""
+    flags = []
+    for name, cur in sorted(current['benchmarks'].items()):
+        base = baseline.get('benchmarks', {}).get(name)
+        c = cur['summary']
+        if 'error' in cur:
+            flags.append((name, 'raised ' + cur['error']))
+            continue
+        if c['status']['min'] < 1:
+            flags.append((name, 'failed solve (status %d)' % c['status']['min']))
+        if base is None:
+            continue
+        if base['options'] != cur['options']:
+            flags.append((name, 'options differ from the baseline, not compared'))
+            continue
+        b = base['summary']
+        for k in ('wall', 'solver'):
+            new, old = c[k]['median'], b[k]['median']
+            if old > 0 and new > old * (1 + threshold):
+                flags.append((name, '%s %.3f s vs %.3f s (+%.0f%%)'
+                              % (k, new, old, 100 * (new / old - 1))))
+        new, old = c['objective']['median'], b['objective']['median']
+        if not np.isclose(new, old, rtol=OBJECTIVE_RTOL, atol=1e-9) and \
+                not (np.isnan(new) and np.isnan(old)):
+            flags.append((name, 'objective %.6g vs %.6g' % (new, old)))
+    return flags
+
+
+def report(result):
+    lines = ['%-24s %8s %8s %8s %8s %6s %10s %6s' % (
+        'benchmark', 'wall', 'build', 'solve', 'solver', 'solves', 'objective', 'status')]
+    for name, r in result['benchmarks'].items():
+        s = r['summary']
+        if 'error' in r:
+            lines.append('%-24s error: %s' % (name, r['error']))
+            continue
+        lines.append('%-24s %8.3f %8.3f %8.3f %8.3f %6d %10.4g %6d' % (
+            name, s['wall']['median'], s['build']['median'],
+            s['solve_wall']['median'], s['solver']['median'],
+            s['solves']['median'], s['objective']['median'], s['status']['min']))
+    return '\n'.join(lines)
+
+
+def _json_default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(repr(o))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the Gekko examples.')
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default: all fast ones)')
+    parser.add_argument('-n', '--repeat', type=int, default=3)
+    parser.add_argument('-w', '--warmup', type=int, default=1)
+    parser.add_argument('--all', action='store_true', help='include the slow fits')
+    parser.add_argument('-o', '--output', help='write the results as JSON')
+    parser.add_argument('--baseline', help='JSON file of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='relative slow-down flagged as a regression')
+    parser.add_argument('--history', action='store_true',
+                        help='append every solve to the sizing runtime history')
+    args = parser.parse_args()
+
+    def progress(name, r):
+        s = r['summary']
+        if 'error' in r:
+            print('%-24s error: %s' % (name, r['error']), file=sys.stderr)
+            return
+        print('%-24s %8.3f s wall, %8.3f s solver' % (
+            name, s['wall']['median'], s['solver']['median']), file=sys.stderr)
+
+    result = run(args.names, args.repeat, args.warmup, args.all, progress, args.history)
+    print(report(result))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=1, default=_json_default)
+    if args.baseline:
+        with open(args.baseline) as f:
+            flags = compare(result, json.load(f), args.threshold)
+    else:
+        flags = compare(result, {})
+    for name, msg in flags:
+        print('FLAG %s: %s' % (name, msg))
+    sys.exit(1 if flags else 0)
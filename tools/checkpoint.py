@@ -0,0 +1,164 @@
+"""
+Checkpoint and resume for long closed-loop and rolling-horizon runs.
+
+A checkpoint holds what a loop needs to continue exactly where it stopped:
+
+    cycle    index of the next cycle to run
+    arrays   the loop's result arrays
+    models   per role: the GEKKO options, the attributes of every variable,
+             parameter and intermediate (VALUE, NEWVAL, MEAS, STATUS, ...)
+             and the files of the run directory (APM's warm start state:
+             *.t0, *.dxdt, results)
+    rng      state of the global random and numpy.random generators
+    extra    any other picklable loop state (set point, solve stats, phase)
+
+    ck = Checkpoint('mhe_mpc.ckpt')
+    state = ck.restore(plant=p, estimator=m)      # None without a checkpoint
+    start = state['cycle'] if state else 0
+    for i in range(start, cycles):
+        ...
+        ck.save(i + 1, arrays, extra={'sp': sp}, plant=p, estimator=m)
+    ck.remove()                                   # after a completed run
+
+The loop builds its models as usual and restore() overwrites their state,
+so a resumed run sends the solver exactly the inputs of an uninterrupted one
+and its results are bit-identical. Saves go to a temporary file that is
+renamed over the previous checkpoint, so a crash during a save keeps the
+last complete one. A save costs a few ms (mostly reading the run
+directories), which is cheap enough to save every cycle (every=1).
+
+Only local models (remote=False) can be checkpointed: the warm start state
+of a remote model lives on the server.
+
+    python Introduction/mhe_mpc.py       # with GEKKO_CHECKPOINT set, Ctrl-C
+                                         # and run again to continue
+
+Environment:
+    GEKKO_CHECKPOINT   checkpoint file of the example scripts (default: none)
+"""
+
+import os
+import pickle
+import random
+import shutil
+import tempfile
+from timeit import default_timer as timer
+
+import numpy as np
+
+# model attributes besides options, variables and files that solve() reads
+_ATTRS = ('_csv_status', 'csv_status', '_model_initialized')
+# per-variable attributes that depend on the model instance, not its state
+_SKIP = ('path', 'model_name')
+
+
+def model_state(m):
+    """Picklable snapshot of a solved model (see the module docstring)."""
+    if m._remote:
+        raise ValueError('%s: remote models cannot be checkpointed' % m._model_name)
+    files = {}
+    for entry in os.scandir(m._path):
+        if entry.is_file():
+            with open(entry.path, 'rb') as f:
+                files[entry.name] = f.read()
+    return {'name': m._model_name,
+            'options': dict(m.options.__dict__),
+            'vars': {v.name: {k: x for k, x in v.__dict__.items() if k not in _SKIP}
+                     for v in m._parameters + m._variables + m._intermediates},
+            'attrs': {k: m.__dict__[k] for k in _ATTRS if k in m.__dict__},
+            'files': files}
+
+
+def restore_model(m, state):
+    """Load a model_state() snapshot into m, a model built the same way."""
+    for entry in os.scandir(m._path):
+        if entry.is_file():
+            os.remove(entry.path)
+        elif entry.is_dir():
+            shutil.rmtree(entry.path, ignore_errors=True)
+    old = state['name'] + '.'
+    for name, data in state['files'].items():
+        # gk_model3.apm of the checkpointed run is gk_model0.apm here
+        if name.startswith(old):
+            name = m._model_name + '.' + name[len(old):]
+        with open(os.path.join(m._path, name), 'wb') as f:
+            f.write(data)
+    m.options.__dict__.update(state['options'])
+    by_name = {v.name: v for v in m._parameters + m._variables + m._intermediates}
+    missing = set(state['vars']) - set(by_name)
+    if missing:
+        raise ValueError('%s: model differs from the checkpoint (no %s)'
+                         % (m._model_name, ', '.join(sorted(missing))))
+    for name, attrs in state['vars'].items():
+        by_name[name].__dict__.update(attrs)
+    m.__dict__.update(state['attrs'])
+
+
+class Checkpoint(object):
+    """Periodic loop checkpoints in one file.
+
+    every -- save only on cycles that are a multiple of every
+    """
+
+    def __init__(self, path, every=1):
+        self.path = path
+        self.every = max(int(every), 1)
+        self.saves = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def save(self, cycle, arrays, extra=None, force=False, **models):
+        """Write the state before cycle `cycle`; returns True if it was saved."""
+        if not force and cycle % self.every:
+            return False
+        start = timer()
+        state = {'cycle': cycle,
+                 'arrays': {k: np.array(a, copy=True) for k, a in arrays.items()},
+                 'models': {role: model_state(m) for role, m in models.items()},
+                 'rng': (random.getstate(), np.random.get_state()),
+                 'extra': extra}
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)),
+                                   suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, self.path)
+        self.saves += 1
+        self.bytes = len(data)
+        self.seconds += timer() - start
+        return True
+
+    def load(self):
+        if not self.exists():
+            return None
+        with open(self.path, 'rb') as f:
+            return pickle.load(f)
+
+    def restore(self, arrays=None, **models):
+        """Restore models, RNG state and (in place) arrays from the checkpoint.
+
+        Returns the checkpoint dict ('cycle', 'arrays', 'extra', ...) or None
+        when there is none.
+        """
+        state = self.load()
+        if state is None:
+            return None
+        for role, m in models.items():
+            restore_model(m, state['models'][role])
+        random.setstate(state['rng'][0])
+        np.random.set_state(state['rng'][1])
+        for k, a in (arrays or {}).items():
+            if k in state['arrays']:
+                a[...] = state['arrays'][k]
+        return state
+
+    def remove(self):
+        if self.exists():
+            os.remove(self.path)
+
+    def report(self):
+        return '%d checkpoints, %.2f ms and %.1f kB each' % (
+            self.saves, 1e3 * self.seconds / max(self.saves, 1), self.bytes / 1e3)
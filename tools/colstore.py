@@ -0,0 +1,140 @@
+"""
+Binary columnar store. Every column is one contiguous, 64-byte aligned array
+behind a small JSON header, so a file can be memory-mapped once and each
+column returned as a zero-copy NumPy view.
+
+Layout:
+    8 bytes   magic b'GKCOL001'
+    8 bytes   header length (little endian uint64)
+    n bytes   JSON header, padded to ALIGN
+    ...       column data, each column padded to ALIGN
+
+Categorical (string) columns are stored as integer codes with their labels
+in the header.
+"""
+
+import json
+import os
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b'GKCOL001'
+ALIGN = 64
+
+
+def _pad(n):
+    return (-n) % ALIGN
+
+
+def write_columns(path, columns, labels=None, meta=None):
+    """Write equal-length 1-D arrays to a column store at path.
+
+    columns -- dict of name -> array (insertion order is kept)
+    labels  -- optional dict of name -> list of category labels for code columns
+    meta    -- optional JSON-serializable dict stored in the header
+    """
+    labels = labels or {}
+    arrays = [(name, np.ascontiguousarray(a)) for name, a in columns.items()]
+    nrows = len(arrays[0][1]) if arrays else 0
+    for name, a in arrays:
+        if a.ndim != 1 or len(a) != nrows:
+            raise ValueError('column %s must be 1-D with %d rows' % (name, nrows))
+
+    # header is written twice: once to size it, once with the final offsets
+    def header(base):
+        cols, offset = [], base
+        for name, a in arrays:
+            col = {'name': name, 'dtype': a.dtype.str, 'offset': offset,
+                   'nbytes': a.nbytes}
+            if name in labels:
+                col['labels'] = list(labels[name])
+            cols.append(col)
+            offset += a.nbytes + _pad(a.nbytes)
+        return json.dumps({'nrows': nrows, 'columns': cols,
+                           'meta': meta or {}}).encode()
+
+    base = 0
+    while True:
+        raw = header(base)
+        start = 16 + len(raw) + _pad(16 + len(raw))
+        if start == base:
+            break
+        base = start
+
+    # a unique temp file: two writers of the same path must not share one
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as f:
+        f.write(MAGIC + struct.pack('<Q', len(raw)) + raw)
+        f.write(b'\0' * _pad(16 + len(raw)))
+        for _, a in arrays:
+            f.write(a.tobytes())
+            f.write(b'\0' * _pad(a.nbytes))
+    os.replace(tmp, path)
+    return path
+
+
+class ColumnStore(object):
+    """Read-only, memory-mapped view of a file written by write_columns."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic = f.read(8)
+            if magic != MAGIC:
+                raise ValueError('%s is not a column store' % path)
+            size, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(size).decode())
+        self.nrows = header['nrows']
+        self.meta = header['meta']
+        self._cols = {c['name']: c for c in header['columns']}
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+        self._views = {}
+
+    @property
+    def names(self):
+        return list(self._cols)
+
+    def __contains__(self, name):
+        return name in self._cols
+
+    def __getitem__(self, name):
+        return self.column(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._views = {}
+        self._mm = None
+
+    def column(self, name, start=0, stop=None):
+        """Zero-copy view of rows [start, stop) of a column."""
+        v = self._views.get(name)
+        if v is None:
+            try:
+                c = self._cols[name]
+            except KeyError:
+                raise KeyError('no column %r in %s' % (name, self.path))
+            dtype = np.dtype(c['dtype'])
+            v = np.frombuffer(self._mm, dtype=dtype,
+                              count=c['nbytes'] // dtype.itemsize,
+                              offset=c['offset'])
+            self._views[name] = v
+        return v[start:stop]
+
+    def window(self, names, start=0, stop=None):
+        """Dict of zero-copy views for several columns over one row range."""
+        return {name: self.column(name, start, stop) for name in names}
+
+    def labels(self, name):
+        """Category labels of a code column (None for plain columns)."""
+        return self._cols[name].get('labels')
+
+    def decode(self, name, start=0, stop=None):
+        """Label strings of a code column over a row range (this one copies)."""
+        return np.asarray(self.labels(name))[self.column(name, start, stop)]
@@ -0,0 +1,153 @@
+"""
+Local, content-addressed cache for the TCLab data sets that SISO.py, MIMO.py
+and LSTM_2ndOrder.py read from apmonitor.com.
+
+The first load of a URL parses the CSV text once and writes its columns to a
+column store named after the SHA-256 of the content; an index maps URLs to
+hashes. Later loads open that store memory-mapped without touching the
+network. With refresh=True the URL is fetched again and parsing is skipped
+when the content hash is unchanged.
+
+Offline (GEKKO_OFFLINE=1, or the URL is unreachable) a cached copy is used,
+or else a stand-in file with the URL's file name from GEKKO_DATA_DIR (or an
+explicit `fallback` path), so the scripts also run on air-gapped nodes:
+
+    data = load('https://apmonitor.com/do/uploads/Main/tclab_dyn_data3.txt')
+    tm = data['Time'][0:3000]
+
+Environment:
+    GEKKO_DATA_CACHE  cache directory (default ~/.cache/gekko-examples/datasets)
+    GEKKO_DATA_DIR    directory of stand-in files named like the URL basename
+    GEKKO_OFFLINE     never use the network when set to 1
+"""
+
+import csv
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from tools.colstore import ColumnStore, write_columns
+
+
+def default_root():
+    return os.environ.get('GEKKO_DATA_CACHE', os.path.join(
+        os.path.expanduser('~'), '.cache', 'gekko-examples', 'datasets'))
+
+
+def parse_csv(text):
+    """Numeric CSV with a header row -> dict of float64 columns."""
+    rows = list(csv.reader(io.StringIO(text)))
+    header = [h.strip() for h in rows[0]]
+    data = np.array([[float(v) for v in r] for r in rows[1:] if r], dtype=float)
+    return {name: np.ascontiguousarray(data[:, i]) for i, name in enumerate(header)}
+
+
+class DatasetCache(object):
+
+    def __init__(self, root=None, offline=None, data_dir=None):
+        self.root = root or default_root()
+        if offline is None:
+            offline = os.environ.get('GEKKO_OFFLINE', '0') not in ('', '0')
+        self.offline = offline
+        self.data_dir = data_dir or os.environ.get('GEKKO_DATA_DIR')
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, 'index.json')
+        self._stores = {}
+
+    def _index(self):
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _save_index(self, index):
+        # unique per writer, so concurrent fetches never share a temp file
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(index, f, indent=1, sort_keys=True)
+        os.replace(tmp, self._index_path)
+
+    def _open(self, digest):
+        store = self._stores.get(digest)
+        if store is None:
+            store = self._stores[digest] = ColumnStore(
+                os.path.join(self.root, digest + '.col'))
+        return store
+
+    def _fetch(self, url):
+        from urllib.request import urlopen
+        with urlopen(url, timeout=30) as r:
+            return r.read()
+
+    def _standin(self, url, fallback):
+        paths = [fallback] if fallback else []
+        if self.data_dir:
+            paths.append(os.path.join(self.data_dir, os.path.basename(url)))
+        for p in paths:
+            if p and os.path.exists(p):
+                with open(p, 'rb') as f:
+                    return f.read()
+        return None
+
+    def put(self, url, content):
+        """Cache raw CSV bytes for url; parsing is skipped for known content."""
+        digest = hashlib.sha256(content).hexdigest()
+        path = os.path.join(self.root, digest + '.col')
+        if not os.path.exists(path):
+            write_columns(path, parse_csv(content.decode()), meta={'url': url})
+        index = self._index()
+        if index.get(url) != digest:
+            index[url] = digest
+            self._save_index(index)
+        return self._open(digest)
+
+    def load(self, url, refresh=False, fallback=None):
+        """Column store with the data of url (see module docstring)."""
+        digest = self._index().get(url)
+        cached = digest and os.path.exists(os.path.join(self.root, digest + '.col'))
+        if cached and not refresh:
+            return self._open(digest)
+        content = None
+        if not self.offline:
+            try:
+                content = self._fetch(url)
+            except (IOError, OSError):
+                content = None
+        if content is None and cached:
+            return self._open(digest)
+        if content is None:
+            content = self._standin(url, fallback)
+        if content is None:
+            raise IOError('%s is not cached and no stand-in file was found '
+                          '(set GEKKO_DATA_DIR or pass fallback=)' % url)
+        return self.put(url, content)
+
+    def invalidate(self, url=None):
+        """Forget one URL (or all); stores no longer referenced are deleted."""
+        index = self._index()
+        if url is None:
+            index = {}
+        else:
+            index.pop(url, None)
+        self._save_index(index)
+        keep = set(index.values())
+        self._stores = {}
+        for name in os.listdir(self.root):
+            if name.endswith('.col') and name[:-4] not in keep:
+                os.remove(os.path.join(self.root, name))
+
+
+_cache = None
+
+
+def load(url, refresh=False, fallback=None):
+    """Load url through the default DatasetCache."""
+    global _cache
+    if _cache is None:
+        _cache = DatasetCache()
+    return _cache.load(url, refresh=refresh, fallback=fallback)
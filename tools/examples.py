@@ -0,0 +1,84 @@
+"""
+Registry of the example scripts as importable, headless functions.
+
+Every script in energy/ and Introduction/ keeps its model in a function that
+takes inputs and options and returns a dict of NumPy arrays plus solver
+statistics ('stats'); plotting lives in a separate plot() that imports
+matplotlib only when called, and the script body only runs under __main__.
+Several file names are not valid module names, so the scripts are loaded
+from their paths:
+
+    from tools import examples
+    res = examples.run('battery', tariff='tou', disp=False)
+    res['stats']                    # {'status': 1, 'solve_time': ..., ...}
+    mod = examples.load('mhe_cstr')   # the module, e.g. for mod.plot(res)
+
+Loaded modules are kept, so a long-lived worker pays the import once.
+"""
+
+import importlib.util
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (script relative to the repository root, function)
+EXAMPLES = {
+    'load_following':         ('energy/1G1D1R_load_following.py', 'load_following'),
+    'const_prod_storage':     ('energy/1G1D1E_const_prod_storage.py', 'const_prod_storage'),
+    'load_following_storage': ('energy/1G1D1E1R_load_following_storage.py',
+                               'load_following_storage'),
+    'battery':                ('energy/battery_trajectory_optimazation.py', 'optimize'),
+    'battery_lp':             ('energy/battery_lp.py', 'optimize'),
+    'battery_sweep':          ('energy/battery_sweep.py', 'sweep'),
+    'battery_stochastic':     ('energy/battery_stochastic.py', 'solve'),
+    'charging_station':       ('energy/chargingStationOptv3.py', 'optimize'),
+    'representative_days':    ('energy/representative_days.py', 'compare'),
+    'rolling_horizon':        ('energy/rolling_horizon.py', 'rolling_horizon'),
+    'siso':                   ('Introduction/SISO.py', 'identify'),
+    'mimo':                   ('Introduction/MIMO.py', 'identify'),
+    'lstm_2nd_order':         ('Introduction/LSTM_2ndOrder.py', 'fit'),
+    'neural_net':             ('Introduction/deep_learning_sin_func.py', 'train'),
+    'dynamic_estimation_4':   ('Introduction/dynamic_estimation_4.py', 'estimate'),
+    'exp_decay':              ('Introduction/dynamic_estimation_exp_decay.py', 'estimate'),
+    'mhe':                    ('Introduction/moving_horizon_estimation.py', 'estimate'),
+    'mhe_no_mpc':             ('Introduction/mhe_no_mpc.py', 'run'),
+    'mhe_mpc':                ('Introduction/mhe_mpc.py', 'run'),
+    'mhe_cstr':               ('Introduction/mhe_cstr_reactor.py', 'run'),
+    'bad_data':               ('Introduction/bad_data.py', 'run'),
+    'orchard':                ('Introduction/orchard_apple_storage.py', 'schedule'),
+}
+
+_modules = {}
+
+
+def names():
+    return sorted(EXAMPLES)
+
+
+def load(name):
+    """Import the script behind name (once) and return the module."""
+    if name not in EXAMPLES:
+        raise KeyError('unknown example %r, expected one of %s' % (name, ', '.join(names())))
+    path = os.path.join(ROOT, EXAMPLES[name][0])
+    if path not in _modules:
+        # scripts import their neighbours (energy_data, tariff) by plain name
+        folder = os.path.dirname(path)
+        if folder not in sys.path:
+            sys.path.insert(0, folder)
+        modname = '_example_' + os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(modname, path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[modname] = module
+        spec.loader.exec_module(module)
+        _modules[path] = module
+    return _modules[path]
+
+
+def function(name):
+    return getattr(load(name), EXAMPLES[name][1])
+
+
+def run(name, **options):
+    """Call the example's function with options; returns its result dict."""
+    return function(name)(**options)
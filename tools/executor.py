@@ -0,0 +1,270 @@
+"""
+Process-pool executor for many independent GEKKO solves.
+
+Sweeps (sites x tariffs x battery sizes, Monte Carlo noise seeds, tuning
+grids) solve many models that do not depend on each other. Executor runs
+them on `workers` processes:
+
+    def task(bat_cap, seed):
+        m, v = build_model(noisy_prices(seed), PV, Dem, bat_cap=bat_cap,
+                           m=GEKKO(remote=False))
+        return m, {'SoC': v['SoC']}
+
+    grid = ({'bat_cap': c, 'seed': s} for c in (10, 20, 30) for s in range(20))
+    with Executor(workers=4, timeout=60) as ex:
+        for r in ex.map(task, grid):
+            print(r['index'], r['status'], r['result']['stats']['objective'])
+
+A task is a module-level (picklable) callable and a dict of keyword
+arguments. When it returns a GEKKO model, or a (model, {name: variable})
+pair like the build_model functions of the examples, the worker solves it
+and returns the variable values and solve_stats. Any other return value, such
+as the result dict of an example function that solves itself, is passed back
+unchanged.
+
+- every worker attaches its models to its own tools/rundirs.py pool under
+  the executor's root directory, so run directories are isolated between
+  workers and reused within one; the root is removed on close()
+- results are yielded in completion order as dicts with the index and
+  params of the task, status 'ok', 'failed' (APPSTATUS != 1), 'error' (the
+  task raised or its worker died) or 'timeout', result, error, wall, worker
+- a task running longer than `timeout` s is killed together with its solver
+  process and the worker is replaced
+- parameter sets are pulled from the iterable lazily, at most max_pending
+  (default 2 x workers) at a time, so generators of any length run in
+  bounded memory
+
+    python tools/executor.py                    # scaling benchmark, 1..ncpu workers
+    python tools/executor.py -n 48 -w 1,2,4,8   # 48 battery days per worker count
+"""
+
+import argparse
+import atexit
+import collections
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from timeit import default_timer as timer
+
+import numpy as np
+
+
+def _solved(out, pool):
+    """(status, result) of a task return value, solving it if it is a model."""
+    from gekko import GEKKO
+    from tools.stats import solve_stats, values
+    m, v = out, None
+    if isinstance(out, tuple) and len(out) == 2 and isinstance(out[0], GEKKO):
+        m, v = out
+    if not isinstance(m, GEKKO):
+        st = out.get('stats') if isinstance(out, dict) else None
+        ok = not isinstance(st, dict) or np.all(np.asarray(st.get('status', 1)) == 1)
+        return ('ok' if ok else 'failed'), out
+    pool.attach(m)
+    m.solve(disp=False, debug=0)
+    res = {k: values(x) for k, x in (v or {}).items()}
+    res['stats'] = solve_stats(m)
+    return ('ok' if res['stats']['status'] == 1 else 'failed'), res
+
+
+def _worker(conn, root):
+    if hasattr(os, 'setsid'):
+        os.setsid()     # own process group, so a kill also stops the solver
+    from tools.rundirs import RunDirPool
+    pool = RunDirPool(base=root)
+    try:
+        while True:
+            task = conn.recv()
+            if task is None:
+                break
+            fn, params = task
+            start = timer()
+            try:
+                status, result = _solved(fn(**params), pool)
+                msg = {'status': status, 'result': result, 'error': None}
+            except Exception:
+                msg = {'status': 'error', 'result': None,
+                       'error': traceback.format_exc()}
+            msg['wall'] = timer() - start
+            try:
+                conn.send(msg)
+            except Exception:
+                # unpicklable result
+                conn.send({'status': 'error', 'result': None, 'wall': msg['wall'],
+                           'error': traceback.format_exc()})
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        pool.close()
+
+
+def _kill(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        proc.kill()
+    proc.join()
+
+
+class Executor(object):
+    """Runs independent solve tasks on a pool of worker processes.
+
+    workers     -- worker processes (default: number of CPUs)
+    timeout     -- seconds a single task may run before it is killed
+    max_pending -- parameter sets taken from the iterable but not finished
+    """
+
+    def __init__(self, workers=None, timeout=None, max_pending=None):
+        from tools.rundirs import _default_base
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.max_pending = max(max_pending or 2 * self.workers, self.workers)
+        self.root = tempfile.mkdtemp(prefix='gekko-exec-', dir=_default_base())
+        self._idle = []      # (process, connection)
+        self.killed = 0
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _spawn(self):
+        conn, child = mp.Pipe()
+        proc = mp.Process(target=_worker, args=(child, self.root), daemon=True)
+        proc.start()
+        child.close()
+        return proc, conn
+
+    def map(self, fn, params):
+        """Run fn(**p) for every dict p in params; yields results as they finish."""
+        tasks = enumerate(params)
+        queue = collections.deque()
+        busy = {}            # connection -> (worker, index, params, start)
+        exhausted = False
+        while len(self._idle) < self.workers:
+            self._idle.append(self._spawn())
+        try:
+            while True:
+                while not exhausted and len(queue) + len(busy) < self.max_pending:
+                    try:
+                        queue.append(next(tasks))
+                    except StopIteration:
+                        exhausted = True
+                while queue and self._idle:
+                    w = self._idle.pop()
+                    index, p = queue.popleft()
+                    w[1].send((fn, p))
+                    busy[w[1]] = (w, index, p, timer())
+                if not busy:
+                    break
+                wait_for = None
+                if self.timeout is not None:
+                    first = min(start for _, _, _, start in busy.values())
+                    wait_for = max(first + self.timeout - timer(), 0)
+                for conn in wait(list(busy), wait_for):
+                    w, index, p, start = busy.pop(conn)
+                    try:
+                        msg = conn.recv()
+                        self._idle.append(w)
+                    except (EOFError, OSError):
+                        msg = {'status': 'error', 'result': None, 'wall': timer() - start,
+                               'error': 'worker exited with code %s' % w[0].exitcode}
+                        _kill(w[0])
+                        self._idle.append(self._spawn())
+                    yield dict(msg, index=index, params=p, worker=w[0].pid)
+                if self.timeout is None:
+                    continue
+                now = timer()
+                for conn, (w, index, p, start) in list(busy.items()):
+                    if now - start >= self.timeout:
+                        del busy[conn]
+                        _kill(w[0])
+                        self.killed += 1
+                        self._idle.append(self._spawn())
+                        yield {'index': index, 'params': p, 'status': 'timeout',
+                               'result': None, 'wall': now - start, 'worker': w[0].pid,
+                               'error': 'killed after %g s' % self.timeout}
+        finally:
+            # abandoned (consumer stopped early): their results would arrive late
+            for w, _, _, _ in busy.values():
+                _kill(w[0])
+
+    def run(self, fn, params):
+        """All results of map(fn, params) as a list in parameter order."""
+        return sorted(self.map(fn, params), key=lambda r: r['index'])
+
+    def close(self):
+        for proc, conn in self._idle:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for proc, conn in self._idle:
+            proc.join(5)
+            if proc.is_alive():
+                _kill(proc)
+        self._idle = []
+        if self.root is not None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+
+
+def battery_day(seed, bat_cap=30):
+    """Scaling benchmark task: the battery day with +-20 % noise on the prices."""
+    from gekko import GEKKO
+    from tools import examples
+    b = examples.load('battery')
+    noise = np.random.default_rng(seed).normal(1.0, 0.2, len(b.EP_DAY))
+    m, v = b.build_model(np.asarray(b.EP_DAY) * noise, b.PV_DAY, b.DEM_DAY,
+                         bat_cap=bat_cap, m=GEKKO(remote=False))
+    return m, {'SoC': v['SoC']}
+
+
+def scaling(fn, params, workers=(1, 2, 4), timeout=None):
+    """Wall time and throughput of running all params with each worker count."""
+    params = list(params)
+    out = []
+    for n in workers:
+        with Executor(workers=n, timeout=timeout) as ex:
+            start = timer()
+            results = list(ex.map(fn, params))
+            wall = timer() - start
+        ok = sum(r['status'] == 'ok' for r in results)
+        out.append({'workers': n, 'tasks': len(params), 'ok': ok, 'wall': wall,
+                    'throughput': len(params) / wall,
+                    'task_wall': float(np.median([r['wall'] for r in results]))})
+    for r in out:
+        r['speedup'] = r['throughput'] / out[0]['throughput']
+    return out
+
+
+def report(rows):
+    lines = ['%8s %6s %6s %9s %11s %8s %10s' % ('workers', 'tasks', 'ok', 'wall s',
+                                                'tasks/s', 'speedup', 'task ms')]
+    for r in rows:
+        lines.append('%8d %6d %6d %9.2f %11.2f %8.2f %10.1f' % (
+            r['workers'], r['tasks'], r['ok'], r['wall'], r['throughput'],
+            r['speedup'], 1e3 * r['task_wall']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    ncpu = os.cpu_count() or 1
+    default = sorted(set([1, 2, 4, 8, 16, ncpu]) & set(range(1, ncpu + 1)))
+    parser = argparse.ArgumentParser(description='Executor scaling benchmark.')
+    parser.add_argument('-n', '--tasks', type=int, default=4 * max(default))
+    parser.add_argument('-w', '--workers', default=','.join(map(str, default)),
+                        help='comma separated worker counts')
+    parser.add_argument('--timeout', type=float, default=None)
+    args = parser.parse_args()
+    rows = scaling(battery_day, [{'seed': s} for s in range(args.tasks)],
+                   [int(w) for w in args.workers.split(',')], args.timeout)
+    print(report(rows))
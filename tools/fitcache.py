@@ -0,0 +1,181 @@
+"""
+Persistent cache of fitted model parameters (ARX coefficients, FV NEWVALs,
+network weights, ...). Entries are keyed by a hash of everything that
+determines the fit: the input data, the model structure and the solver
+options. A changed data point or option gives a new key, so stale fits are
+never returned; old entries are evicted least-recently-used once the cache
+grows past max_bytes.
+
+    cache = FitCache()
+    key = fingerprint(tm, Q1s, T1s, model_structure(m), m.options.IMODE)
+    fit = cache.get(key)
+    if fit is None:
+        m.solve()
+        fit = {'K1': K1.NEWVAL, 'TC1': TC1.value}
+        cache.put(key, fit, label='LSTM_2ndOrder')
+
+Environment:
+    GEKKO_FIT_CACHE   cache directory (default ~/.cache/gekko-examples/fits)
+    GEKKO_FIT_CACHE=off disables lookups (every fit is recomputed and stored)
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+
+import numpy as np
+
+
+def _update(h, obj):
+    if isinstance(obj, np.ndarray) or (hasattr(obj, '__array__') and
+                                       not isinstance(obj, (str, bytes))):
+        a = np.ascontiguousarray(np.asarray(obj))
+        h.update(b'a' + a.dtype.str.encode() + repr(a.shape).encode())
+        h.update(a.tobytes())
+    elif isinstance(obj, dict):
+        h.update(b'd')
+        for k in sorted(obj, key=str):
+            _update(h, str(k))
+            _update(h, obj[k])
+    elif isinstance(obj, (list, tuple)):
+        h.update(b'l%d' % len(obj))
+        for v in obj:
+            _update(h, v)
+    elif isinstance(obj, bytes):
+        h.update(b'b' + obj)
+    else:
+        h.update(b's' + repr(obj).encode())
+
+
+def _scalar(v):
+    # list/array values are data: fingerprint them separately
+    return None if isinstance(v, (list, tuple)) or hasattr(v, 'shape') else v
+
+
+def model_structure(m):
+    """Declarations, equations and objectives of a GEKKO model as text, so a
+    key changes when the model is edited (not only when a label is)."""
+    # intermediates are numbered across all models: renumber them per model
+    names = {str(x): 'i%d' % k for k, x in enumerate(m._intermediates)}
+
+    def text(x):
+        return re.sub(r'\bi\d+\b', lambda g: names.get(g.group(), g.group()), str(x))
+
+    decl = [(str(p), type(p).__name__, _scalar(p.VALUE.value), p.LOWER, p.UPPER,
+             getattr(p, 'STATUS', None), getattr(p, 'FSTATUS', None),
+             getattr(p, 'MEAS', None)) for p in m._parameters + m._variables]
+    return {'declarations': decl,
+            'constants': [(str(c), c.value) for c in m._constants],
+            'intermediates': [text(e) for e in m._inter_equations],
+            'equations': [text(e.value) for e in m._equations],
+            'objectives': [text(o) for o in m._objectives],
+            'other': [str(x) for x in m._connections + m._objects + m._compounds + m._raw]}
+
+
+def fingerprint(*objs):
+    """SHA-256 of arrays, dicts, lists and scalars (order of dict keys ignored)."""
+    h = hashlib.sha256()
+    for obj in objs:
+        _update(h, obj)
+    return h.hexdigest()
+
+
+class FitCache(object):
+    """Directory of .npz fits with an LRU index.
+
+    max_bytes -- evict least recently used fits beyond this total size
+    """
+
+    def __init__(self, root=None, max_bytes=256*2**20):
+        env = os.environ.get('GEKKO_FIT_CACHE', '')
+        self.enabled = env.lower() != 'off'
+        self.root = root or (env if self.enabled and env else os.path.join(
+            os.path.expanduser('~'), '.cache', 'gekko-examples', 'fits'))
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+        self._index_path = os.path.join(self.root, 'index.json')
+
+    def _path(self, key):
+        return os.path.join(self.root, key + '.npz')
+
+    def _index(self):
+        try:
+            with open(self._index_path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _temp(self):
+        # unique per writer: workers storing the same key must not share it
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+        return os.fdopen(fd, 'wb'), tmp
+
+    def _save(self, index):
+        f, tmp = self._temp()
+        with f:
+            f.write(json.dumps(index, indent=1).encode())
+        os.replace(tmp, self._index_path)
+
+    def get(self, key):
+        """Dict of arrays stored under key, or None."""
+        if not self.enabled:
+            return None
+        index = self._index()
+        if key not in index or not os.path.exists(self._path(key)):
+            return None
+        with np.load(self._path(key), allow_pickle=False) as f:
+            fit = {k: f[k] for k in f.files}
+        index[key]['used'] = time.time()
+        self._save(index)
+        return fit
+
+    def put(self, key, fit, label=None):
+        """Store a dict of arrays/scalars under key and evict down to max_bytes."""
+        f, tmp = self._temp()
+        with f:
+            np.savez(f, **{k: np.asarray(v) for k, v in fit.items()})
+        os.replace(tmp, self._path(key))
+        index = self._index()
+        now = time.time()
+        index[key] = {'bytes': os.path.getsize(self._path(key)), 'used': now,
+                      'created': now, 'label': label}
+        self._evict(index)
+        self._save(index)
+
+    def _evict(self, index):
+        total = sum(e['bytes'] for e in index.values())
+        for key in sorted(index, key=lambda k: index[k]['used']):
+            if total <= self.max_bytes:
+                break
+            total -= index.pop(key)['bytes']
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+
+    def invalidate(self, key=None, label=None):
+        """Drop one key, every fit with a label, or (no arguments) everything."""
+        index = self._index()
+        for k in list(index):
+            if (key is None and label is None) or k == key or \
+                    (label is not None and index[k].get('label') == label):
+                del index[k]
+                if os.path.exists(self._path(k)):
+                    os.remove(self._path(k))
+        self._save(index)
+
+    def size(self):
+        return sum(e['bytes'] for e in self._index().values())
+
+
+if __name__ == '__main__':
+    import sys
+
+    cache = FitCache()
+    if len(sys.argv) > 1 and sys.argv[1] == 'clear':
+        cache.invalidate(label=sys.argv[2] if len(sys.argv) > 2 else None)
+    for key, e in sorted(cache._index().items(), key=lambda kv: kv[1]['used']):
+        print('%s  %-20s %8d bytes  used %s' % (
+            key[:12], e['label'], e['bytes'], time.ctime(e['used'])))
+    print('total %d bytes in %s' % (cache.size(), cache.root))
@@ -0,0 +1,515 @@
+"""
+Sparse LP/MILP backend for linear GEKKO models, solved with scipy's HiGHS.
+
+battery_trajectory_optimazation.py and orchard_apple_storage.py are linear
+programs, but GEKKO sends them to an NLP (IPOPT) or MINLP (APOPT) solver.
+assemble(m) reads the equations, intermediates and objectives of m as
+polynomials in its decision variables. When all of them are linear, it builds
+the sparse constraint matrix of exactly the problem APM would solve, and
+solve(m) hands it to scipy.optimize.milp (HiGHS) and loads the solution into
+the model like m.solve() does: variable values, OBJFCNVAL, APPSTATUS and
+SOLVETIME.
+
+    kind, reason = classify(m)      # 'lp', 'milp', 'qp', 'miqp' or 'nlp'
+    backend = solve(m)              # 'highs', or 'gekko' after falling back
+
+    with highs():                   # route every GEKKO solve through solve()
+        res = examples.run('battery', disp=False)
+
+    python tools/linear.py                  # equivalence and timing vs GEKKO
+    python tools/linear.py orchard battery
+
+Dynamic models (IMODE 6) are discretized like APM: each interval has NODES-1
+Lobatto collocation points, and MVs, Params and fixed FVs take the value of
+the previous time point at interior nodes. Equations and objectives hold at
+every point after t0, where states and MVs are fixed to their initial value.
+Supported are Var/SV, CVs and MVs/FVs that are not decisions (STATUS 0),
+decision MVs with DCOST=0 and decision FVs, in IMODE 3 and 6. Anything else,
+including quadratic objectives (scipy's HiGHS interface has no QP), falls back
+to GEKKO and classify() says why.
+"""
+
+import contextlib
+import re
+import sys
+import os
+from timeit import default_timer as timer
+
+import numpy as np
+
+_NAME = re.compile(r'\$?\b(?:int_)?[vpi]\d+\b')
+_FUNCTIONS = ('exp', 'log', 'log10', 'sqrt', 'abs', 'sin', 'cos', 'tan', 'sinh',
+              'cosh', 'tanh', 'asin', 'acos', 'atan')
+_NUMPY = {'asin': 'arcsin', 'acos': 'arccos', 'atan': 'arctan'}
+
+
+class NonLinear(ValueError):
+    """Raised by assemble() for a model this backend cannot solve."""
+
+
+class _Expr(object):
+    """Polynomial of degree <= 2 in decision symbols.
+
+    terms maps a sorted tuple of symbols (() for the constant) to its
+    coefficient, a scalar or an array with one value per node.
+    """
+
+    __slots__ = ('terms',)
+
+    def __init__(self, terms):
+        self.terms = terms
+
+    @staticmethod
+    def wrap(x):
+        return x if isinstance(x, _Expr) else _Expr({(): x})
+
+    @property
+    def constant(self):
+        return all(k == () for k in self.terms)
+
+    @property
+    def degree(self):
+        return max([len(k) for k in self.terms] or [0])
+
+    def __add__(self, other):
+        terms = dict(self.terms)
+        for k, c in _Expr.wrap(other).terms.items():
+            terms[k] = terms[k] + c if k in terms else c
+        return _Expr(terms)
+
+    __radd__ = __add__
+
+    def __neg__(self):
+        return _Expr({k: -c for k, c in self.terms.items()})
+
+    def __pos__(self):
+        return self
+
+    def __sub__(self, other):
+        return self + (-_Expr.wrap(other))
+
+    def __rsub__(self, other):
+        return _Expr.wrap(other) + (-self)
+
+    def __mul__(self, other):
+        other = _Expr.wrap(other)
+        terms = {}
+        for k1, c1 in self.terms.items():
+            for k2, c2 in other.terms.items():
+                k = tuple(sorted(k1 + k2))
+                if len(k) > 2:
+                    raise NonLinear('term of degree %d' % len(k))
+                terms[k] = terms[k] + c1 * c2 if k in terms else c1 * c2
+        return _Expr(terms)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        other = _Expr.wrap(other)
+        if not other.constant:
+            raise NonLinear('division by a variable')
+        return self * (1.0 / np.asarray(other.terms.get((), 0.0), dtype=float))
+
+    def __rtruediv__(self, other):
+        return _Expr.wrap(other) / self
+
+    def __pow__(self, other):
+        other = _Expr.wrap(other)
+        if not other.constant:
+            raise NonLinear('variable exponent')
+        n = other.terms.get((), 0.0)
+        if self.constant:
+            return _Expr({(): np.power(self.terms.get((), 0.0), n)})
+        if np.ndim(n) or n != int(n) or n < 0:
+            raise NonLinear('non-integer power of a variable')
+        out = _Expr({(): 1.0})
+        for _ in range(int(n)):
+            out = out * self
+        return out
+
+    def __rpow__(self, other):
+        return _Expr.wrap(other) ** self
+
+
+def _function(name):
+    f = getattr(np, _NUMPY.get(name, name))
+
+    def apply(x):
+        x = _Expr.wrap(x)
+        if not x.constant:
+            raise NonLinear('%s() of a variable' % name)
+        return _Expr({(): f(x.terms.get((), 0.0))})
+    return apply
+
+
+def _split(s):
+    """(lhs, comparator, rhs) of an APM equation string."""
+    depth = 0
+    for i, ch in enumerate(s):
+        depth += (ch == '(') - (ch == ')')
+        if depth == 0 and ch in '<>=':
+            op = s[i:i + 2] if s[i + 1:i + 2] == '=' else ch
+            return s[:i], op[0], s[i + len(op):]
+    raise NonLinear('no comparator in %r' % s)
+
+
+def _parse(s, names):
+    code = _NAME.sub(lambda r: 'd_' + r.group()[1:] if r.group()[0] == '$'
+                     else r.group(), s).replace('^', '**')
+    try:
+        return _Expr.wrap(eval(code, {'__builtins__': {}}, names))
+    except (SyntaxError, NameError, TypeError) as e:
+        raise NonLinear('cannot read %r (%s)' % (s, e))
+
+
+def lobatto(nodes):
+    """Collocation points in (0, 1] and matrix M with x(tau_i) - x(0) = h M dx."""
+    if nodes <= 2:
+        return np.array([1.0]), np.ones((1, 1))
+    inner = np.sort(np.polynomial.legendre.Legendre.basis(nodes - 1).deriv().roots().real)
+    tau = np.r_[(inner + 1) / 2, 1.0]
+    M = np.empty((len(tau), len(tau)))
+    for j in range(len(tau)):
+        others = np.delete(tau, j)
+        lagrange = np.poly(others) / np.prod(tau[j] - others)
+        integral = np.polyint(lagrange)
+        M[:, j] = np.polyval(integral, tau) - np.polyval(integral, 0.0)
+    return tau, M
+
+
+def _array(v):
+    return np.asarray(v.value.value if hasattr(v.value, 'value') else v.value).astype(float)
+
+
+def _on_grid(v, ngrid):
+    a = np.atleast_1d(_array(v))
+    return np.full(ngrid, a[0]) if len(a) < ngrid else a[:ngrid]
+
+
+def assemble(m):
+    """Sparse LP/MILP of model m as a dict; raises NonLinear otherwise."""
+    from scipy import sparse
+
+    imode = int(m.options.IMODE)
+    if imode not in (3, 6):
+        raise NonLinear('IMODE %d (only 3 and 6 are supported)' % imode)
+    for kind in ('_objects', '_connections', '_compounds', '_raw'):
+        if getattr(m, kind, None):
+            raise NonLinear('model uses %s' % kind.strip('_'))
+    dynamic = imode == 6
+    if dynamic:
+        t = np.asarray(m.time, dtype=float)
+        nodes = max(int(m.options.NODES), 2)
+        tau, M = lobatto(nodes)
+        intervals = len(t) - 1
+        per = nodes - 1
+        nn = intervals * per + 1                      # node 0 is t0
+        k = np.r_[0, np.repeat(np.arange(1, intervals + 1), per)]
+        j = np.r_[per - 1, np.tile(np.arange(per), intervals)]
+        grid = np.where(j == per - 1, k, k - 1)       # data point of each node
+        ngrid = intervals + 1
+        active = np.arange(1, nn)                     # rows and objective
+    else:
+        nn, ngrid, grid, active = 1, 1, np.zeros(1, int), np.zeros(1, int)
+
+    # decision symbols: column index per node, bounds per column
+    cols, lb, ub, integer = {}, [], [], []
+    names = {f: _function(f) for f in _FUNCTIONS}
+
+    def add(symbol, n, lower, upper, is_int, node_cols):
+        start = len(lb)
+        lb.extend(np.broadcast_to(lower, n))
+        ub.extend(np.broadcast_to(upper, n))
+        integer.extend([is_int] * n)
+        cols[symbol] = start + node_cols
+        names[symbol] = _Expr({(symbol,): 1.0})
+
+    def bound(v, name, default):
+        x = getattr(v, name, None)
+        return default if x is None else float(x)
+
+    for v in m._variables:
+        if type(v).__name__ == 'GK_CV' and getattr(v, 'STATUS', None):
+            raise NonLinear('CV %s with STATUS=1' % v.name)
+        lo, up = np.full(nn, bound(v, 'LOWER', -np.inf)), np.full(nn, bound(v, 'UPPER', np.inf))
+        if dynamic:
+            lo[0] = up[0] = _on_grid(v, 1)[0]
+        add(v.name, nn, lo, up, v.name.startswith('int_'), np.arange(nn))
+    for p in m._parameters:
+        kind = type(p).__name__
+        if kind in ('GK_MV', 'GK_FV') and getattr(p, 'STATUS', None):
+            lo, up = bound(p, 'LOWER', -np.inf), bound(p, 'UPPER', np.inf)
+            if kind == 'GK_FV' or not dynamic:
+                add(p.name, 1, lo, up, p.name.startswith('int_'), np.zeros(nn, int))
+                continue
+            if getattr(p, 'DCOST', None) != 0 or int(getattr(p, 'MV_STEP_HOR', 0) or 0) > 1 \
+                    or getattr(p, 'DMAX', None) is not None:
+                raise NonLinear('MV %s with move cost or move limits' % p.name)
+            lo, up = np.full(ngrid, lo), np.full(ngrid, up)
+            lo[0] = up[0] = _on_grid(p, 1)[0]
+            add(p.name, ngrid, lo, up, p.name.startswith('int_'), grid)
+        else:
+            names[p.name] = _Expr({(): _on_grid(p, ngrid)[grid]})
+
+    states = sorted(set(n[1:] for eq in m._equations for n in _NAME.findall(str(eq))
+                        if n.startswith('$')))
+    for s in states:
+        lo, up = np.full(nn, -np.inf), np.full(nn, np.inf)
+        lo[0] = up[0] = 0.0     # unused at t0
+        add('d_' + s, nn, lo, up, False, np.arange(nn))
+
+    inter = {}
+    for i, eq in zip(m._intermediates, m._inter_equations):
+        names[i.name] = inter[i.name] = _parse(str(eq), names)
+
+    rows, vals, rcols, rlo, rup = [], [], [], [], []
+    nrows = 0
+    for eq in m._equations:
+        lhs, op, rhs = _split(str(eq))
+        e = _parse(lhs, names) - _parse(rhs, names)
+        if e.degree > 1:
+            raise NonLinear('quadratic constraint %s' % eq)
+        r = nrows + np.arange(len(active))
+        for key, c in e.terms.items():
+            if key:
+                rows.append(r)
+                rcols.append(cols[key[0]][active])
+                vals.append(np.broadcast_to(c, nn)[active])
+        b = -np.broadcast_to(e.terms.get((), 0.0), nn)[active]
+        rlo.append(b if op in ('=', '>') else np.full(len(b), -np.inf))
+        rup.append(b if op in ('=', '<') else np.full(len(b), np.inf))
+        nrows += len(active)
+
+    if dynamic:
+        # x(node) - x(interval start) - h sum_l M[j, l] dx(node l) = 0
+        h = np.diff(t)
+        for s in states:
+            x, dx = cols[s], cols['d_' + s]
+            for kk in range(intervals):
+                base = kk * per
+                r = nrows + np.arange(per)
+                for jj in range(per):
+                    node = base + 1 + jj
+                    rows.append(np.full(per + 2, r[jj]))
+                    rcols.append(np.r_[x[node], x[base], dx[base + 1:base + 1 + per]])
+                    vals.append(np.r_[1.0, -1.0, -h[kk] * M[jj]])
+                rlo.append(np.zeros(per))
+                rup.append(np.zeros(per))
+                nrows += per
+
+    c = np.zeros(len(lb))
+    offset, quadratic = 0.0, False
+    for obj in m._objectives:
+        sense, expr = str(obj).split(' ', 1)
+        e = _parse(expr, names)
+        if sense.lower() == 'maximize':
+            e = -e
+        for key, coef in e.terms.items():
+            coef = np.broadcast_to(coef, nn)[active]
+            if not key:
+                offset += float(np.sum(coef))
+            elif len(key) == 1:
+                np.add.at(c, cols[key[0]][active], coef)
+            else:
+                quadratic = True
+
+    A = sparse.csr_matrix((np.concatenate(vals) if vals else [],
+                           (np.concatenate(rows) if rows else [],
+                            np.concatenate(rcols) if rcols else [])),
+                          shape=(nrows, len(lb)))
+    integer = np.array(integer, dtype=bool)
+    kind = ('mi' if integer.any() else '') + ('qp' if quadratic else 'lp')
+    return {'kind': kind, 'c': c, 'offset': offset, 'A': A,
+            'row_lower': np.concatenate(rlo) if rlo else np.zeros(0),
+            'row_upper': np.concatenate(rup) if rup else np.zeros(0),
+            'lower': np.array(lb, dtype=float), 'upper': np.array(ub, dtype=float),
+            'integer': integer, 'cols': cols, 'intermediates': inter,
+            'nodes': nn, 'grid': grid, 'ngrid': ngrid, 'dynamic': dynamic}
+
+
+def classify(m):
+    """(kind, reason): 'lp', 'milp', 'qp', 'miqp' or 'nlp' with the reason."""
+    try:
+        return assemble(m)['kind'], ''
+    except NonLinear as e:
+        return 'nlp', str(e)
+
+
+def _value(e, x, lp):
+    out = np.zeros(lp['nodes'])
+    for key, c in e.terms.items():
+        term = np.broadcast_to(c, lp['nodes']).astype(float)
+        for symbol in key:
+            term = term * x[lp['cols'][symbol]]
+        out += term
+    return out
+
+
+def _load(m, lp, x, res, seconds):
+    # value at each time point: the last node of its interval
+    per = (lp['nodes'] - 1) // max(lp['ngrid'] - 1, 1)
+    at = np.arange(lp['ngrid']) * per
+    for v in m._variables + m._parameters:
+        if v.name in lp['cols']:
+            col = lp['cols'][v.name]
+            v.VALUE = list(x[col[at]]) if np.ndim(col) else [float(x[col])]
+            v.value.change = False
+    for i in m._intermediates:
+        i.value.value = list(_value(lp['intermediates'][i.name], x, lp)[at])
+        i.value.change = False
+    o = m.options.__dict__
+    o['APPSTATUS'] = int(res.status == 0)
+    o['SOLVESTATUS'] = int(res.status == 0)
+    o['OBJFCNVAL'] = float(res.fun) + lp['offset'] if res.fun is not None else np.nan
+    o['SOLVETIME'] = seconds
+    o['ITERATIONS'] = int(getattr(res, 'nit', 0) or getattr(res, 'mip_node_count', 0) or 0)
+
+
+def solve_lp(lp, time_limit=None, scale=False):
+    """scipy.optimize.milp result of an assembled problem and its solve time.
+
+    scale=True solves it in the scaled space of tools/scaling.py.
+    """
+    if not scale:
+        return _milp(lp, time_limit)
+    from tools.scaling import scale_lp, unscale
+    scaled = scale_lp(lp)
+    res, seconds = _milp(scaled, time_limit)
+    return unscale(scaled, res), seconds
+
+
+def _milp(lp, time_limit):
+    from scipy import sparse
+    from scipy.optimize import Bounds, LinearConstraint, linprog, milp
+    options = {} if time_limit is None else {'time_limit': time_limit}
+    start = timer()
+    if not lp['integer'].any():
+        # linprog reports simplex iterations, milp does not
+        A, lo, up = lp['A'].tocsr(), lp['row_lower'], lp['row_upper']
+        eq = lo == up
+        le, ge = ~eq & np.isfinite(up), ~eq & np.isfinite(lo)
+        args = dict(A_ub=sparse.vstack([A[le], -A[ge]]) if (le | ge).any() else None,
+                    b_ub=np.r_[up[le], -lo[ge]] if (le | ge).any() else None,
+                    A_eq=A[eq] if eq.any() else None, b_eq=lo[eq] if eq.any() else None,
+                    bounds=np.c_[lp['lower'], lp['upper']], method='highs')
+        res = linprog(lp['c'], options=options, **args)
+        if res.status == 4:
+            # HiGHS presolve occasionally ends in model status Unknown
+            res = linprog(lp['c'], options=dict(options, presolve=False), **args)
+        return res, timer() - start
+    args = dict(integrality=lp['integer'].astype(int), bounds=Bounds(lp['lower'], lp['upper']),
+                constraints=[LinearConstraint(lp['A'], lp['row_lower'], lp['row_upper'])]
+                if lp['A'].shape[0] else None)
+    res = milp(lp['c'], options=options, **args)
+    if res.status == 4:
+        res = milp(lp['c'], options=dict(options, presolve=False), **args)
+    return res, timer() - start
+
+
+_solve = None   # GEKKO.solve as it was before highs() patched it
+
+
+def solve(m, disp=False, debug=1, fallback=True, scale=False):
+    """Solve m with HiGHS if it is an LP or MILP; returns 'highs' or 'gekko'."""
+    try:
+        lp = assemble(m)
+        if lp['kind'] not in ('lp', 'milp'):
+            raise NonLinear('quadratic objective')
+    except NonLinear as e:
+        if not fallback:
+            raise
+        if disp:
+            print('linear backend: %s, solving with GEKKO' % e)
+        (_solve or type(m).solve)(m, disp=disp, debug=debug)
+        return 'gekko'
+    res, seconds = solve_lp(lp, float(m.options.MAX_TIME), scale)
+    if res.x is not None:
+        _load(m, lp, res.x, res, seconds)
+    else:
+        m.options.__dict__.update(APPSTATUS=0, SOLVESTATUS=0, SOLVETIME=seconds)
+    if disp:
+        print('HiGHS %s: %s (%d variables, %d constraints, %.3f s)'
+              % (lp['kind'], res.message, len(lp['c']), lp['A'].shape[0], seconds))
+    if debug >= 1 and res.status != 0:
+        raise Exception('@error: Solution Not Found (HiGHS: %s)' % res.message)
+    return 'highs'
+
+
+@contextlib.contextmanager
+def highs(log=None):
+    """Route every GEKKO solve through solve(); log receives the backend used."""
+    global _solve
+    from gekko import GEKKO
+    original = _solve = GEKKO.solve
+
+    def linear_solve(m, disp=True, debug=1, **kwargs):
+        backend = solve(m, disp=disp, debug=debug)
+        if log is not None:
+            log.append((m._model_name, backend))
+
+    GEKKO.solve = linear_solve
+    try:
+        yield log
+    finally:
+        GEKKO.solve = original
+        _solve = None
+
+
+# examples and options compared by the CLI
+CASES = {
+    'battery':   {'disp': False},
+    'orchard':   {'disp': False},
+    'orchard-lp': ('orchard', {'disp': False, 'integer': False}),
+    'battery-tou': ('battery', {'disp': False, 'tariff': 'tou'}),
+}
+OBJECTIVE_RTOL = 1e-6
+
+
+def compare(name, options, repeat=3):
+    """Objective, timing and trajectory differences of GEKKO vs HiGHS."""
+    from tools import examples
+    fn = examples.function(name)
+    gekko_wall, highs_wall = [], []
+    for _ in range(repeat):
+        start = timer()
+        ref = fn(**options)
+        gekko_wall.append(timer() - start)
+        log = []
+        with highs(log):
+            start = timer()
+            res = fn(**options)
+            highs_wall.append(timer() - start)
+    diff = max([float(np.max(np.abs(np.asarray(res[k]) - np.asarray(ref[k]))))
+                for k in ref if k not in ('stats', 'time') and np.ndim(ref[k])] or [0.0])
+    a, b = ref['stats']['objective'], res['stats']['objective']
+    return {'backend': ','.join(sorted(set(b for _, b in log))),
+            'gekko_objective': a, 'highs_objective': b,
+            'equal': bool(np.isclose(a, b, rtol=OBJECTIVE_RTOL, atol=1e-6)),
+            'max_abs_diff': diff,
+            'gekko_wall': min(gekko_wall), 'highs_wall': min(highs_wall),
+            'gekko_solver': ref['stats']['solve_time'],
+            'highs_solver': res['stats']['solve_time']}
+
+
+def report(results):
+    lines = ['%-14s %-8s %12s %12s %6s %10s %9s %9s %8s' % (
+        'case', 'backend', 'gekko obj', 'highs obj', 'equal', 'max diff',
+        'gekko s', 'highs s', 'speedup')]
+    for case, r in results.items():
+        lines.append('%-14s %-8s %12.6g %12.6g %6s %10.3g %9.4f %9.4f %7.1fx' % (
+            case, r['backend'], r['gekko_objective'], r['highs_objective'],
+            'yes' if r['equal'] else 'NO', r['max_abs_diff'], r['gekko_wall'],
+            r['highs_wall'], r['gekko_wall'] / max(r['highs_wall'], 1e-9)))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    results = {}
+    for case in sys.argv[1:] or list(CASES):
+        spec = CASES.get(case, {'disp': False})
+        name, options = spec if isinstance(spec, tuple) else (case, spec)
+        results[case] = compare(name, options)
+    print(report(results))
+    # trajectories may differ at degenerate optima; objectives may not
+    sys.exit(0 if all(r['equal'] for r in results.values()) else 1)
@@ -0,0 +1,97 @@
+"""
+Reuse the generated .apm model file across repeated solves of a GEKKO model.
+
+GEKKO rewrites the model file on every m.solve(), rendering every parameter,
+variable, intermediate and equation to text, even in closed loops where only
+measurements and tuning values change between cycles. A cached model keeps
+a cheap structural key (declarations with their scalar values and bounds,
+plus the identity of every equation, objective and object) and skips the
+rewrite while the key is unchanged; the csv data, dbs options and results
+are still exchanged on every cycle.
+
+    s = GEKKO(remote=False, name='cstr-sim')
+    m = GEKKO(remote=False, name='cstr-mhe')
+    ...
+    cache_models(s, m)
+    for i in range(cycles):
+        ...
+        s.solve(disp=False)
+        m.solve(disp=False)
+    print(report(s, m))
+
+Environment:
+    GEKKO_MODEL_CACHE=0  disable (every solve rewrites the model, for comparison)
+"""
+
+import os
+import time
+import types
+
+from gekko import GEKKO
+
+
+def _scalar(v):
+    # list/array values go to the csv file, not the model file
+    return None if isinstance(v, (list, tuple)) or hasattr(v, 'shape') else v
+
+
+def structure_key(m):
+    """Everything _build_model writes, without rendering any equation text."""
+    decl = tuple((str(p), _scalar(p.VALUE.value), p.UPPER, p.LOWER)
+                 for p in m._parameters + m._variables)
+    consts = tuple((str(c), c.value) for c in m._constants)
+    exprs = tuple(tuple(map(id, lst)) for lst in (
+        m._intermediates, m._inter_equations, m._equations, m._objectives))
+    text = tuple(tuple(str(x) for x in lst) for lst in (
+        m._connections, m._objects, m._compounds, m._raw))
+    return (m._model_name, decl, consts, exprs, text)
+
+
+def _cached_build(m):
+    st = m._model_cache
+    path = os.path.join(m._path, (m._model_name or 'default_model_name') + '.apm')
+    t = time.perf_counter()
+    key = structure_key(m)
+    if key == st['key'] and os.path.exists(path):
+        st['hits'] += 1
+        st['key_time'] += time.perf_counter() - t
+        return
+    GEKKO._build_model(m)
+    st['key'] = key
+    st['builds'] += 1
+    st['build_time'] += time.perf_counter() - t
+
+
+def cache_models(*models):
+    """Enable model file reuse on each model (no-op with GEKKO_MODEL_CACHE=0)."""
+    if os.environ.get('GEKKO_MODEL_CACHE', '1') == '0':
+        return models
+    for m in models:
+        if not hasattr(m, '_model_cache'):
+            m._model_cache = {'key': None, 'hits': 0, 'builds': 0,
+                              'build_time': 0.0, 'key_time': 0.0}
+            m._build_model = types.MethodType(_cached_build, m)
+    return models
+
+
+def stats(m):
+    """Hits, builds and the time spent building and checking the model file."""
+    st = getattr(m, '_model_cache', None)
+    if st is None:
+        return None
+    return {k: v for k, v in st.items() if k != 'key'}
+
+
+def report(*models):
+    lines = []
+    for m in models:
+        st = getattr(m, '_model_cache', None)
+        if st is None:
+            lines.append('%s: model cache off' % m._model_name)
+            continue
+        per_build = st['build_time'] / max(st['builds'], 1)
+        per_hit = st['key_time'] / max(st['hits'], 1)
+        lines.append('%s: %d builds (%.2f ms each), %d reuses (%.2f ms each)'
+                     % (m._model_name, st['builds'], 1e3 * per_build,
+                        st['hits'], 1e3 * per_hit))
+    return '\n'.join(lines)
@@ -0,0 +1,305 @@
+"""
+Solver portfolio: race APOPT and IPOPT (or any option sets) on the same model.
+
+Which solver is faster depends on the problem: the storage benchmarks with
+the store*recover complementarity, the MHE fits and the neural net training
+all prefer different ones. race(m) forks one process per option set, each
+solving a copy of the model in its own run directory. The first acceptable
+solution (APPSTATUS == 1 and accept(m), when given) wins, the other solver
+processes are killed, and the winner's run directory and results are loaded
+into m, so m continues (timeshift, warm start) as if it had been solved with
+the winning options. Those options stay set on m.
+
+    r = race(m)                                  # APOPT vs IPOPT
+    r = race(m, {'ipopt': {'SOLVER': 3},
+                 'apopt-tight': {'SOLVER': 1, 'solver_options':
+                                 ['minlp_gap_tol 1e-3']}}, timeout=60)
+    r['winner'], r['wall'], r['results']
+
+Every race is recorded as a win for one option set under a model key (the
+model name when it was given, else its size from tools/sizing.py). solve(m)
+races until a key has min_races records and from then on solves once with
+the option set that won most often:
+
+    portfolio.solve(m)          # race now, the learned default later
+
+    python tools/portfolio.py mhe_cstr cycles=10      # race every solve
+    python tools/portfolio.py --wins                  # recorded wins
+
+Racing forks, so it needs a POSIX system; on one core the racers share it
+and the race costs up to len(configs) times the winner's time. Remote models
+are raced under per-solver names on the server, so only the local copy of
+the winner's state carries over to the next solve.
+
+Environment:
+    GEKKO_PORTFOLIO   wins file (default ~/.cache/gekko-examples/portfolio.json)
+"""
+
+import ast
+import contextlib
+import json
+import os
+import re
+import shutil
+import signal
+import sys
+import tempfile
+import traceback
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from timeit import default_timer as timer
+
+PORTFOLIO = {'apopt': {'SOLVER': 1}, 'ipopt': {'SOLVER': 3}}
+MIN_RACES = 5
+
+_solve = None   # GEKKO.solve as it was before racing() patched it
+
+
+def _wins_path():
+    return os.environ.get('GEKKO_PORTFOLIO') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'gekko-examples', 'portfolio.json')
+
+
+def _apply(m, options):
+    for k, v in options.items():
+        if k == 'solver_options':
+            m.solver_options = list(v)
+        else:
+            setattr(m.options, k, v)
+
+
+def _move(m, path):
+    old = m._path
+    m._path = m.path = path
+    for v in m._parameters + m._variables:
+        if v.__dict__.get('path') == old:
+            v.__dict__['path'] = path
+
+
+def _racer(m, name, options, path, conn, accept):
+    if hasattr(os, 'setsid'):
+        os.setsid()     # own process group, so a kill also stops apm
+    start = timer()
+    try:
+        shutil.copytree(m._path, path, dirs_exist_ok=True)   # warm start files
+        _move(m, path)
+        if m._remote:
+            m._model_name = '%s_%s' % (m._model_name, re.sub(r'\W', '', name))
+        _apply(m, options)
+        (_solve or type(m).solve)(m, disp=False, debug=0)
+        status = int(m.options.APPSTATUS)
+        ok = status == 1 and (accept is None or bool(accept(m)))
+        conn.send({'accepted': ok, 'status': status, 'wall': timer() - start,
+                   'solve_time': float(m.options.SOLVETIME),
+                   'iterations': int(m.options.ITERATIONS),
+                   'objective': float(m.options.OBJFCNVAL), 'error': None})
+    except Exception:
+        conn.send({'accepted': False, 'status': 0, 'wall': timer() - start,
+                   'error': traceback.format_exc(limit=2)})
+
+
+def _kill(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except (AttributeError, OSError):
+        proc.kill()
+    proc.join()
+
+
+def race(m, configs=None, timeout=None, accept=None, debug=1):
+    """Solve m with every option set in configs concurrently; first acceptable wins.
+
+    configs -- {name: {option: value}} of m.options settings, plus an optional
+               'solver_options' list (default PORTFOLIO: APOPT vs IPOPT)
+    timeout -- seconds until all racers are killed
+    accept  -- callable(m) run on a racer's solved copy; False rejects it
+    debug   -- 1 raises when no racer is accepted, 0 returns winner None
+
+    Returns {'winner', 'wall', 'results': {name: {...}}}; results of killed
+    racers have status None.
+    """
+    configs = configs or PORTFOLIO
+    ctx = mp.get_context('fork')
+    parent = os.path.dirname(m._path)
+    racers = {}     # connection -> (name, process, path)
+    start = timer()
+    for name, options in configs.items():
+        path = tempfile.mkdtemp(prefix='race-%s-' % re.sub(r'\W', '', name), dir=parent)
+        conn, child = ctx.Pipe()
+        proc = ctx.Process(target=_racer, args=(m, name, options, path, child, accept),
+                           daemon=True)
+        proc.start()
+        child.close()
+        racers[conn] = (name, proc, path)
+    results = {name: {'accepted': False, 'status': None, 'wall': None}
+               for name in configs}
+    winner = None
+    pending = dict(racers)
+    try:
+        while pending and winner is None:
+            left = None if timeout is None else timeout - (timer() - start)
+            if left is not None and left <= 0:
+                break
+            ready = wait(list(pending), left)
+            for conn in ready:
+                name, proc, path = pending.pop(conn)
+                try:
+                    results[name] = conn.recv()
+                except (EOFError, OSError):
+                    results[name]['error'] = 'racer exited with code %s' % proc.exitcode
+                if results[name]['accepted'] and winner is None:
+                    winner = name
+    finally:
+        for conn, (name, proc, path) in racers.items():
+            if proc.is_alive():
+                _kill(proc)
+            else:
+                proc.join()
+            conn.close()
+    wall = timer() - start
+    try:
+        if winner is not None:
+            path = [p for n, _, p in racers.values() if n == winner][0]
+            shutil.copytree(path, m._path, dirs_exist_ok=True)
+            m.load_results()
+            m.load_JSON()
+            _apply(m, configs[winner])
+    finally:
+        for name, proc, path in racers.values():
+            shutil.rmtree(path, ignore_errors=True)
+    if winner is None and debug >= 1:
+        raise Exception('@error: no solver in the portfolio was accepted: ' + ', '.join(
+            '%s status %s' % (n, r['status']) for n, r in results.items()))
+    return {'winner': winner, 'wall': wall, 'results': results}
+
+
+def model_key(m):
+    """Name given to GEKKO(name=...), else a key from the model size."""
+    if not re.match(r'gk_model\d+$', m._model_name):
+        return m._model_name
+    from tools.sizing import model_size
+    s = model_size(m)
+    return 'imode%(imode)d-v%(variables)d-e%(equations)d-i%(integers)d' % s
+
+
+def load_wins(path=None):
+    path = path or _wins_path()
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except ValueError:
+        return {}       # unreadable file: start a new table
+
+
+def record(key, result, path=None):
+    """Add one race result to the wins file."""
+    path = path or _wins_path()
+    wins = load_wins(path)
+    entry = wins.setdefault(key, {})
+    for name in result['results']:
+        e = entry.setdefault(name, {'races': 0, 'wins': 0, 'seconds': 0.0})
+        e['races'] += 1
+        if name == result['winner']:
+            e['wins'] += 1
+            e['seconds'] += result['wall']
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    # workers racing with learn=True write concurrently: never truncate in place
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(wins, f, indent=1, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def best(key, min_races=MIN_RACES, path=None):
+    """Option set name with the most wins for key, None before min_races races."""
+    entry = load_wins(path).get(key, {})
+    if not entry or max(e['races'] for e in entry.values()) < min_races:
+        return None
+    return max(entry, key=lambda n: (entry[n]['wins'], -entry[n]['seconds']))
+
+
+def solve(m, configs=None, key=None, min_races=MIN_RACES, timeout=None, accept=None,
+          debug=1, path=None):
+    """Race m until its key has min_races recorded, then use the learned default."""
+    configs = configs or PORTFOLIO
+    key = key or model_key(m)
+    name = best(key, min_races, path)
+    if name in configs:
+        _apply(m, configs[name])
+        (_solve or type(m).solve)(m, disp=False, debug=debug)
+        return {'winner': name, 'wall': None, 'results': {}, 'raced': False}
+    r = race(m, configs, timeout, accept, debug)
+    if r['winner'] is not None:
+        record(key, r, path)
+    r['raced'] = True
+    return r
+
+
+@contextlib.contextmanager
+def racing(configs=None, learn=False, log=None):
+    """Route every GEKKO solve through race() (or solve() with learn=True).
+
+    log, when given, is a list that receives (model key, result) per solve.
+    """
+    global _solve
+    from gekko import GEKKO
+    original = _solve = GEKKO.solve
+
+    def raced_solve(m, disp=True, debug=1, **kwargs):
+        key = model_key(m)
+        if learn:
+            r = solve(m, configs, key, debug=debug)
+        else:
+            r = race(m, configs, debug=debug)
+            if r['winner'] is not None:
+                record(key, r)
+        if log is not None:
+            log.append((key, r))
+
+    GEKKO.solve = raced_solve
+    try:
+        yield log
+    finally:
+        GEKKO.solve = original
+        _solve = None
+
+
+def report(wins):
+    lines = ['%-36s %-12s %6s %6s %10s' % ('model', 'options', 'races', 'wins', 'mean s')]
+    for key in sorted(wins):
+        for name, e in sorted(wins[key].items()):
+            mean = '%10.3f' % (e['seconds'] / e['wins']) if e['wins'] else '%10s' % '-'
+            lines.append('%-36s %-12s %6d %6d %s' % (key[:36], name, e['races'],
+                                                    e['wins'], mean))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from tools import examples
+    args = sys.argv[1:]
+    if not args:
+        print('usage: portfolio.py <example> [option=value ...] [--learn] | --wins')
+        sys.exit(2)
+    if args[0] == '--wins':
+        print(report(load_wins()))
+        sys.exit(0)
+    options = {}
+    for a in args[1:]:
+        if '=' in a:
+            k, v = a.split('=', 1)
+            try:
+                options[k] = ast.literal_eval(v)
+            except (ValueError, SyntaxError):
+                options[k] = v
+    with racing(learn='--learn' in args, log=[]) as log:
+        examples.run(args[0], **options)
+    counts = {}
+    for key, r in log:
+        c = counts.setdefault(key, {})
+        c[r['winner']] = c.get(r['winner'], 0) + 1
+    for key, c in counts.items():
+        print('%-36s %s' % (key, ', '.join('%s %d' % kv for kv in sorted(c.items()))))
@@ -0,0 +1,205 @@
+"""
+Phase-level profiler for GEKKO models: where does the time of a solve go?
+
+While a Profiler is active, every GEKKO model created or solved is timed in
+these phases:
+
+    construct  GEKKO() until the first solve, less the solves of other models
+               in between: Python-side model building (variables,
+               expression trees, equations)
+    build      _build_model: rendering the model to the .apm file
+    write      .csv data, measurements.dbs, solver options and info files
+    solver     the rest of m.solve(): the apm process (or the server round
+               trip for remote=True) including its own file I/O
+    read       load_results and load_JSON: parsing the results back
+
+Times are aggregated per model name and phase across repeated solves (calls
+counts solves, not the individual file writes). With memory=True, tracemalloc
+also records the peak Python allocation of each phase (the net growth for
+construct). tracemalloc slows the Python phases several times over, so the
+times are only comparable between runs with the same setting. The solver
+phase runs in another process and has no Python allocations.
+
+    with Profiler(memory=True) as prof:
+        res = examples.run('neural_net', cache=False)
+    print(prof.table())
+    prof.write_folded('nn.folded')     # flamegraph.pl / speedscope input
+
+    python tools/profiler.py mhe_cstr cycles=20 --memory --folded cstr.folded
+
+Phases are timed on the instance methods, so the cached _build_model of
+tools/modelcache.py is attributed to build like the original one.
+"""
+
+import ast
+import os
+import sys
+import tracemalloc
+from timeit import default_timer as timer
+
+PHASES = ('construct', 'build', 'write', 'solver', 'read')
+# GEKKO.solve steps -> phase
+STEPS = {'_build_model': 'build',
+         '_write_csv': 'write',
+         '_generate_dbs_file': 'write',
+         '_write_solver_options': 'write',
+         '_write_info': 'write',
+         'load_results': 'read',
+         'load_JSON': 'read'}
+
+
+class Profiler(object):
+    """Context manager that profiles all GEKKO models while active."""
+
+    def __init__(self, memory=False):
+        self.memory = memory
+        self._stats = {}      # (model, phase) -> [calls, seconds, peak bytes]
+        self._patched = None
+        self._started_tracing = False
+        self._solving = 0.0   # total seconds inside profiled solves
+
+    def __enter__(self):
+        from gekko import GEKKO
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._patched = (GEKKO, GEKKO.__init__, GEKKO.solve)
+        prof, init, solve = self, GEKKO.__init__, GEKKO.solve
+
+        def profiled_init(m, *args, **kwargs):
+            m.__dict__['_profile_start'] = (timer(), prof._solving, prof._allocated())
+            init(m, *args, **kwargs)
+
+        def profiled_solve(m, *args, **kwargs):
+            return prof._solve(solve, m, *args, **kwargs)
+
+        GEKKO.__init__ = profiled_init
+        GEKKO.solve = profiled_solve
+        return self
+
+    def __exit__(self, *exc):
+        GEKKO, init, solve = self._patched
+        GEKKO.__init__ = init
+        GEKKO.solve = solve
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _allocated(self):
+        return tracemalloc.get_traced_memory()[0] if self.memory else 0
+
+    def _add(self, model, phase, seconds, peak=0):
+        s = self._stats.setdefault((model, phase), [0, 0.0, 0])
+        s[0] += 1
+        s[1] += seconds
+        s[2] = max(s[2], peak)
+
+    def _timed(self, phase, fn, spent):
+        # spent: phase -> [seconds, peak bytes] of the current solve
+        def timed(*args, **kwargs):
+            if self.memory:
+                base = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+            start = timer()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                peak = tracemalloc.get_traced_memory()[1] - base if self.memory else 0
+                s = spent.setdefault(phase, [0.0, 0])
+                s[0] += timer() - start
+                s[1] = max(s[1], peak)
+        return timed
+
+    def _solve(self, solve, m, *args, **kwargs):
+        model = m._model_name
+        first = m.__dict__.pop('_profile_start', None)
+        if first is not None:
+            self._add(model, 'construct', timer() - first[0] - (self._solving - first[1]),
+                      max(self._allocated() - first[2], 0))
+        spent = {}
+        saved = {}
+        for name, phase in STEPS.items():
+            saved[name] = m.__dict__.get(name)
+            m.__dict__[name] = self._timed(phase, getattr(m, name), spent)
+        start = timer()
+        try:
+            return solve(m, *args, **kwargs)
+        finally:
+            total = timer() - start
+            self._solving += total
+            for phase, (seconds, peak) in spent.items():
+                self._add(model, phase, seconds, peak)
+            self._add(model, 'solver', total - sum(v[0] for v in spent.values()))
+            for name, fn in saved.items():
+                if fn is None:
+                    del m.__dict__[name]
+                else:
+                    m.__dict__[name] = fn
+
+    def stats(self):
+        """{model: {phase: {'calls', 'seconds', 'peak_bytes'}}}"""
+        out = {}
+        for (model, phase), (calls, seconds, peak) in self._stats.items():
+            out.setdefault(model, {})[phase] = {'calls': calls, 'seconds': seconds,
+                                                'peak_bytes': peak}
+        return out
+
+    def table(self):
+        stats = self.stats()
+        total = sum(s['seconds'] for p in stats.values() for s in p.values()) or 1.0
+        head = '%-20s %-10s %6s %10s %10s %7s' % ('model', 'phase', 'calls', 'total s',
+                                                 'mean ms', 'share')
+        if self.memory:
+            head += ' %10s' % 'peak kB'
+        lines = [head]
+        order = sorted(stats, key=lambda k: -sum(s['seconds'] for s in stats[k].values()))
+        for model in order:
+            for phase in PHASES:
+                s = stats[model].get(phase)
+                if s is None:
+                    continue
+                line = '%-20s %-10s %6d %10.3f %10.2f %6.1f%%' % (
+                    model[:20], phase, s['calls'], s['seconds'],
+                    1e3 * s['seconds'] / s['calls'], 100 * s['seconds'] / total)
+                if self.memory:
+                    line += ' %10.1f' % (s['peak_bytes'] / 1e3)
+                lines.append(line)
+        return '\n'.join(lines)
+
+    def folded(self):
+        """Folded stacks 'model;phase microseconds', one line per phase."""
+        lines = []
+        for (model, phase), (calls, seconds, peak) in sorted(self._stats.items()):
+            stack = model + (';construct' if phase == 'construct' else ';solve;' + phase)
+            lines.append('%s %d' % (stack, round(1e6 * seconds)))
+        return '\n'.join(lines) + '\n'
+
+    def write_folded(self, path):
+        with open(path, 'w') as f:
+            f.write(self.folded())
+        return path
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from tools import examples
+
+    args = sys.argv[1:]
+    if not args:
+        print('usage: profiler.py <example> [option=value ...] [--memory] [--folded FILE]')
+        print('examples: ' + ', '.join(examples.names()))
+        sys.exit(2)
+    folded = args[args.index('--folded') + 1] if '--folded' in args else None
+    options = {}
+    for a in args[1:]:
+        if '=' in a:
+            k, v = a.split('=', 1)
+            try:
+                options[k] = ast.literal_eval(v)
+            except (ValueError, SyntaxError):
+                options[k] = v
+    with Profiler(memory='--memory' in args) as prof:
+        examples.run(args[0], **options)
+    print(prof.table())
+    if folded:
+        print('folded stacks written to ' + prof.write_folded(folded))
@@ -0,0 +1,239 @@
+"""
+Appendable, chunked columnar store for optimization and estimation results.
+
+A run appends one record per window or cycle: trajectories (time plus one
+array per variable) and per-record scalars (solver status, solve time and
+any numeric metadata such as the cycle index). Records are buffered and
+written as compressed chunks; a crash only loses the unflushed buffer and
+the reader stops cleanly at a truncated chunk.
+
+Layout:
+    8 bytes   magic b'GKRES001'
+    chunks    b'CHNK' + uint64 header length + JSON header + column blobs
+
+Each column blob is zlib compressed (or raw with compress=False, in which
+case the reader returns zero-copy views of the memory-mapped file).
+
+    with ResultWriter('mhe.res') as w:
+        for i in range(cycles):
+            ...
+            w.append({'UA': UA_mhe.NEWVAL, 'T': T_mhe.MODEL}, time=i*dt,
+                     status=m.options.APPSTATUS, solve_time=m.options.SOLVETIME)
+    r = ResultReader('mhe.res')
+    r.read(['UA'], start=1.0, stop=3.0)['UA']
+"""
+
+import json
+import os
+import struct
+import zlib
+
+import numpy as np
+
+MAGIC = b'GKRES001'
+CHUNK = b'CHNK'
+
+
+class ResultWriter(object):
+    """Append records to a result file (created if missing).
+
+    chunk_rows -- buffered trajectory rows that trigger a chunk write
+    compress   -- zlib level (0-9) or False for raw, memory-mappable columns
+    """
+
+    def __init__(self, path, chunk_rows=4096, compress=1):
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.compress = compress
+        existing = ResultReader(path)
+        self._nrecords = len(existing.records(['record'])['record'])
+        self._f = open(path, 'ab')
+        if existing.end:
+            # drop a chunk left half-written by an interrupted run
+            self._f.truncate(existing.end)
+        else:
+            self._f.truncate(0)
+            self._f.write(MAGIC)
+        self._rows = {}
+        self._recs = {}
+        self._buffered = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, values, time=None, status=None, solve_time=None, **meta):
+        """Append one record.
+
+        values -- dict of variable name -> array (or scalar for a single row)
+        time   -- time stamps of the rows (defaults to 0..n-1)
+        status, solve_time and meta -- numeric scalars kept per record
+        """
+        cols = {k: np.atleast_1d(np.asarray(v)).astype(float) for k, v in values.items()}
+        n = len(next(iter(cols.values()))) if cols else 1
+        cols['time'] = (np.arange(n, dtype=float) if time is None
+                        else np.atleast_1d(np.asarray(time, dtype=float)))
+        for k, v in cols.items():
+            if len(v) != n:
+                raise ValueError('column %s has %d rows, expected %d' % (k, len(v), n))
+        rec = {'record': self._nrecords, 'rows': n,
+               'status': np.nan if status is None else status,
+               'solve_time': np.nan if solve_time is None else solve_time}
+        rec.update(meta)
+        # a new variable or metadata set starts a new chunk
+        if self._recs and (set(cols) != set(self._rows) or set(rec) != set(self._recs)):
+            self.flush()
+        for k, v in cols.items():
+            self._rows.setdefault(k, []).append(v)
+        for k, v in rec.items():
+            self._recs.setdefault(k, []).append(v)
+        self._nrecords += 1
+        self._buffered += n
+        if self._buffered >= self.chunk_rows:
+            self.flush()
+
+    def _blob(self, a):
+        raw = np.ascontiguousarray(a).tobytes()
+        if self.compress is False:
+            return raw, None
+        return zlib.compress(raw, self.compress), 'zlib'
+
+    def flush(self):
+        if not self._recs:
+            return
+        rows = {k: np.concatenate(v) for k, v in self._rows.items()}
+        recs = {k: np.asarray(v, dtype=np.int64 if k in ('record', 'rows') else float)
+                for k, v in self._recs.items()}
+        cols, blobs, offset = [], [], 0
+        for kind, table in (('row', rows), ('rec', recs)):
+            for name, a in table.items():
+                blob, codec = self._blob(a)
+                cols.append({'name': name, 'kind': kind, 'dtype': a.dtype.str,
+                             'n': len(a), 'codec': codec, 'offset': offset,
+                             'nbytes': len(blob)})
+                blobs.append(blob)
+                offset += len(blob)
+        t = rows['time']
+        header = json.dumps({'rows': len(t), 'records': len(recs['record']),
+                             't0': float(t.min()), 't1': float(t.max()),
+                             'columns': cols}).encode()
+        self._f.write(CHUNK + struct.pack('<Q', len(header)) + header)
+        for blob in blobs:
+            self._f.write(blob)
+        self._f.flush()
+        self._rows, self._recs, self._buffered = {}, {}, 0
+
+    def close(self):
+        if self._f is not None:
+            self.flush()
+            self._f.close()
+            self._f = None
+
+
+class ResultReader(object):
+    """Memory-mapped reader; only the selected columns and chunks are decoded."""
+
+    def __init__(self, path):
+        self.path = path
+        self.chunks = []
+        self.end = 0   # end of the last complete chunk
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < len(MAGIC):
+            self._mm = None
+            return
+        self._mm = np.memmap(path, dtype=np.uint8, mode='r')
+        if bytes(self._mm[:8]) != MAGIC:
+            raise ValueError('%s is not a result store' % path)
+        pos = self.end = len(MAGIC)
+        while pos + 12 <= size:
+            if bytes(self._mm[pos:pos+4]) != CHUNK:
+                break
+            hlen, = struct.unpack('<Q', bytes(self._mm[pos+4:pos+12]))
+            if pos + 12 + hlen > size:
+                break
+            header = json.loads(bytes(self._mm[pos+12:pos+12+hlen]).decode())
+            base = pos + 12 + hlen
+            end = base + sum(c['nbytes'] for c in header['columns'])
+            if end > size:
+                break   # truncated by an interrupted write
+            header['base'] = base
+            header['index'] = {(c['kind'], c['name']): c for c in header['columns']}
+            self.chunks.append(header)
+            pos = self.end = end
+
+    @property
+    def names(self):
+        """Trajectory column names over all chunks."""
+        seen = {}
+        for ch in self.chunks:
+            for kind, name in ch['index']:
+                if kind == 'row':
+                    seen[name] = True
+        return list(seen)
+
+    def _decode(self, ch, kind, name):
+        c = ch['index'].get((kind, name))
+        if c is None:
+            return np.full(ch['rows'] if kind == 'row' else ch['records'], np.nan)
+        start = ch['base'] + c['offset']
+        dtype = np.dtype(c['dtype'])
+        if c['codec'] is None:
+            return np.frombuffer(self._mm, dtype=dtype, count=c['n'], offset=start)
+        raw = zlib.decompress(self._mm[start:start + c['nbytes']])
+        return np.frombuffer(raw, dtype=dtype)
+
+    def _concat(self, parts):
+        if not parts:
+            return np.empty(0)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def read(self, names=None, start=None, stop=None):
+        """Trajectory columns for rows with start <= time < stop."""
+        names = self.names if names is None else list(names)
+        out = {n: [] for n in names}
+        for ch in self.chunks:
+            if start is not None and ch['t1'] < start:
+                continue
+            if stop is not None and ch['t0'] >= stop:
+                continue
+            keep = slice(None)
+            if start is not None or stop is not None:
+                t = self._decode(ch, 'row', 'time')
+                mask = np.ones(len(t), dtype=bool)
+                if start is not None:
+                    mask &= t >= start
+                if stop is not None:
+                    mask &= t < stop
+                keep = slice(None) if mask.all() else mask
+            for n in names:
+                out[n].append(self._decode(ch, 'row', n)[keep])
+        return {n: self._concat(v) for n, v in out.items()}
+
+    def records(self, names=None):
+        """Per-record columns (record, rows, status, solve_time and metadata)."""
+        if names is None:
+            seen = {}
+            for ch in self.chunks:
+                for kind, name in ch['index']:
+                    if kind == 'rec':
+                        seen[name] = True
+            names = list(seen)
+        return {n: self._concat([self._decode(ch, 'rec', n) for ch in self.chunks])
+                for n in names}
+
+
+def open_results(path=None, **kwargs):
+    """Writer for path (default: $GEKKO_RESULTS), or None when neither is set.
+
+    The writer is flushed and closed at interpreter exit, so example scripts
+    only need to append to it.
+    """
+    path = path or os.environ.get('GEKKO_RESULTS')
+    if not path:
+        return None
+    import atexit
+    w = ResultWriter(path, **kwargs)
+    atexit.register(w.close)
+    return w
@@ -0,0 +1,160 @@
+"""
+Pool of reusable GEKKO run directories.
+
+Every GEKKO() creates a fresh tempfile.mkdtemp directory that is never
+removed, so sweeps and closed loops leave thousands of directories behind.
+pooled(m) moves a model into a directory handed out by a pool under one root
+(tmpfs /dev/shm when available), returns the directory to the pool when the
+model is garbage collected or released, and removes the whole root at exit.
+Reused directories are emptied before they are handed out again.
+
+The pool also counts the bytes each solve writes to its run directory:
+
+    m = pooled(GEKKO(remote=False, name='cstr-mhe'))
+    ...
+    m.solve(disp=False)
+    io_stats(m)      # {'solves': 1, 'bytes': 18342, 'last': 18342}
+
+Environment:
+    GEKKO_RUNDIR   parent directory of the pool (default /dev/shm, else $TMPDIR)
+    GEKKO_RUNDIR=off leaves models in their own temp directories
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+import time
+import types
+import weakref
+
+
+def _default_base():
+    base = os.environ.get('GEKKO_RUNDIR', '')
+    if base and base.lower() != 'off':
+        return base
+    shm = '/dev/shm'
+    if os.path.isdir(shm) and os.access(shm, os.W_OK):
+        return shm
+    return tempfile.gettempdir()
+
+
+def _clear(path):
+    for name in os.listdir(path):
+        p = os.path.join(path, name)
+        if os.path.isdir(p) and not os.path.islink(p):
+            shutil.rmtree(p, ignore_errors=True)
+        else:
+            os.remove(p)
+
+
+class RunDirPool(object):
+    """Hands out empty run directories and takes them back for reuse.
+
+    max_idle -- released directories kept for reuse; extra ones are deleted
+    """
+
+    def __init__(self, base=None, max_idle=64):
+        self.base = base or _default_base()
+        os.makedirs(self.base, exist_ok=True)
+        self.root = tempfile.mkdtemp(prefix='gekko-pool-', dir=self.base)
+        self.max_idle = max_idle
+        self._idle = []
+        self._count = 0
+        self.created = 0
+        self.reused = 0
+        atexit.register(self.close)
+
+    def acquire(self):
+        while self._idle:
+            path = self._idle.pop()
+            if os.path.isdir(path):
+                self.reused += 1
+                return path
+        self._count += 1
+        self.created += 1
+        path = os.path.join(self.root, 'run%d' % self._count)
+        os.makedirs(path)
+        return path
+
+    def release(self, path):
+        if self.root is None or not os.path.isdir(path):
+            return
+        if len(self._idle) < self.max_idle:
+            _clear(path)
+            self._idle.append(path)
+        else:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def attach(self, m):
+        """Move model m into a pooled directory; returns m."""
+        old, path = m._path, self.acquire()
+        m._path = m.path = path
+        # variables created before attach keep their own copy of the path
+        for v in m._parameters + m._variables:
+            if v.__dict__.get('path') == old:
+                v.__dict__['path'] = path
+        shutil.rmtree(old, ignore_errors=True)
+        m._rundir = {'solves': 0, 'bytes': 0, 'last': 0}
+        m.solve = types.MethodType(_counted_solve, m)
+        weakref.finalize(m, self.release, path)
+        return m
+
+    def close(self):
+        if self.root is not None:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.root = None
+            self._idle = []
+
+
+def _counted_solve(m, *args, **kwargs):
+    start = time.time()
+    try:
+        return type(m).solve(m, *args, **kwargs)
+    finally:
+        written = 0
+        for entry in os.scandir(m._path):
+            if entry.is_file() and entry.stat().st_mtime >= start - 1e-3:
+                written += entry.stat().st_size
+        st = m._rundir
+        st['solves'] += 1
+        st['bytes'] += written
+        st['last'] = written
+
+
+_pool = None
+
+
+def default_pool():
+    global _pool
+    if _pool is None:
+        _pool = RunDirPool()
+    return _pool
+
+
+def pooled(*models):
+    """Attach models to the default pool (unchanged with GEKKO_RUNDIR=off)."""
+    if os.environ.get('GEKKO_RUNDIR', '').lower() != 'off':
+        pool = default_pool()
+        for m in models:
+            if not hasattr(m, '_rundir'):
+                pool.attach(m)
+    return models[0] if len(models) == 1 else models
+
+
+def io_stats(m):
+    """Solves, total bytes and bytes of the last solve written to the run dir."""
+    return dict(m._rundir) if hasattr(m, '_rundir') else None
+
+
+def report(*models):
+    lines = []
+    for m in models:
+        st = io_stats(m)
+        if st is None:
+            lines.append('%s: %s' % (m._model_name, m._path))
+        else:
+            lines.append('%s: %d solves, %.1f kB written per solve'
+                         % (m._model_name, st['solves'],
+                            st['bytes'] / max(st['solves'], 1) / 1e3))
+    return '\n'.join(lines)
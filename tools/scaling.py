@@ -0,0 +1,259 @@
+"""
+Variable, row and objective scaling for badly conditioned energy models.
+
+chargingStationOptv3.py mixes watts (1e4) with $/Wh prices (1e-7), and the
+battery model mixes a 30 kWh capacity with 0.02 $/kWh prices. factors()
+computes column scales from the variable bounds and row/column scales from
+the matrix entries (geometric equilibration). Every factor is a power of
+two, so scaling and unscaling are exact in floating point.
+
+Scaled LPs are solved in scaled space and unscaled transparently:
+
+    res = linprog(c, A_ub=A, b_ub=b, bounds=bnds)   # scipy.optimize.linprog,
+                                                     # x and fun in model units
+    linear.solve(m, scale=True)                      # tools/linear.py backend
+
+GEKKO models solved by APM use its own scaling (SCALING=1), which takes the
+scale of each variable from its initial value. scale_model(m) gives bounded
+algebraic variables left at 0 the magnitude of their bounds, or of the Param
+data in their equations, as initial value. States and MVs keep their initial
+conditions, and free variables keep 0: a guess of 8 for both rates of a
+store*recover <= 0 complementarity made const_prod_storage 4x slower.
+
+    python tools/scaling.py          # iterations and solve times, unscaled
+                                     # vs scaled, for every energy model
+"""
+
+import os
+import re
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+PASSES = 8
+_NAME = re.compile(r'\$?\b(?:int_)?[vpi]\d+\b')
+
+
+def pow2(x):
+    """Nearest power of two to x (elementwise), 1 where x is 0 or not finite."""
+    x = np.abs(np.asarray(x, dtype=float))
+    ok = np.isfinite(x) & (x > 0)
+    return np.where(ok, 2.0 ** np.round(np.log2(np.where(ok, x, 1.0))), 1.0)
+
+
+def magnitude(x):
+    """Power of two closest to the geometric mean of the nonzero |x| (1 if none)."""
+    a = np.abs(np.asarray(x, dtype=float)).ravel()
+    a = a[np.isfinite(a) & (a > 0)]
+    return float(pow2(np.exp(np.mean(np.log(a))))) if a.size else 1.0
+
+
+def factors(A, lower=None, upper=None, integer=None, passes=PASSES):
+    """Row scales r and column scales c so that diag(r) A diag(c) is equilibrated.
+
+    The scaled variables are x / c. Columns start at the magnitude of their
+    finite bounds; integer columns keep scale 1.
+    """
+    from scipy import sparse
+    A = abs(sparse.csr_matrix(A, dtype=float))
+    m, n = A.shape
+    col = np.ones(n)
+    if lower is not None:
+        lo = np.where(np.isfinite(lower), np.abs(lower), 0.0)
+        up = np.where(np.isfinite(upper), np.abs(upper), 0.0)
+        col = pow2(np.maximum(lo, up))
+    fixed = np.zeros(n, bool) if integer is None else np.asarray(integer, bool)
+    col[fixed] = 1.0
+    row = np.ones(m)
+    if not A.nnz:
+        return row, col
+    for _ in range(passes):
+        B = sparse.diags(row).dot(A).dot(sparse.diags(col)).tocsr()
+        big = B.max(axis=1).toarray().ravel()
+        small = _min_nonzero(B, 1)
+        row = row * pow2(1.0 / np.sqrt(np.where(big > 0, big * small, 1.0)))
+        B = sparse.diags(row).dot(A).dot(sparse.diags(col)).tocsc()
+        big = B.max(axis=0).toarray().ravel()
+        small = _min_nonzero(B, 0)
+        step = pow2(1.0 / np.sqrt(np.where(big > 0, big * small, 1.0)))
+        step[fixed] = 1.0
+        col = col * step
+    return row, col
+
+
+def _min_nonzero(B, axis):
+    """Smallest nonzero |entry| per row (axis=1) or column (axis=0), 0 if empty."""
+    B = B.tocsr() if axis == 1 else B.tocsc()
+    out = np.zeros(B.shape[1 - axis])
+    for i in range(len(out)):
+        d = B.data[B.indptr[i]:B.indptr[i + 1]]
+        d = d[d > 0]
+        out[i] = d.min() if d.size else 0.0
+    return out
+
+
+def scale_lp(lp):
+    """Scaled copy of a tools/linear.py problem dict, with its factors."""
+    from scipy import sparse
+    row, col = factors(lp['A'], lp['lower'], lp['upper'], lp['integer'])
+    c = lp['c'] * col
+    obj = magnitude(c[c != 0]) if np.any(c) else 1.0
+    return dict(lp, A=sparse.diags(row).dot(lp['A']).dot(sparse.diags(col)).tocsr(),
+                c=c / obj, lower=lp['lower'] / col, upper=lp['upper'] / col,
+                row_lower=lp['row_lower'] * row, row_upper=lp['row_upper'] * row,
+                row_scale=row, col_scale=col, obj_scale=obj)
+
+
+def unscale(scaled, res):
+    """Put a solver result of a scale_lp() problem back into model units."""
+    if res.x is not None:
+        res.x = res.x * scaled['col_scale']
+    if res.fun is not None:
+        res.fun = res.fun * scaled['obj_scale']
+    return res
+
+
+def _bounds(bounds, n):
+    if bounds is None:
+        return np.zeros(n), np.full(n, np.inf)
+    b = np.array(bounds, dtype=object)
+    if b.ndim == 1:
+        b = np.tile(b, (n, 1))
+    lo = np.array([-np.inf if v is None else v for v in b[:, 0]], dtype=float)
+    up = np.array([np.inf if v is None else v for v in b[:, 1]], dtype=float)
+    return lo, up
+
+
+def linprog(c, A_ub=None, b_ub=None, A_eq=None, b_eq=None, bounds=None, **kwargs):
+    """scipy.optimize.linprog solved in scaled space; x, fun, slack and con
+    are returned in the units of the arguments."""
+    from scipy import optimize, sparse
+    c = np.asarray(c, dtype=float)
+    n = len(c)
+    lo, up = _bounds(bounds, n)
+    blocks = [sparse.csr_matrix(np.atleast_2d(a)) for a in (A_ub, A_eq) if a is not None]
+    row, col = factors(sparse.vstack(blocks) if blocks else sparse.csr_matrix((0, n)),
+                       lo, up)
+    n_ub = 0 if A_ub is None else np.atleast_2d(A_ub).shape[0]
+    r_ub, r_eq = row[:n_ub], row[n_ub:]
+    cs = c * col
+    obj = magnitude(cs[cs != 0]) if np.any(cs) else 1.0
+    args = {}
+    if A_ub is not None:
+        args['A_ub'] = sparse.diags(r_ub).dot(sparse.csr_matrix(np.atleast_2d(A_ub))).dot(
+            sparse.diags(col))
+        args['b_ub'] = np.asarray(b_ub, dtype=float) * r_ub
+    if A_eq is not None:
+        args['A_eq'] = sparse.diags(r_eq).dot(sparse.csr_matrix(np.atleast_2d(A_eq))).dot(
+            sparse.diags(col))
+        args['b_eq'] = np.atleast_1d(np.asarray(b_eq, dtype=float)) * r_eq
+    scaled_bounds = [(None if not np.isfinite(l) else l, None if not np.isfinite(u) else u)
+                     for l, u in zip(lo / col, up / col)]
+    res = optimize.linprog(cs / obj, bounds=scaled_bounds, **dict(args, **kwargs))
+    if res.x is not None:
+        res.x = res.x * col
+        res.fun = res.fun * obj
+        if A_ub is not None and res.get('slack') is not None:
+            res.slack = res.slack / r_ub
+        if A_eq is not None and res.get('con') is not None:
+            res.con = res.con / r_eq
+    return res
+
+
+def scale_model(m):
+    """Set APM scaling (SCALING=1) and give bounded algebraic variables left
+    at 0 an initial value of their magnitude; returns {name: magnitude}."""
+    states = set(n[1:] for eq in m._equations for n in _NAME.findall(str(eq))
+                 if n.startswith('$'))
+    data = {p.name: magnitude(np.asarray(p.value.value).astype(float))
+            for p in m._parameters if type(p).__name__ == 'GKParameter'}
+    scales = {}
+    for v in m._variables:
+        if v.name in states or np.any(np.asarray(v.value.value).astype(float) != 0):
+            continue
+        lo, up = getattr(v, 'LOWER', None), getattr(v, 'UPPER', None)
+        if lo is None and up is None:
+            continue    # free variables (e.g. complementary rates) keep 0
+        bnd = [abs(float(b)) for b in (lo, up)
+               if b is not None and np.isfinite(float(b)) and float(b) != 0]
+        if bnd:
+            s = float(pow2(max(bnd)))
+        else:
+            mags = [data[n] for eq in m._equations if v.name in _NAME.findall(str(eq))
+                    for n in _NAME.findall(str(eq)) if n in data]
+            s = max(mags) if mags else 1.0
+        if s != 1.0:
+            # inside the bounds: a positive guess for a lower bound of 0
+            v.value = s if lo is None or s >= float(lo) else float(lo)
+            scales[v.name] = s
+    m.options.SCALING = 1
+    return scales
+
+
+# energy models and how their scaled variant is selected
+MODELS = {
+    'battery':                {'disp': False},
+    'battery-highs':          ('battery', {'disp': False, 'backend': 'highs'}),
+    'charging_station':       {'disp': False},
+    'load_following':         {'disp': False},
+    'const_prod_storage':     {'disp': False},
+    'load_following_storage': {'disp': False},
+}
+
+
+def measure(name, options, scaled):
+    """Iterations, solver seconds, wall seconds and objective of one run."""
+    from gekko import GEKKO
+    from tools import examples, linear
+    fn = examples.function(name)
+    solve, lp_solve = GEKKO.solve, linear.solve_lp
+
+    def scaled_solve(m, *args, **kwargs):
+        scale_model(m)
+        return solve(m, *args, **kwargs)
+
+    def scaled_lp(lp, time_limit=None, scale=False):
+        return lp_solve(lp, time_limit, True)
+
+    if scaled:
+        GEKKO.solve, linear.solve_lp = scaled_solve, scaled_lp
+        options = dict(options, scale=True) if name == 'charging_station' else options
+    try:
+        start = timer()
+        res = fn(**options)
+        wall = timer() - start
+    finally:
+        GEKKO.solve, linear.solve_lp = solve, lp_solve
+    st = res['stats']
+    return {'iterations': int(np.sum(st.get('iterations', 0))),
+            'solve_time': float(np.sum(st.get('solve_time', wall))), 'wall': wall,
+            'objective': float(np.sum(st.get('objective', np.nan))),
+            'status': int(np.min(st.get('status', 1)))}
+
+
+def compare(names=None):
+    out = {}
+    for case in names or list(MODELS):
+        spec = MODELS.get(case, {'disp': False})
+        name, options = spec if isinstance(spec, tuple) else (case, spec)
+        measure(name, options, False)    # imports and first-run caches
+        out[case] = {'unscaled': measure(name, options, False),
+                     'scaled': measure(name, options, True)}
+    return out
+
+
+def report(results):
+    lines = ['%-24s %9s %9s %10s %10s %14s %14s' % (
+        'model', 'iter', 'scaled', 'solve s', 'scaled', 'objective', 'scaled')]
+    for case, r in results.items():
+        u, s = r['unscaled'], r['scaled']
+        lines.append('%-24s %9d %9d %10.4f %10.4f %14.8g %14.8g' % (
+            case, u['iterations'], s['iterations'], u['solve_time'], s['solve_time'],
+            u['objective'], s['objective']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    print(report(compare(sys.argv[1:] or None)))
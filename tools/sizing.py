@@ -0,0 +1,266 @@
+"""
+Size of a GEKKO problem before it is solved, and a runtime estimate.
+
+model_size(m) reads the model definition (no files are written, nothing is
+solved) and estimates what the solver will see after time discretization:
+
+    points        time points after collocation: (len(m.time)-1)*(NODES-1)+1
+                  for IMODE 4-9, the data length for IMODE 2, 1 for IMODE 1/3
+    variables     state variables as counted by APM: Var/SV/CV per point, a
+                  derivative per differential state, a slack per inequality,
+                  MV move variables per interval, set point terms per CV
+    equations     equations, derivative definitions and MV/CV terms
+    inequalities  equations with < or >, per point
+    integers      integer variables
+    nonzeros      estimated Jacobian nonzeros: distinct variables referenced
+                  by each equation (intermediates expanded) per point, plus
+                  NODES per derivative definition
+    intermediates explicit intermediates (substituted, not solver variables)
+
+The MV and CV terms follow APM's formulation, calibrated against its
+reported 'Number of state variables' and 'Number of total equations'. The
+result matches APM exactly on the examples' models (within a few percent
+for objects such as cspline or sysid).
+
+predict(size) fits log(solve time) against log(nonzeros) on the recorded
+history, using solves of the same solver when there are enough. bench.py
+--history appends every benchmarked solve to it:
+
+    size = model_size(m)
+    seconds, factor = predict(size)   # estimate and spread (x/ factor)
+    check(m, max_seconds=600)         # raises ModelTooLarge before solving
+
+    python tools/sizing.py battery            # sizes of an example's models
+    python tools/sizing.py --fit              # fitted runtime model
+
+Environment:
+    GEKKO_SIZING_HISTORY  history file (default ~/.cache/gekko-examples/sizing.jsonl)
+"""
+
+import ast
+import json
+import os
+import re
+import sys
+
+import numpy as np
+
+_REF = re.compile(r'\$?\b(?:int_)?[vpi]\d+\b')
+
+
+class ModelTooLarge(ValueError):
+    """Raised by check() when a model exceeds a size or runtime limit."""
+
+
+def _history_path():
+    return os.environ.get('GEKKO_SIZING_HISTORY') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'gekko-examples', 'sizing.jsonl')
+
+
+def model_size(m):
+    """Estimated problem size of model m; see the module docstring."""
+    imode = int(m.options.IMODE)
+    nodes = max(int(m.options.NODES), 2)
+    dynamic = imode >= 4 and m.time is not None and len(m.time) > 1
+    if dynamic:
+        intervals = len(m.time) - 1
+        points = intervals * (nodes - 1)   # the initial point is fixed
+    elif imode == 2:
+        n = [np.size(np.asarray(v.value)) for v in m._variables + m._parameters]
+        intervals, points = 0, max(n) if n else 1
+    else:
+        intervals, points = 0, 1
+    control = dynamic and imode not in (4, 7)
+
+    decision = set()
+    variables = integers = equations = nonzeros = cvs = 0
+    for v in m._variables:
+        decision.add(v.name)
+        variables += points
+        integers += points * v.name.startswith('int_')
+        cvs += type(v).__name__ == 'GK_CV' and bool(getattr(v, 'STATUS', 0))
+    for p in m._parameters:
+        kind = type(p).__name__
+        status = bool(getattr(p, 'STATUS', 0))
+        if kind == 'GK_MV' and dynamic:
+            # piecewise constant moves: value per point plus move variables
+            # and equations per interval
+            if control:
+                variables += points + (4 if status else 3) * intervals
+                equations += points + 3 * intervals
+                nonzeros += 3 * (points + 3 * intervals)
+            else:
+                variables += points - intervals
+                equations += points - intervals
+                nonzeros += points - intervals
+            decision.add(p.name)
+        elif kind in ('GK_MV', 'GK_FV') and status and (control or not dynamic):
+            variables += 1 if kind == 'GK_FV' else points
+            decision.add(p.name)
+        else:
+            continue
+        integers += (points if kind == 'GK_MV' else 1) * p.name.startswith('int_')
+
+    # intermediate name -> decision variables it depends on
+    inter = {}
+    for i, eq in zip(m._intermediates, m._inter_equations):
+        refs = set()
+        for r in _REF.findall(str(eq)):
+            r = r.lstrip('$')
+            refs |= inter.get(r, {r} if r in decision else set())
+        inter[i.name] = refs
+
+    inequalities = 0
+    states = set()
+    for eq in m._equations:
+        s = str(eq)
+        refs = set()
+        for r in _REF.findall(s):
+            if r.startswith('$'):
+                states.add(r[1:])
+            r = r.lstrip('$')
+            refs |= inter.get(r, {r} if r in decision else set())
+        inequalities += ('<' in s or '>' in s)
+        equations += points
+        nonzeros += len(refs) * points
+
+    # derivative variable and collocation equation per differential state,
+    # slack variable per inequality, set point tracking terms per CV
+    ns = len(states) if dynamic else 0
+    cv_terms = (11 if imode in (6, 9) else 4) * cvs if control else 0
+    variables += (ns + inequalities + cv_terms) * points
+    equations += (ns + cv_terms) * points
+    nonzeros += (ns * nodes + inequalities + 3 * cv_terms) * points
+    return {'points': points + dynamic,
+            'variables': variables,
+            'equations': equations,
+            'inequalities': inequalities * points,
+            'integers': integers,
+            'nonzeros': nonzeros,
+            'intermediates': len(m._intermediates),
+            'imode': imode, 'nodes': nodes,
+            'solver': int(m.options.SOLVER)}
+
+
+def record(size, seconds, path=None, **extra):
+    """Append one solved problem (size dict and solve seconds) to the history."""
+    path = path or _history_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    row = dict(size, seconds=float(seconds), **extra)
+    with open(path, 'a') as f:
+        f.write(json.dumps(row) + '\n')
+
+
+def history(path=None):
+    path = path or _history_path()
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def fit(rows, solver=None, min_rows=5):
+    """Least squares log(seconds) = a + b*log(nonzeros); (a, b, residual std).
+
+    Rows of the given solver are used when there are at least min_rows of
+    them, otherwise all rows. None without enough history.
+    """
+    rows = [r for r in rows if r.get('seconds', 0) > 0 and r.get('nonzeros', 0) > 0]
+    same = [r for r in rows if r.get('solver') == solver]
+    rows = same if len(same) >= min_rows else rows
+    if len(rows) < 2:
+        return None
+    x = np.log([r['nonzeros'] for r in rows])
+    y = np.log([r['seconds'] for r in rows])
+    A = np.c_[np.ones_like(x), x]
+    (a, b), *_ = np.linalg.lstsq(A, y, rcond=None)
+    resid = y - A.dot([a, b])
+    return a, b, float(resid.std()) if len(rows) > 2 else 0.0
+
+
+def predict(size, rows=None):
+    """(estimated solve seconds, spread factor) or (None, None) without history."""
+    coef = fit(history() if rows is None else rows, size.get('solver'))
+    if coef is None:
+        return None, None
+    a, b, sd = coef
+    return float(np.exp(a + b * np.log(max(size['nonzeros'], 1)))), float(np.exp(sd))
+
+
+def check(m, max_variables=None, max_nonzeros=None, max_seconds=None, rows=None):
+    """Raise ModelTooLarge if m exceeds a limit; returns its size otherwise."""
+    size = model_size(m)
+    if max_variables is not None and size['variables'] > max_variables:
+        raise ModelTooLarge('%d variables > %d' % (size['variables'], max_variables))
+    if max_nonzeros is not None and size['nonzeros'] > max_nonzeros:
+        raise ModelTooLarge('%d nonzeros > %d' % (size['nonzeros'], max_nonzeros))
+    if max_seconds is not None:
+        seconds, _ = predict(size, rows)
+        if seconds is not None and seconds > max_seconds:
+            raise ModelTooLarge('predicted %.0f s > %.0f s' % (seconds, max_seconds))
+    size['predicted_seconds'] = predict(size, rows)[0]
+    return size
+
+
+class _Stop(Exception):
+    pass
+
+
+def example_sizes(name, **options):
+    """Sizes of the models an example has built when it first solves."""
+    from gekko import GEKKO
+    from tools import examples
+    models = []
+    init, solve = GEKKO.__init__, GEKKO.solve
+
+    def collecting_init(m, *args, **kwargs):
+        init(m, *args, **kwargs)
+        models.append(m)
+
+    def stop(m, *args, **kwargs):
+        raise _Stop()
+
+    GEKKO.__init__, GEKKO.solve = collecting_init, stop
+    try:
+        examples.run(name, **options)
+    except _Stop:
+        pass
+    finally:
+        GEKKO.__init__, GEKKO.solve = init, solve
+    return {m._model_name: model_size(m) for m in models}
+
+
+def report(sizes):
+    cols = ('points', 'variables', 'equations', 'inequalities', 'integers', 'nonzeros')
+    lines = ['%-14s' % 'model' + ''.join('%13s' % c for c in cols) + '%13s' % 'predicted']
+    for name, s in sizes.items():
+        seconds, factor = predict(s)
+        pred = '%9.2f s' % seconds if seconds is not None else '-'
+        lines.append('%-14s' % name[:14] + ''.join('%13d' % s[c] for c in cols)
+                     + '%13s' % pred)
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    args = sys.argv[1:]
+    if not args:
+        print('usage: sizing.py <example> [option=value ...] | --fit')
+        sys.exit(2)
+    if args[0] == '--fit':
+        rows = history()
+        for solver in sorted(set(r.get('solver') for r in rows)):
+            coef = fit(rows, solver)
+            if coef:
+                print('solver %s: seconds = %.3g * nonzeros^%.2f (x/ %.2f), %d solves'
+                      % (solver, np.exp(coef[0]), coef[1], np.exp(coef[2]),
+                         sum(r.get('solver') == solver for r in rows)))
+        sys.exit(0)
+    options = {}
+    for a in args[1:]:
+        k, v = a.split('=', 1)
+        try:
+            options[k] = ast.literal_eval(v)
+        except (ValueError, SyntaxError):
+            options[k] = v
+    print(report(example_sizes(args[0], **options)))
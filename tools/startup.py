@@ -0,0 +1,138 @@
+"""
+Import-time benchmark for the example modules and tools.
+
+Every target is imported in a fresh interpreter, REPEAT times, and the
+fastest import is kept. Examples are loaded through tools.examples, so each
+measurement includes gekko and numpy, which every solve needs anyway. None of
+the targets may load matplotlib, pandas or scipy at import time; those belong
+inside the function that uses them.
+
+    python tools/startup.py                  # measure and compare with the baseline
+    python tools/startup.py save             # measure and store the baseline
+    python tools/startup.py mhe_mpc battery  # only these targets
+
+The exit status is 1 when a target loads a heavy module, or when it imports
+slower than baseline * (1 + TOLERANCE) + SLACK. Baselines depend on the
+machine, so without a baseline file only the heavy-module check applies.
+
+Environment:
+    GEKKO_STARTUP_BASELINE  baseline file (default ~/.cache/gekko-examples/startup.json)
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('matplotlib', 'pandas', 'scipy')
+TOOLS = ('apmserver', 'bench', 'checkpoint', 'colstore', 'datacache', 'examples',
+         'executor', 'fitcache', 'linear', 'modelcache', 'portfolio', 'profiler',
+         'resultstore', 'rundirs', 'scaling', 'sizing', 'stats', 'telemetry')
+REPEAT = 5
+TOLERANCE = 0.25    # relative slow-down that fails the check
+SLACK = 0.02        # s, absorbs timer noise on fast imports
+
+_CHILD = '''
+import json, sys, time
+sys.path.insert(0, %(root)r)
+from tools import examples
+start = time.perf_counter()
+%(load)s
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds,
+                  'heavy': [m for m in %(heavy)r if m in sys.modules],
+                  'modules': len(sys.modules)}))
+'''
+
+
+def _baseline_path():
+    return os.environ.get('GEKKO_STARTUP_BASELINE') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'gekko-examples', 'startup.json')
+
+
+def targets():
+    from tools import examples
+    return examples.names() + ['tools.' + t for t in TOOLS]
+
+
+def measure(target, repeat=REPEAT):
+    """Fastest import of target over repeat fresh interpreters."""
+    if target.startswith('tools.'):
+        load = 'import importlib; importlib.import_module(%r)' % target
+    else:
+        load = 'examples.load(%r)' % target
+    code = _CHILD % {'root': ROOT, 'load': load, 'heavy': HEAVY}
+    best = None
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=ROOT,
+                             capture_output=True, text=True)
+        if out.returncode != 0:
+            raise RuntimeError('importing %s failed:\n%s' % (target, out.stderr))
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        if best is None or r['seconds'] < best['seconds']:
+            best = r
+    return best
+
+
+def measure_all(names=None, repeat=REPEAT):
+    return {t: measure(t, repeat) for t in (names or targets())}
+
+
+def load_baseline(path=None):
+    path = path or _baseline_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(results, path=None):
+    path = path or _baseline_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    baseline = load_baseline(path)
+    baseline.update({t: r['seconds'] for t, r in results.items()})
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=1, sort_keys=True)
+    return path
+
+
+def check(results, baseline, tolerance=TOLERANCE, slack=SLACK):
+    """List of (target, reason) for every heavy import or regression."""
+    failures = []
+    for t, r in sorted(results.items()):
+        if r['heavy']:
+            failures.append((t, 'imports ' + ', '.join(r['heavy'])))
+        if t in baseline and r['seconds'] > baseline[t] * (1 + tolerance) + slack:
+            failures.append((t, '%.0f ms vs %.0f ms baseline'
+                             % (1e3 * r['seconds'], 1e3 * baseline[t])))
+    return failures
+
+
+def report(results, baseline=None):
+    baseline = baseline or {}
+    lines = ['%-24s %8s %8s %8s  %s' % ('target', 'ms', 'baseline', 'modules', 'heavy')]
+    for t, r in sorted(results.items()):
+        base = '%8.0f' % (1e3 * baseline[t]) if t in baseline else '%8s' % '-'
+        lines.append('%-24s %8.0f %s %8d  %s' % (t, 1e3 * r['seconds'], base,
+                                                 r['modules'], ' '.join(r['heavy'])))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, ROOT)
+    args = sys.argv[1:]
+    save = 'save' in args
+    names = [a for a in args if a != 'save'] or None
+
+    results = measure_all(names)
+    baseline = load_baseline()
+    print(report(results, baseline))
+    if save:
+        print('baseline written to ' + save_baseline(results))
+        failures = check(results, {})
+    else:
+        failures = check(results, baseline)
+    for t, reason in failures:
+        print('FAIL %s: %s' % (t, reason))
+    sys.exit(1 if failures else 0)
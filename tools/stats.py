@@ -0,0 +1,27 @@
+"""
+Solver statistics as plain dicts, returned by the example functions next to
+their result arrays.
+"""
+
+import numpy as np
+
+
+def solve_stats(m):
+    """Status, solve time, iterations and objective of the last m.solve()."""
+    return {'status': int(m.options.APPSTATUS),
+            'solve_time': float(m.options.SOLVETIME),
+            'iterations': int(m.options.ITERATIONS),
+            'objective': float(m.options.OBJFCNVAL)}
+
+
+def cycle_stats(stats):
+    """Per-cycle solve_stats dicts -> dict of arrays (one entry per cycle)."""
+    keys = stats[0].keys() if stats else ('status', 'solve_time', 'iterations', 'objective')
+    return {k: np.array([s[k] for s in stats]) for k in keys}
+
+
+def values(*variables):
+    """GEKKO variable values as float arrays."""
+    out = [np.asarray(v.value if hasattr(v, 'value') else v).astype(float)
+           for v in variables]
+    return out[0] if len(out) == 1 else out
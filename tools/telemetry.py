@@ -0,0 +1,178 @@
+"""
+Per-cycle latency telemetry for closed-loop estimation and control.
+
+watch() wraps the solve of each model in the loop under a role name (plant,
+estimator, controller) and cycle() times the whole cycle. For each role and
+for the cycle as a whole the summary reports the p50/p95/p99/max latency,
+jitter (standard deviation) and failure rate. A solve counts as failed
+when it raises or ends with APPSTATUS != 1. Sample periods should be sized
+from p99, not from the mean.
+
+    tel = LoopTelemetry(period=0.5)
+    tel.watch(plant=p, estimator=m, controller=c)
+    for i in range(cycles):
+        with tel.cycle():
+            c.solve(disp=False)
+            ...
+    print(tel.report())
+    tel.export('loop.tel')     # long-format time series (tools/colstore.py)
+
+Loops that already time their cycles can pass the wall time to
+tel.add_cycle(seconds) instead of using the context manager.
+
+The export has one row per solve and one per cycle (role 'cycle'), with
+columns cycle, role (codes, labels in the header), wall, solve_time,
+iterations and success. The summary is stored in the header meta.
+
+Environment:
+    GEKKO_TELEMETRY   file the example scripts export their telemetry to
+"""
+
+import contextlib
+import os
+import types
+from timeit import default_timer as timer
+
+import numpy as np
+
+from tools.colstore import write_columns
+
+PERCENTILES = (50, 95, 99)
+
+
+def latency_summary(wall, success=None, period=None):
+    """p50/p95/p99/max/mean/jitter of wall times in s, failures, overruns."""
+    wall = np.asarray(wall, dtype=float)
+    n = len(wall)
+    out = {'n': n}
+    if n:
+        for q, v in zip(PERCENTILES, np.percentile(wall, PERCENTILES)):
+            out['p%d' % q] = float(v)
+        out.update(max=float(wall.max()), mean=float(wall.mean()),
+                   jitter=float(wall.std()))
+    if success is not None:
+        failures = int(n - np.count_nonzero(success))
+        out.update(failures=failures, failure_rate=failures / n if n else 0.0)
+    if period is not None:
+        out['overruns'] = int(np.count_nonzero(wall > period))
+    return out
+
+
+class LoopTelemetry(object):
+    """Solve and cycle latencies of a closed loop.
+
+    period -- controller sample period in s; cycles longer than it are
+              counted as overruns
+    """
+
+    def __init__(self, period=None):
+        self.period = period
+        self.roles = []
+        self._solves = []   # (cycle, role, wall, solve_time, iterations, success)
+        self._cycles = []   # (cycle, wall)
+
+    @property
+    def ncycles(self):
+        return len(self._cycles)
+
+    def watch(self, **models):
+        """Record every solve of each model under its keyword as role."""
+        for role, m in models.items():
+            if role not in self.roles:
+                self.roles.append(role)
+            # chain to whatever solve the instance has (e.g. tools.rundirs)
+            inner = m.__dict__.get('solve')
+            m.solve = types.MethodType(_watched_solve(self, role, inner), m)
+        return self
+
+    def record(self, role, wall, solve_time=0.0, iterations=0, success=True):
+        if role not in self.roles:
+            self.roles.append(role)
+        self._solves.append((self.ncycles, role, wall, solve_time, iterations,
+                             bool(success)))
+
+    def add_cycle(self, wall):
+        self._cycles.append((self.ncycles, wall))
+
+    @contextlib.contextmanager
+    def cycle(self):
+        start = timer()
+        try:
+            yield self.ncycles
+        finally:
+            self.add_cycle(timer() - start)
+
+    def cycle_times(self):
+        return np.array([w for _, w in self._cycles])
+
+    def series(self, role):
+        """Arrays cycle, wall, solve_time, iterations, success for one role."""
+        if role == 'cycle':
+            c = np.array(self._cycles, dtype=float).reshape(-1, 2)
+            return {'cycle': c[:, 0].astype(int), 'wall': c[:, 1]}
+        rows = [r for r in self._solves if r[1] == role]
+        return {'cycle': np.array([r[0] for r in rows], dtype=int),
+                'wall': np.array([r[2] for r in rows], dtype=float),
+                'solve_time': np.array([r[3] for r in rows], dtype=float),
+                'iterations': np.array([r[4] for r in rows], dtype=int),
+                'success': np.array([r[5] for r in rows], dtype=bool)}
+
+    def summary(self):
+        out = {'cycle': latency_summary(self.cycle_times(), period=self.period)}
+        for role in self.roles:
+            s = self.series(role)
+            out[role] = latency_summary(s['wall'], s['success'])
+            if len(s['wall']):
+                out[role].update(solve_time_p99=float(np.percentile(s['solve_time'], 99)),
+                                 iterations_mean=float(s['iterations'].mean()))
+        return out
+
+    def report(self):
+        lines = ['%-12s %6s %8s %8s %8s %8s %8s %8s' % (
+            'latency ms', 'n', 'p50', 'p95', 'p99', 'max', 'jitter', 'failed')]
+        for role, s in self.summary().items():
+            if not s['n']:
+                continue
+            failed = ('%7.1f%%' % (100 * s['failure_rate'])) if 'failures' in s else \
+                     ('%4d over' % s['overruns'] if 'overruns' in s else '')
+            lines.append('%-12s %6d %8.1f %8.1f %8.1f %8.1f %8.1f %8s' % (
+                role, s['n'], 1e3 * s['p50'], 1e3 * s['p95'], 1e3 * s['p99'],
+                1e3 * s['max'], 1e3 * s['jitter'], failed))
+        return '\n'.join(lines)
+
+    def export(self, path=None):
+        """Write the time series of all roles to a column store at path
+        (default $GEKKO_TELEMETRY); returns the path or None if neither is set.
+        """
+        path = path or os.environ.get('GEKKO_TELEMETRY')
+        if not path:
+            return None
+        roles = ['cycle'] + self.roles
+        # solves in call order, then the row of the cycle they belong to
+        rows = [(c, roles.index(r), w, st, it, ok) for c, r, w, st, it, ok in self._solves]
+        rows += [(c, 0, w, np.nan, -1, True) for c, w in self._cycles]
+        rows.sort(key=lambda r: r[0])
+        a = list(zip(*rows)) if rows else [[]] * 6
+        columns = {'cycle': np.array(a[0], dtype=np.int64),
+                   'role': np.array(a[1], dtype=np.int8),
+                   'wall': np.array(a[2], dtype=float),
+                   'solve_time': np.array(a[3], dtype=float),
+                   'iterations': np.array(a[4], dtype=np.int64),
+                   'success': np.array(a[5], dtype=np.int8)}
+        return write_columns(path, columns, labels={'role': roles},
+                             meta={'period': self.period, 'summary': self.summary()})
+
+
+def _watched_solve(tel, role, inner):
+    def solve(m, *args, **kwargs):
+        start = timer()
+        ok = False
+        try:
+            r = inner(*args, **kwargs) if inner else type(m).solve(m, *args, **kwargs)
+            ok = int(m.options.APPSTATUS) == 1
+            return r
+        finally:
+            tel.record(role, timer() - start, float(m.options.SOLVETIME),
+                       int(m.options.ITERATIONS), ok)
+    return solve
+